@@ -5,18 +5,29 @@
 
 from fastapi import FastAPI, HTTPException, status, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
+import asyncio
 import sys
 import os
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from backend.database import Database
+from backend.database import Database, pragma_profile_from_env, encode_cursor, MAX_PAGE_SIZE
+from backend.async_database import AsyncDatabase
+from backend.group_commit import GroupCommitWriter
+from backend.passwords import PasswordHasher, PasswordHasherBusy, needs_rehash
+from backend.rate_limit import RateLimiter, create_rate_limit_backend, client_ip, json_field
+from backend.metrics import MetricsRegistry, MetricsMiddleware
+from backend.query_profiler import QueryProfiler
 from backend.auth import (
-    SessionManager, get_current_user, require_admin,
-    get_user_couple_id, verify_couple_access
+    SessionManager, get_current_user, require_admin, security,
+    get_user_couple_id, verify_couple_access, couple_id_cache, session_expirer,
+    session_refresher, session_call
 )
 
 app = FastAPI(
@@ -34,8 +45,133 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 初始化数据库
-db = Database()
+# 请求延迟、状态码和 SQL 耗时指标，通过 /metrics 以 Prometheus 文本格式输出（METRICS_ENABLED=0 关闭）
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+metrics = MetricsRegistry()
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, registry=metrics)
+
+# 初始化数据库（路径和连接池大小可通过环境变量 DB_PATH / DB_POOL_SIZE 配置，
+# PRAGMA 可通过 DB_PRAGMA_<名称> 覆盖）
+database = Database(
+    os.environ.get("DB_PATH", "data/heartbeat.db"),
+    pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+    pragmas=pragma_profile_from_env()
+)
+
+# 路由通过异步包装访问数据库，DB_BACKEND 可选:
+#   async - 专用数据库线程池（默认）
+#   sync  - Starlette 默认线程池
+db = AsyncDatabase(database, backend=os.environ.get("DB_BACKEND", "async"))
+if METRICS_ENABLED:
+    database.sql_hook = metrics.record_sql
+
+# 可选的 SQL 性能分析（DB_PROFILE=1），超过 DB_SLOW_QUERY_MS 毫秒的语句写入 DB_SLOW_QUERY_LOG
+if os.environ.get("DB_PROFILE", "0") == "1":
+    database.profiler = QueryProfiler(
+        slow_threshold_ms=float(os.environ.get("DB_SLOW_QUERY_MS", 50)),
+        log_path=os.environ.get("DB_SLOW_QUERY_LOG", "data/slow_queries.log")
+    )
+
+# 密码哈希在独立的进程池中执行（在启动其他后台线程之前创建工作进程），
+# 排队超过 PASSWORD_HASH_MAX_PENDING 时登录/注册返回 503
+password_hasher = PasswordHasher(
+    max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", 2)),
+    max_pending=int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 64)),
+    executor=os.environ.get("PASSWORD_HASH_EXECUTOR", "process")
+)
+password_hasher.start()
+
+# 登录/注册限流，RATE_LIMIT_BACKEND 可选:
+#   memory - 进程内令牌桶表（默认）
+#   sqlite - 多个 worker 共享的令牌桶表（RATE_LIMIT_DB_PATH）
+# 部署在反向代理之后时设置 RATE_LIMIT_TRUST_PROXY=1，按 X-Forwarded-For 识别客户端
+if os.environ.get("RATE_LIMIT_BACKEND", "memory") == "sqlite":
+    rate_limit_backend = create_rate_limit_backend(
+        "sqlite", db_path=os.environ.get("RATE_LIMIT_DB_PATH", "data/rate_limits.db")
+    )
+else:
+    rate_limit_backend = create_rate_limit_backend("memory")
+rate_limiter = RateLimiter(
+    rate_limit_backend, enabled=os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+)
+request_ip = client_ip(trust_proxy=os.environ.get("RATE_LIMIT_TRUST_PROXY", "0") == "1")
+
+# 每个 IP 每分钟 30 次登录，突发 10 次；每个用户名每分钟 10 次，突发 5 次
+LOGIN_LIMITS = [
+    Depends(rate_limiter.limit("login_ip", per_minute=30, burst=10, key=request_ip)),
+    Depends(rate_limiter.limit("login_user", per_minute=10, burst=5, key=json_field("username"))),
+]
+REGISTER_LIMITS = [
+    Depends(rate_limiter.limit("register_ip", per_minute=10, burst=5, key=request_ip)),
+]
+
+# 可选的积分组提交：POINTS_GROUP_COMMIT=1 时 /points 的写入由后台线程合并提交
+points_writer: Optional[GroupCommitWriter] = None
+if os.environ.get("POINTS_GROUP_COMMIT", "0") == "1":
+    points_writer = GroupCommitWriter(
+        database,
+        max_batch_size=int(os.environ.get("POINTS_GROUP_MAX_BATCH", 64)),
+        max_linger_ms=float(os.environ.get("POINTS_GROUP_LINGER_MS", 2))
+    )
+    points_writer.start()
+
+# 后台定期执行 WAL checkpoint 和 PRAGMA optimize（设为 0 关闭）
+DB_MAINTENANCE_INTERVAL = float(os.environ.get("DB_MAINTENANCE_INTERVAL", 300))
+if DB_MAINTENANCE_INTERVAL > 0:
+    database.start_maintenance(DB_MAINTENANCE_INTERVAL)
+
+# 后台清理过期会话的间隔秒数（设为 0 关闭）
+SESSION_CLEANUP_INTERVAL = float(os.environ.get("SESSION_CLEANUP_INTERVAL", 60))
+if SESSION_CLEANUP_INTERVAL > 0:
+    session_expirer.interval = SESSION_CLEANUP_INTERVAL
+    session_expirer.start()
+
+# 后台线程合并写入会话续期（请求路径只入队）
+session_refresher.start()
+
+
+@app.on_event("shutdown")
+def stop_workers():
+    """
+    按启动的相反顺序停止后台任务（uvicorn 按信号退出时不执行 atexit，需要显式关闭）
+
+    会话续期线程先写入剩余的续期再停止会话清理；组提交写入器停止前提交队列中剩余的积分事件；
+    数据库最后关闭: 停止后台维护，等待数据库线程池中进行中的查询完成后再关闭连接池
+    """
+    session_refresher.stop()
+    session_expirer.stop()
+    if points_writer:
+        points_writer.stop()
+    password_hasher.close()
+    db.close()
+
+
+async def paginate(fetch, limit: int, cursor: Optional[str], sort_field: str):
+    """
+    按游标取一页数据
+
+    Args:
+        fetch: 接收 (limit, cursor) 的查询函数
+        limit: 客户端请求的条数，超过 MAX_PAGE_SIZE 时截断
+        cursor: 上一页返回的 next_cursor
+        sort_field: 排序使用的字段，和 id 一起编码进下一页游标
+
+    Returns:
+        (本页记录, 下一页游标或 None)
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    try:
+        # 多取一条用来判断是否还有下一页
+        rows = await fetch(limit + 1, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][sort_field], rows[-1]["id"])
+    return rows, next_cursor
 
 # ==================== Pydantic模型定义 ====================
 
@@ -57,6 +193,15 @@ class PointsChange(BaseModel):
     points_change: int = Field(..., description="积分变动值（正数增加，负数减少）")
     reason: str = Field(..., min_length=1, max_length=100, description="积分变动原因")
 
+# 批量积分接口单次最多处理的条数
+MAX_POINTS_BATCH = 100
+
+class PointsBatchItem(PointsChange):
+    idempotency_key: Optional[str] = Field(None, min_length=1, max_length=64, description="幂等键，重复提交只生效一次")
+
+class PointsBatch(BaseModel):
+    changes: List[PointsBatchItem] = Field(..., min_length=1, max_length=MAX_POINTS_BATCH, description="积分变动列表")
+
 class RewardCreate(BaseModel):
     name: str = Field(..., min_length=1, description="奖励名称")
     points_needed: int = Field(..., gt=0, description="兑换所需积分")
@@ -74,11 +219,25 @@ class ExchangeRequest(BaseModel):
 
 # ==================== 认证API ====================
 
-@app.post("/auth/register", response_model=dict, status_code=status.HTTP_201_CREATED)
-def register(request: RegisterRequest):
+def password_hasher_busy() -> HTTPException:
+    """哈希队列已满时的响应"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="服务繁忙，请稍后重试",
+        headers={"Retry-After": "1"}
+    )
+
+@app.post("/auth/register", response_model=dict, status_code=status.HTTP_201_CREATED,
+          dependencies=REGISTER_LIMITS)
+async def register(request: RegisterRequest):
     """用户注册"""
+    try:
+        password_hash = await password_hasher.hash(request.password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
+
     # 创建用户
-    user_id = db.create_user(request.username, request.password, is_admin=False)
+    user_id = await db.create_user_with_hash(request.username, password_hash, is_admin=False)
 
     if not user_id:
         raise HTTPException(
@@ -87,7 +246,8 @@ def register(request: RegisterRequest):
         )
 
     # 创建情侣记录
-    couple_id = db.create_couple(user_id, request.name1, request.name2)
+    couple_id = await db.create_couple(user_id, request.name1, request.name2)
+    couple_id_cache.invalidate(user_id)
 
     if not couple_id:
         raise HTTPException(
@@ -101,28 +261,31 @@ def register(request: RegisterRequest):
         "couple_id": couple_id
     }
 
-@app.post("/auth/login", response_model=dict, status_code=status.HTTP_200_OK)
-def login(request: LoginRequest):
+@app.post("/auth/login", response_model=dict, status_code=status.HTTP_200_OK,
+          dependencies=LOGIN_LIMITS)
+async def login(request: LoginRequest):
     """用户登录"""
-    user = db.verify_user(request.username, request.password)
-
-    if not user:
+    user = await db.get_user_credentials(request.username)
+    stored_hash = user["password_hash"] if user else None
+
+    try:
+        valid = await password_hasher.verify(request.password, stored_hash)
+        # 旧版哈希或参数调整后，登录成功时按当前参数重新哈希
+        if valid and needs_rehash(stored_hash):
+            await db.update_password_hash(user["id"], await password_hasher.hash(request.password))
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误"
         )
 
-    # 创建会话
-    token = SessionManager.create_session(
-        user["id"],
-        user["username"],
-        user["is_admin"]
-    )
-
     # 获取情侣信息（如果不是管理员）
     couple_info = None
     if not user["is_admin"]:
-        couple = db.get_couple_by_user_id(user["id"])
+        couple = await db.get_couple_by_user_id(user["id"])
         if couple:
             couple_info = {
                 "couple_id": couple["couple_id"],
@@ -130,6 +293,15 @@ def login(request: LoginRequest):
                 "points": couple["points"]
             }
 
+    # 创建会话（无状态模式下情侣ID写入令牌，后续请求不再查询）
+    token = await session_call(
+        SessionManager.create_session,
+        user["id"],
+        user["username"],
+        user["is_admin"],
+        couple_info["couple_id"] if couple_info else None
+    )
+
     return {
         "message": "登录成功",
         "token": token,
@@ -141,13 +313,16 @@ def login(request: LoginRequest):
     }
 
 @app.post("/auth/logout", response_model=dict, status_code=status.HTTP_200_OK)
-def logout(current_user: Dict[str, Any] = Depends(get_current_user)):
-    """用户登出"""
-    # 这里需要从请求头获取token，但为了简化，我们返回成功
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """用户登出（删除会话，无状态令牌加入吊销表）"""
+    await session_call(SessionManager.delete_session, credentials.credentials)
     return {"message": "登出成功"}
 
 @app.get("/auth/me", response_model=dict, status_code=status.HTTP_200_OK)
-def get_current_user_info(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def get_current_user_info(current_user: Dict[str, Any] = Depends(get_current_user)):
     """获取当前用户信息"""
     user_info = {
         "user_id": current_user["user_id"],
@@ -157,7 +332,7 @@ def get_current_user_info(current_user: Dict[str, Any] = Depends(get_current_use
 
     # 如果不是管理员，获取情侣信息
     if not current_user["is_admin"]:
-        couple = db.get_couple_by_user_id(current_user["user_id"])
+        couple = await db.get_couple_by_user_id(current_user["user_id"])
         if couple:
             user_info["couple"] = {
                 "couple_id": couple["couple_id"],
@@ -170,7 +345,7 @@ def get_current_user_info(current_user: Dict[str, Any] = Depends(get_current_use
 # ==================== 情侣管理API ====================
 
 @app.get("/couples/me", response_model=dict, status_code=status.HTTP_200_OK)
-def get_my_couple(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def get_my_couple(current_user: Dict[str, Any] = Depends(get_current_user)):
     """获取当前用户的情侣信息"""
     if current_user["is_admin"]:
         raise HTTPException(
@@ -178,7 +353,7 @@ def get_my_couple(current_user: Dict[str, Any] = Depends(get_current_user)):
             detail="管理员没有情侣信息"
         )
 
-    couple = db.get_couple_by_user_id(current_user["user_id"])
+    couple = await db.get_couple_by_user_id(current_user["user_id"])
     if not couple:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -193,9 +368,28 @@ def get_my_couple(current_user: Dict[str, Any] = Depends(get_current_user)):
     }
 
 @app.get("/couples/all", response_model=dict, status_code=status.HTTP_200_OK)
-def get_all_couples(current_user: Dict[str, Any] = Depends(require_admin)):
-    """获取所有情侣列表（管理员）"""
-    couples = db.get_all_couples()
+async def get_all_couples(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    sort: str = "created_time",
+    order: str = "desc",
+    name: Optional[str] = None,
+    username: Optional[str] = None,
+    min_points: Optional[int] = None,
+    max_points: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """分页获取情侣列表（管理员），sort 可选 created_time / points"""
+    couples, next_cursor = await paginate(
+        lambda n, c: db.get_all_couples(
+            n, c, sort, order, name=name, username=username,
+            min_points=min_points, max_points=max_points, since=since, until=until
+        ),
+        limit, cursor, sort
+    )
+
     return {
         "couples": [
             {
@@ -206,19 +400,20 @@ def get_all_couples(current_user: Dict[str, Any] = Depends(require_admin)):
                 "created_time": c["created_time"]
             }
             for c in couples
-        ]
+        ],
+        "next_cursor": next_cursor
     }
 
 # ==================== 积分管理API ====================
 
 @app.post("/points", response_model=dict, status_code=status.HTTP_200_OK)
-def update_points(
+async def update_points(
     points_data: PointsChange,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """更新积分"""
     # 获取用户的情侣ID
-    couple_id = get_user_couple_id(db, current_user["user_id"])
+    couple_id = await get_user_couple_id(db, current_user["user_id"], current_user.get("couple_id"))
 
     if not couple_id:
         raise HTTPException(
@@ -226,8 +421,30 @@ def update_points(
             detail="情侣信息不存在"
         )
 
+    # 组提交模式：等待所在批次的事务提交后直接拿到新积分
+    if points_writer:
+        try:
+            new_points = await asyncio.wrap_future(points_writer.submit(
+                couple_id,
+                points_data.points_change,
+                points_data.reason
+            ))
+        except Exception:
+            new_points = None
+
+        if new_points is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="积分更新失败"
+            )
+
+        return {
+            "message": "积分更新成功",
+            "new_points": new_points
+        }
+
     # 更新积分
-    success = db.update_couple_points(
+    success = await db.update_couple_points(
         couple_id,
         points_data.points_change,
         points_data.reason
@@ -240,20 +457,52 @@ def update_points(
         )
 
     # 获取更新后的积分
-    couple = db.get_couple_by_id(couple_id)
+    couple = await db.get_couple_by_id(couple_id)
 
     return {
         "message": "积分更新成功",
         "new_points": couple["points"]
     }
 
+@app.post("/points/batch", response_model=dict, status_code=status.HTTP_200_OK)
+async def update_points_batch(
+    batch: PointsBatch,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """批量更新积分（一次事务提交）"""
+    couple_id = await get_user_couple_id(db, current_user["user_id"], current_user.get("couple_id"))
+
+    if not couple_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="情侣信息不存在"
+        )
+
+    result = await db.update_couple_points_many(
+        couple_id,
+        [item.model_dump() for item in batch.changes]
+    )
+
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="积分更新失败"
+        )
+
+    return {
+        "message": "积分更新成功",
+        "new_points": result["new_points"],
+        "results": result["results"]
+    }
+
 @app.get("/points/history", response_model=dict, status_code=status.HTTP_200_OK)
-def get_point_history(
+async def get_point_history(
     limit: int = 50,
+    cursor: Optional[str] = None,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取积分历史"""
-    couple_id = get_user_couple_id(db, current_user["user_id"])
+    couple_id = await get_user_couple_id(db, current_user["user_id"], current_user.get("couple_id"))
 
     if not couple_id:
         raise HTTPException(
@@ -261,26 +510,29 @@ def get_point_history(
             detail="情侣信息不存在"
         )
 
-    history = db.get_point_history(couple_id, limit)
+    history, next_cursor = await paginate(
+        lambda n, c: db.get_point_history(couple_id, n, c), limit, cursor, "created_time"
+    )
 
     return {
-        "history": history
+        "history": history,
+        "next_cursor": next_cursor
     }
 
 # ==================== 奖励管理API ====================
 
 @app.get("/rewards/base", response_model=dict, status_code=status.HTTP_200_OK)
-def get_base_rewards(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def get_base_rewards(current_user: Dict[str, Any] = Depends(get_current_user)):
     """获取基础奖励列表（供参考）"""
-    rewards = db.get_base_rewards()
+    rewards = await db.get_base_rewards()
     return {
         "rewards": rewards
     }
 
 @app.get("/rewards", response_model=dict, status_code=status.HTTP_200_OK)
-def get_my_rewards(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def get_my_rewards(current_user: Dict[str, Any] = Depends(get_current_user)):
     """获取我的奖励列表"""
-    couple_id = get_user_couple_id(db, current_user["user_id"])
+    couple_id = await get_user_couple_id(db, current_user["user_id"], current_user.get("couple_id"))
 
     if not couple_id:
         raise HTTPException(
@@ -288,19 +540,19 @@ def get_my_rewards(current_user: Dict[str, Any] = Depends(get_current_user)):
             detail="情侣信息不存在"
         )
 
-    rewards = db.get_couple_rewards(couple_id)
+    rewards = await db.get_couple_rewards(couple_id)
 
     return {
         "rewards": rewards
     }
 
 @app.post("/rewards", response_model=dict, status_code=status.HTTP_201_CREATED)
-def create_reward(
+async def create_reward(
     reward: RewardCreate,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """创建奖励"""
-    couple_id = get_user_couple_id(db, current_user["user_id"])
+    couple_id = await get_user_couple_id(db, current_user["user_id"], current_user.get("couple_id"))
 
     if not couple_id:
         raise HTTPException(
@@ -308,7 +560,7 @@ def create_reward(
             detail="情侣信息不存在"
         )
 
-    reward_id = db.create_couple_reward(
+    reward_id = await db.create_couple_reward(
         couple_id,
         reward.name,
         reward.points_needed,
@@ -328,14 +580,14 @@ def create_reward(
     }
 
 @app.put("/rewards/{reward_id}", response_model=dict, status_code=status.HTTP_200_OK)
-def update_reward(
+async def update_reward(
     reward_id: str,
     reward: RewardUpdate,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """更新奖励"""
     # 验证奖励是否属于当前用户
-    couple_id = get_user_couple_id(db, current_user["user_id"])
+    couple_id = await get_user_couple_id(db, current_user["user_id"], current_user.get("couple_id"))
 
     if not couple_id:
         raise HTTPException(
@@ -343,18 +595,15 @@ def update_reward(
             detail="情侣信息不存在"
         )
 
-    # 获取奖励信息验证所有权
-    rewards = db.get_couple_rewards(couple_id)
-    reward_exists = any(r["reward_id"] == reward_id for r in rewards)
-
-    if not reward_exists:
+    if not reward.model_dump(exclude_none=True):
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="无权修改此奖励"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="更新奖励失败"
         )
 
-    # 更新奖励
-    success = db.update_couple_reward(
+    # 按 (reward_id, couple_id) 更新，没有更新到说明奖励不存在或不属于当前用户
+    success = await db.update_couple_reward(
+        couple_id,
         reward_id,
         reward.name,
         reward.points_needed,
@@ -364,20 +613,20 @@ def update_reward(
 
     if not success:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="更新奖励失败"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权修改此奖励"
         )
 
     return {"message": "奖励更新成功"}
 
 @app.delete("/rewards/{reward_id}", response_model=dict, status_code=status.HTTP_200_OK)
-def delete_reward(
+async def delete_reward(
     reward_id: str,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """删除奖励"""
     # 验证奖励是否属于当前用户
-    couple_id = get_user_couple_id(db, current_user["user_id"])
+    couple_id = await get_user_couple_id(db, current_user["user_id"], current_user.get("couple_id"))
 
     if not couple_id:
         raise HTTPException(
@@ -385,36 +634,26 @@ def delete_reward(
             detail="情侣信息不存在"
         )
 
-    # 获取奖励信息验证所有权
-    rewards = db.get_couple_rewards(couple_id)
-    reward_exists = any(r["reward_id"] == reward_id for r in rewards)
+    # 按 (reward_id, couple_id) 删除，没有删除到说明奖励不存在或不属于当前用户
+    success = await db.delete_couple_reward(couple_id, reward_id)
 
-    if not reward_exists:
+    if not success:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="无权删除此奖励"
         )
 
-    # 删除奖励
-    success = db.delete_couple_reward(reward_id)
-
-    if not success:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="删除奖励失败"
-        )
-
     return {"message": "奖励删除成功"}
 
 # ==================== 兑换管理API ====================
 
 @app.post("/exchanges", response_model=dict, status_code=status.HTTP_201_CREATED)
-def create_exchange(
+async def create_exchange(
     exchange: ExchangeRequest,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """兑换奖励"""
-    couple_id = get_user_couple_id(db, current_user["user_id"])
+    couple_id = await get_user_couple_id(db, current_user["user_id"], current_user.get("couple_id"))
 
     if not couple_id:
         raise HTTPException(
@@ -422,45 +661,35 @@ def create_exchange(
             detail="情侣信息不存在"
         )
 
-    # 获取奖励信息
-    rewards = db.get_couple_rewards(couple_id)
-    reward = next((r for r in rewards if r["reward_id"] == exchange.reward_id), None)
+    # 扣库存、扣积分、写记录在同一个事务中完成
+    result = await db.redeem_reward(couple_id, exchange.reward_id)
 
-    if not reward:
+    if result.get("error") == "reward_not_found":
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="奖励不存在"
         )
 
-    # 创建兑换记录
-    record_id = db.create_exchange_record(
-        couple_id,
-        exchange.reward_id,
-        reward["points_needed"]
-    )
-
-    if not record_id:
+    if "error" in result:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="兑换失败，可能是积分不足或库存不足"
         )
 
-    # 获取更新后的积分
-    couple = db.get_couple_by_id(couple_id)
-
     return {
         "message": "兑换成功",
-        "record_id": record_id,
-        "new_points": couple["points"]
+        "record_id": result["record_id"],
+        "new_points": result["new_points"]
     }
 
 @app.get("/exchanges", response_model=dict, status_code=status.HTTP_200_OK)
-def get_my_exchanges(
+async def get_my_exchanges(
     limit: int = 50,
+    cursor: Optional[str] = None,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """获取我的兑换记录"""
-    couple_id = get_user_couple_id(db, current_user["user_id"])
+    couple_id = await get_user_couple_id(db, current_user["user_id"], current_user.get("couple_id"))
 
     if not couple_id:
         raise HTTPException(
@@ -468,47 +697,145 @@ def get_my_exchanges(
             detail="情侣信息不存在"
         )
 
-    records = db.get_exchange_records(couple_id, limit)
+    records, next_cursor = await paginate(
+        lambda n, c: db.get_exchange_records(couple_id, n, c), limit, cursor, "exchange_time"
+    )
 
     return {
-        "exchanges": records
+        "exchanges": records,
+        "next_cursor": next_cursor
     }
 
 @app.get("/exchanges/all", response_model=dict, status_code=status.HTTP_200_OK)
-def get_all_exchanges(
+async def get_all_exchanges(
     limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "exchange_time",
+    order: str = "desc",
+    couple_id: Optional[str] = None,
+    min_points: Optional[int] = None,
+    max_points: Optional[int] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
     current_user: Dict[str, Any] = Depends(require_admin)
 ):
-    """获取所有兑换记录（管理员）"""
-    records = db.get_all_exchange_records(limit)
+    """分页获取所有兑换记录（管理员），sort 可选 exchange_time / points_used"""
+    records, next_cursor = await paginate(
+        lambda n, c: db.get_all_exchange_records(
+            n, c, sort, order, couple_id=couple_id,
+            min_points=min_points, max_points=max_points, since=since, until=until
+        ),
+        limit, cursor, sort
+    )
 
     return {
-        "exchanges": records
+        "exchanges": records,
+        "next_cursor": next_cursor
     }
 
 # ==================== 管理员API ====================
 
 @app.get("/admin/stats", response_model=dict, status_code=status.HTTP_200_OK)
-def get_admin_stats(current_user: Dict[str, Any] = Depends(require_admin)):
-    """获取系统统计信息（管理员）"""
-    couples = db.get_all_couples()
-    exchanges = db.get_all_exchange_records(1000)
+async def get_admin_stats(
+    days: int = 7,
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """获取系统统计信息（管理员），days 为返回的每日统计天数"""
+    stats = await db.get_stats()
+    stats["daily"] = await db.get_daily_stats(max(0, min(days, 366)))
+    return stats
+
+@app.get("/admin/users", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_all_users(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    sort: str = "created_time",
+    order: str = "desc",
+    username: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """分页获取用户列表（管理员），sort 可选 created_time / username"""
+    users, next_cursor = await paginate(
+        lambda n, c: db.get_all_users(
+            n, c, sort, order, username=username, since=since, until=until
+        ),
+        limit, cursor, sort
+    )
+
+    return {
+        "users": [
+            {
+                "user_id": u["id"],
+                "username": u["username"],
+                "is_admin": bool(u["is_admin"]),
+                "created_time": u["created_time"]
+            }
+            for u in users
+        ],
+        "next_cursor": next_cursor
+    }
+
+@app.get("/admin/db", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_db_status(current_user: Dict[str, Any] = Depends(require_admin)):
+    """获取数据库 PRAGMA 配置、连接池、维护状态和会话清理统计（管理员）"""
+    return {
+        "configured_pragmas": db.pragmas,
+        "active_pragmas": await db.get_active_pragmas(),
+        "pool": db.pool.stats(),
+        "maintenance": db.maintenance_status,
+        "couple_cache": couple_id_cache.stats(),
+        "sessions": await session_call(session_expirer.stats),
+        "session_refresh": session_refresher.stats(),
+        "password_hasher": password_hasher.stats(),
+        "rate_limit": (await run_in_threadpool(rate_limiter.stats)
+                       if rate_limiter.backend.blocking else rate_limiter.stats())
+    }
 
-    total_points = sum(c["points"] for c in couples)
-    total_exchanges = len(exchanges)
+@app.get("/admin/queries", response_model=dict, status_code=status.HTTP_200_OK)
+async def get_query_profile(
+    limit: int = 10,
+    sort: str = "total_ms",
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """获取耗时最多的 SQL 语句（管理员，需要 DB_PROFILE=1）"""
+    profiler = database.profiler
+    if profiler is None:
+        return {"enabled": False, "queries": []}
+
+    try:
+        queries = profiler.top(max(1, min(limit, MAX_PAGE_SIZE)), sort)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return {
-        "total_couples": len(couples),
-        "total_points": total_points,
-        "total_exchanges": total_exchanges
+        "enabled": True,
+        "slow_threshold_ms": profiler.slow_threshold_ms,
+        "slow_count": profiler.slow_count,
+        "queries": queries
     }
 
+@app.delete("/admin/queries", response_model=dict, status_code=status.HTTP_200_OK)
+async def reset_query_profile(current_user: Dict[str, Any] = Depends(require_admin)):
+    """清空 SQL 统计（管理员）"""
+    if database.profiler:
+        database.profiler.reset()
+    return {"message": "统计已清空"}
+
 # ==================== 健康检查API ====================
 
 @app.get("/health", response_model=dict, status_code=status.HTTP_200_OK)
-def health_check():
+async def health_check():
     """健康检查端点"""
     return {"status": "healthy", "message": "💕 心动积分系统 v2.0 运行正常"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus 文本格式的运行指标"""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 # 根路径路由已移至 app.py，用于提供前端页面
 # API 信息可通过 /docs 查看
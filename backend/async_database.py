@@ -0,0 +1,72 @@
+"""
+异步数据库访问层
+包装 Database，提供同名的 async 方法，SQLite 调用在线程中执行，不阻塞事件循环
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from backend.database import Database
+
+
+# 可选的后端
+BACKEND_ASYNC = "async"    # 专用数据库线程池，线程数与连接池大小一致
+BACKEND_SYNC = "sync"      # 使用 Starlette 默认线程池（与同步 def 路由相同）
+
+# 不涉及 I/O 或需要同步调用的方法，直接透传
+_PASSTHROUGH = {
+    "hash_password", "generate_id", "get_connection", "connection",
+    "close", "start_maintenance", "stop_maintenance",
+}
+
+
+class AsyncDatabase:
+    """Database 的异步包装，方法名和参数与 Database 完全一致"""
+
+    def __init__(self, db: Database, backend: str = BACKEND_ASYNC,
+                 max_workers: Optional[int] = None):
+        """
+        初始化异步数据库
+
+        Args:
+            db: 同步 Database 实例
+            backend: "async" 使用专用线程池，"sync" 使用 Starlette 默认线程池
+            max_workers: 专用线程池大小，默认与连接池大小相同
+        """
+        if backend not in (BACKEND_ASYNC, BACKEND_SYNC):
+            raise ValueError(f"未知的数据库后端: {backend}")
+
+        self.db = db
+        self.backend = backend
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if backend == BACKEND_ASYNC:
+            workers = max_workers or max(1, db.pool.size)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在数据库线程中执行任意同步函数"""
+        call = functools.partial(func, *args, **kwargs)
+        if self._executor is None:
+            return await run_in_threadpool(call)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, call)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.db, name)
+        if name.startswith("_") or name in _PASSTHROUGH or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        return wrapper
+
+    def close(self):
+        """关闭线程池（等待进行中的调用完成）和底层数据库，应用关闭时调用"""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+        self.db.close()
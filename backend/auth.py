@@ -1,141 +1,278 @@
 """
 用户认证和会话管理
 """
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
+import os
 import secrets
+import threading
 from functools import wraps
 from fastapi import HTTPException, Request, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 
+from backend.session_store import (
+    SessionStore, MemorySessionStore, SessionExpirer, RefreshCoalescer, create_session_store
+)
+from backend.session_tokens import TokenSigner
 
-# 会话存储（简单的内存存储，生产环境应使用Redis等）
+
+# 会话存储，SESSION_STORE 可选:
+#   memory - 进程内存储（默认，仅适用于单个 worker）
+#   sqlite - 共享的 SQLite 文件（SESSION_DB_PATH），可配合 --workers N 使用
 sessions: Dict[str, Dict[str, Any]] = {}
+if os.environ.get("SESSION_STORE", "memory") == "sqlite":
+    session_store: SessionStore = create_session_store(
+        "sqlite", db_path=os.environ.get("SESSION_DB_PATH", "data/sessions.db")
+    )
+else:
+    session_store = MemorySessionStore(sessions)
 
 # 会话过期时间（小时）
 SESSION_EXPIRE_HOURS = 24
 
+# 剩余有效期低于该比例时才续期（1.0 表示每次请求都续期）
+SESSION_REFRESH_THRESHOLD = float(os.environ.get("SESSION_REFRESH_THRESHOLD", 0.5))
+
+# 合并续期写入
+session_refresher = RefreshCoalescer(
+    session_store, timedelta(hours=SESSION_EXPIRE_HOURS), threshold=SESSION_REFRESH_THRESHOLD
+)
+
+# 后台清理过期会话，由 API 启动时按 SESSION_CLEANUP_INTERVAL 开启
+session_expirer = SessionExpirer(session_store, refresher=session_refresher)
+
+# 会话模式，SESSION_MODE 可选:
+#   stateful  - 令牌是随机字符串，会话保存在 session_store 中（默认）
+#   stateless - HMAC 签名令牌，自带用户信息和过期时间，必须设置 SESSION_SECRET，
+#               所有进程/机器使用相同的值
+# 无状态令牌的登出吊销记录保存在 session_store 中: SESSION_STORE=sqlite 时所有 worker 共享且重启不丢失；
+# 使用内存存储时吊销只在当前进程有效，多 worker 部署下已登出的令牌在其他进程中直到过期前仍然有效
+SESSION_MODE = os.environ.get("SESSION_MODE", "stateful")
+token_signer: Optional[TokenSigner] = None
+if SESSION_MODE == "stateless":
+    if not os.environ.get("SESSION_SECRET"):
+        raise RuntimeError("SESSION_MODE=stateless 需要设置 SESSION_SECRET（所有 worker 相同）")
+    token_signer = TokenSigner(os.environ["SESSION_SECRET"], revocations=session_store)
+
+# user_id -> couple_id 缓存的最大条目数
+COUPLE_CACHE_SIZE = 10000
+
 security = HTTPBearer()
 
 
+class CoupleIdCache:
+    """user_id -> couple_id 映射的 LRU 缓存"""
+
+    def __init__(self, max_size: int = COUPLE_CACHE_SIZE):
+        self.max_size = max_size
+        self._data: "OrderedDict[int, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[str]:
+        """查询缓存，命中时移到最近使用位置"""
+        with self._lock:
+            couple_id = self._data.get(user_id)
+            if couple_id is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(user_id)
+            self.hits += 1
+            return couple_id
+
+    def put(self, user_id: int, couple_id: str):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._data[user_id] = couple_id
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """情侣关系创建或删除时清除对应条目"""
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率统计"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+couple_id_cache = CoupleIdCache()
+
+
 class SessionManager:
     """会话管理器"""
 
     @staticmethod
-    def create_session(user_id: int, username: str, is_admin: bool) -> str:
-        """创建会话"""
+    def create_session(user_id: int, username: str, is_admin: bool,
+                       couple_id: Optional[str] = None) -> str:
+        """创建会话（无状态模式下 couple_id 会写入令牌）"""
+        if token_signer:
+            return token_signer.issue(
+                user_id, username, is_admin, couple_id, SESSION_EXPIRE_HOURS * 3600
+            )
+
         token = secrets.token_urlsafe(32)
-        sessions[token] = {
+        session_store.create(token, {
             "user_id": user_id,
             "username": username,
             "is_admin": is_admin,
             "created_at": datetime.now(),
             "expires_at": datetime.now() + timedelta(hours=SESSION_EXPIRE_HOURS)
-        }
+        })
         return token
 
     @staticmethod
     def get_session(token: str) -> Optional[Dict[str, Any]]:
         """获取会话信息"""
-        if token not in sessions:
-            return None
+        if token_signer:
+            return token_signer.verify(token)
 
-        session = sessions[token]
+        session = session_store.get(token)
+        if session is None:
+            return None
 
         # 检查是否过期
         if datetime.now() > session["expires_at"]:
-            del sessions[token]
+            session_store.delete(token)
             return None
 
         return session
 
     @staticmethod
     def delete_session(token: str) -> bool:
-        """删除会话（登出）"""
-        if token in sessions:
-            del sessions[token]
-            return True
-        return False
+        """删除会话（登出），无状态模式下吊销令牌"""
+        if token_signer:
+            return token_signer.revoke(token)
+        return session_store.delete(token)
 
     @staticmethod
-    def refresh_session(token: str) -> bool:
-        """刷新会话过期时间"""
-        if token in sessions:
-            sessions[token]["expires_at"] = datetime.now() + timedelta(hours=SESSION_EXPIRE_HOURS)
-            return True
-        return False
+    def refresh_session(token: str, session: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        刷新会话过期时间（无状态令牌的过期时间固定，不刷新）
+
+        剩余有效期充足时跳过，需要续期时合并批量写入，返回是否安排了续期
+        """
+        if token_signer:
+            return False
+        if session is None:
+            session = session_store.get(token)
+            if session is None:
+                return False
+        return session_refresher.refresh(token, session)
 
     @staticmethod
-    def cleanup_expired_sessions():
-        """清理过期会话"""
-        now = datetime.now()
-        expired_tokens = [
-            token for token, session in sessions.items()
-            if now > session["expires_at"]
-        ]
-        for token in expired_tokens:
-            del sessions[token]
-
-
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
+    def cleanup_expired_sessions() -> int:
+        """清理过期会话，返回清理数量"""
+        return session_store.cleanup_expired(datetime.now())
+
+
+async def session_call(func: Callable, *args) -> Any:
+    """
+    在 async 路由和依赖中调用会话操作
+
+    SQLite 存储要从连接池取连接并可能等待写锁（busy_timeout），放到线程池执行，不阻塞事件循环；
+    内存存储直接调用
+    """
+    if isinstance(session_store, MemorySessionStore):
+        return func(*args)
+    return await run_in_threadpool(func, *args)
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
     """获取当前登录用户（依赖注入）"""
     token = credentials.credentials
-    session = SessionManager.get_session(token)
+    session = await session_call(SessionManager.get_session, token)
 
     if not session:
         raise HTTPException(status_code=401, detail="未登录或会话已过期")
 
     # 刷新会话
-    SessionManager.refresh_session(token)
+    if not token_signer:
+        SessionManager.refresh_session(token, session)
 
     return {
         "user_id": session["user_id"],
         "username": session["username"],
-        "is_admin": session["is_admin"]
+        "is_admin": session["is_admin"],
+        "couple_id": session.get("couple_id")
     }
 
 
-def get_current_user_optional(request: Request) -> Optional[Dict[str, Any]]:
+async def get_current_user_optional(request: Request) -> Optional[Dict[str, Any]]:
     """获取当前用户（可选，不强制登录）"""
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         return None
 
     token = auth_header.replace("Bearer ", "")
-    session = SessionManager.get_session(token)
+    session = await session_call(SessionManager.get_session, token)
 
     if session:
-        SessionManager.refresh_session(token)
+        if not token_signer:
+            SessionManager.refresh_session(token, session)
         return {
             "user_id": session["user_id"],
             "username": session["username"],
-            "is_admin": session["is_admin"]
+            "is_admin": session["is_admin"],
+            "couple_id": session.get("couple_id")
         }
 
     return None
 
 
-def require_admin(current_user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
+async def require_admin(current_user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
     """要求管理员权限"""
     if not current_user.get("is_admin"):
         raise HTTPException(status_code=403, detail="需要管理员权限")
     return current_user
 
 
-def get_user_couple_id(db, user_id: int) -> Optional[str]:
-    """获取用户的情侣ID"""
-    couple = db.get_couple_by_user_id(user_id)
+async def get_user_couple_id(db, user_id: int, couple_id: Optional[str] = None) -> Optional[str]:
+    """
+    获取用户的情侣ID（db 为 AsyncDatabase，结果会被缓存）
+
+    Args:
+        couple_id: 会话令牌中已携带的情侣ID，存在时直接返回，不查缓存和数据库
+    """
+    if couple_id:
+        return couple_id
+
+    couple_id = couple_id_cache.get(user_id)
+    if couple_id:
+        return couple_id
+
+    couple = await db.get_couple_by_user_id(user_id)
     if couple:
+        couple_id_cache.put(user_id, couple["couple_id"])
         return couple["couple_id"]
     return None
 
 
-def verify_couple_access(db, couple_id: str, current_user: Dict[str, Any]) -> bool:
+async def verify_couple_access(db, couple_id: str, current_user: Dict[str, Any]) -> bool:
     """验证用户是否有权访问指定情侣的数据"""
     # 管理员可以访问所有数据
     if current_user.get("is_admin"):
         return True
 
     # 普通用户只能访问自己的数据
-    user_couple_id = get_user_couple_id(db, current_user["user_id"])
+    user_couple_id = await get_user_couple_id(
+        db, current_user["user_id"], current_user.get("couple_id")
+    )
     return user_couple_id == couple_id
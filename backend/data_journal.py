@@ -0,0 +1,199 @@
+"""
+DataManager 的追加写日志
+- 每次变更追加一行紧凑 JSON: {"seq": 序号, "op": 操作, "data": 参数}，写入是 O(1)，
+  不再重写整个 system_data.json
+- 写入只进入操作系统缓冲区，后台线程按组 fsync: 每隔 fsync_interval 秒，
+  或积累 fsync_batch 条未刷盘记录时立即刷盘，多次写入共享一次 fsync
+- 压缩时 rotate() 把当前日志改名为 .old 并开始新日志，快照写完后 discard_rotated() 删除 .old；
+  快照记录它包含的最后一个序号，重放时跳过序号不大于它的记录，压缩中途崩溃也不会重复应用
+- 崩溃留下的半行记录在 open() 时截掉
+"""
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+
+class Journal:
+    """追加写日志文件，带分组 fsync"""
+
+    def __init__(self, path: str, fsync_interval: float = 0.05, fsync_batch: int = 256):
+        """
+        初始化日志
+
+        Args:
+            path: 日志文件路径，压缩期间的旧日志为 path + ".old"
+            fsync_interval: 后台刷盘间隔（秒）
+            fsync_batch: 未刷盘记录达到该数量时立即唤醒刷盘线程
+        """
+        self.path = path
+        self.old_path = path + ".old"
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = max(1, fsync_batch)
+        self.seq = 0
+        self._synced_seq = 0
+        self._file = None
+        self._lock = threading.Lock()
+        # 刷盘和关闭/轮转互斥，刷盘期间不阻塞追加
+        self._sync_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 统计信息
+        self.appended = 0
+        self.fsyncs = 0
+
+    # ==================== 读取 ====================
+
+    @staticmethod
+    def _read(path: str, after_seq: int) -> Iterator[Dict[str, Any]]:
+        """读取一个日志文件中序号大于 after_seq 的记录，遇到损坏的行时停止"""
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    return
+                if record["seq"] > after_seq:
+                    yield record
+
+    def replay(self, after_seq: int = 0) -> Iterator[Dict[str, Any]]:
+        """按顺序读取旧日志和当前日志中序号大于 after_seq 的记录"""
+        yield from self._read(self.old_path, after_seq)
+        yield from self._read(self.path, after_seq)
+
+    def has_rotated(self) -> bool:
+        """是否有上次压缩未完成留下的旧日志"""
+        return os.path.exists(self.old_path)
+
+    # ==================== 写入 ====================
+
+    def open(self, seq: int):
+        """
+        打开日志准备追加，截掉末尾不完整或损坏的记录并启动刷盘线程
+
+        Args:
+            seq: 已有的最大序号（快照和重放记录中的最大值），新记录从它之后编号
+        """
+        valid = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        json.loads(line)
+                    except ValueError:
+                        break
+                    valid += len(line)
+            if valid < os.path.getsize(self.path):
+                print(f"日志末尾有不完整的记录，已截断: {self.path}")
+                os.truncate(self.path, valid)
+
+        self.seq = self._synced_seq = seq
+        self._file = open(self.path, "ab")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="data-journal-fsync", daemon=True)
+        self._thread.start()
+
+    def append(self, op: str, data: Dict[str, Any]) -> int:
+        """追加一条记录，返回它的序号（尚未 fsync）"""
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError("日志未打开")
+            self.seq += 1
+            line = json.dumps(
+                {"seq": self.seq, "op": op, "data": data},
+                ensure_ascii=False, separators=(",", ":")
+            )
+            self._file.write(line.encode() + b"\n")
+            self._file.flush()
+            self.appended += 1
+            if self.seq - self._synced_seq >= self.fsync_batch:
+                self._wake.set()
+            return self.seq
+
+    def sync(self):
+        """把已追加的记录刷到磁盘"""
+        with self._sync_lock:
+            with self._lock:
+                if self._file is None or self._synced_seq == self.seq:
+                    return
+                seq = self.seq
+                fd = self._file.fileno()
+            os.fsync(fd)
+            self._synced_seq = seq
+            self.fsyncs += 1
+
+    def _run(self):
+        """刷盘线程主循环"""
+        while not self._stop.is_set():
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            self.sync()
+
+    # ==================== 压缩 ====================
+
+    def rotate(self) -> int:
+        """
+        结束当前日志，之后的记录写入新文件
+
+        调用方需保证轮转期间没有新的变更（持有数据锁），
+        返回值是快照应记录的最后一个序号
+
+        Returns:
+            轮转前最后一条记录的序号
+        """
+        self.sync()
+        with self._sync_lock, self._lock:
+            self._file.close()
+            if os.path.exists(self.old_path):
+                # 上次压缩没有完成，把当前日志接在旧日志后面，不能覆盖
+                with open(self.old_path, "ab") as old, open(self.path, "rb") as current:
+                    shutil.copyfileobj(current, old)
+                    old.flush()
+                    os.fsync(old.fileno())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.old_path)
+            self._file = open(self.path, "ab")
+            return self.seq
+
+    def discard_rotated(self):
+        """快照写入成功后删除旧日志"""
+        if os.path.exists(self.old_path):
+            os.remove(self.old_path)
+
+    def size(self) -> int:
+        """当前日志文件字节数"""
+        with self._lock:
+            return self._file.tell() if self._file else 0
+
+    def close(self):
+        """停止刷盘线程，刷盘并关闭文件"""
+        if self._thread:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.sync()
+        with self._sync_lock, self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        """日志统计"""
+        return {
+            "seq": self.seq,
+            "unsynced": self.seq - self._synced_seq,
+            "appended": self.appended,
+            "fsyncs": self.fsyncs,
+            "bytes": self.size(),
+        }
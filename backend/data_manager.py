@@ -1,25 +1,78 @@
 """
 心动积分项目 - 数据管理模块
 负责数据结构定义、文件存储和数据验证
+
+存储模式:
+- json: 每次变更重写整个 system_data.json
+- journal: 变更追加到 system_data.journal（见 backend.data_journal），
+  后台定期把内存数据压缩成 system_data.json 快照并清空日志；加载时读快照再重放日志
+
+快照先写临时文件并 fsync，再 os.replace 整体替换，崩溃不会留下半个文件；
+备份是最新快照的硬链接，不再做第二次序列化
+
+情侣的积分历史保存在列式存储中（见 backend.history_store），快照中仍是字典列表；
+列式存储共用的原因表有固定上限，不计入 cache_bytes，占用见 stats()["reasons"]
+
+lazy=True 时不在启动时解析整个快照（见 backend.lazy_couples）: 只读取情侣的偏移索引，
+Couple 和它的历史记录在第一次访问时才加载，超过 cache_bytes 后淘汰最久未使用的；
+写快照时未修改的情侣直接复制原快照中的字节。这个模式下请通过 DataManager 的方法修改情侣，
+直接改 Couple 对象的修改可能随缓存淘汰丢失
 """
 
 import json
 import os
+import shutil
+import threading
+import time
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
+from backend.data_journal import Journal
+from backend.history_store import REASONS, HistoryColumns, TimeBound
+from backend.lazy_couples import LazyCouples, SnapshotPlan, load_index, read_fields, save_index
+
+STORAGE_MODES = ("json", "journal")
+
+
+def _fsync_dir(path: str):
+    """fsync 目录，让 rename 本身落盘（不支持目录 fsync 的平台上忽略）"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
 
 class DataManager:
     """数据处理管理器 - 负责数据结构、文件存储和数据验证"""
 
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", storage: str = "json",
+                 fsync_interval: float = 0.05, compact_bytes: int = 4 * 1024 * 1024,
+                 compact_interval: float = 300.0, lazy: bool = False,
+                 cache_bytes: int = 64 * 1024 * 1024):
         """
         初始化数据管理器
 
         Args:
             data_dir: 数据存储目录
+            storage: 存储模式，json 或 journal
+            fsync_interval: journal 模式下分组 fsync 的间隔（秒）
+            compact_bytes: journal 模式下日志超过该大小时压缩
+            compact_interval: journal 模式下日志非空时最长多久压缩一次（秒）
+            lazy: 按需加载情侣，不在启动时解析全部历史记录
+            cache_bytes: lazy 模式下已加载情侣的大小上限（按快照中的字节数估算）
         """
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"未知的存储模式: {storage}")
         self.data_dir = data_dir
+        self.storage = storage
+        self.lazy = lazy
+        self.cache_bytes = cache_bytes
         self.main_file = os.path.join(data_dir, "system_data.json")
         self.backup_dir = os.path.join(data_dir, "backups")
 
@@ -29,9 +82,28 @@ class DataManager:
 
         # 内存中的数据
         self.couples: Dict[str, 'DataManager.Couple'] = {}
+        if lazy:
+            self.couples = LazyCouples(None, {}, self.Couple.from_dict, cache_bytes)
         self.rewards: List['DataManager.Reward'] = []
         self.exchange_records: List['DataManager.ExchangeRecord'] = []
 
+        # 变更和压缩时取快照互斥
+        self._lock = threading.RLock()
+        self.journal: Optional[Journal] = None
+        if storage == "journal":
+            self.journal = Journal(
+                os.path.join(data_dir, "system_data.journal"), fsync_interval=fsync_interval
+            )
+        self.compact_bytes = compact_bytes
+        self.compact_interval = compact_interval
+        self.compactions = 0
+        # json 模式下最近一次保存失败时为真，备份前需要重新保存
+        self._unsaved = False
+        self._loaded = False
+        self._compact_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+
     # ==================== 数据结构类 ====================
 
     class Couple:
@@ -41,15 +113,25 @@ class DataManager:
             self.couple_id = couple_id
             self.names = [name1, name2]
             self.points = 0
-            self.history: List[Dict[str, Any]] = []
+            self._history = HistoryColumns()
             self.created_time = datetime.now().isoformat()
 
+        @property
+        def history(self) -> HistoryColumns:
+            """积分历史（列式存储，按需生成字典的只读序列，可以 append）"""
+            return self._history
+
+        @history.setter
+        def history(self, entries):
+            self._history = entries if isinstance(entries, HistoryColumns) else HistoryColumns(entries)
+
         def to_dict(self) -> dict:
+            """转换为字典，history 每次生成新的列表"""
             return {
                 "couple_id": self.couple_id,
                 "names": self.names,
                 "points": self.points,
-                "history": self.history,
+                "history": self._history.to_list(),
                 "created_time": self.created_time
             }
 
@@ -57,7 +139,7 @@ class DataManager:
         def from_dict(cls, data: dict) -> 'DataManager.Couple':
             couple = cls(data["couple_id"], data["names"][0], data["names"][1])
             couple.points = data.get("points", 0)
-            couple.history = data.get("history", [])
+            couple.history = HistoryColumns(data.get("history", []))
             couple.created_time = data.get("created_time", datetime.now().isoformat())
             return couple
 
@@ -155,10 +237,13 @@ class DataManager:
 
     def add_couple(self, couple_id: str, name1: str, name2: str) -> bool:
         """添加情侣"""
-        if couple_id in self.couples:
-            return False
-        self.couples[couple_id] = self.Couple(couple_id, name1, name2)
-        self.save_all_data()
+        with self._lock:
+            if couple_id in self.couples:
+                return False
+            couple = self.couples[couple_id] = self.Couple(couple_id, name1, name2)
+            self._persist("couple", {
+                "couple_id": couple_id, "names": couple.names, "created_time": couple.created_time
+            })
         return True
 
     def get_couple(self, couple_id: str) -> Optional['DataManager.Couple']:
@@ -169,14 +254,34 @@ class DataManager:
         """获取所有情侣"""
         return list(self.couples.values())
 
+    def get_history(self, couple_id: str, since: TimeBound = None,
+                    until: TimeBound = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        按时间范围查询情侣的积分历史
+
+        Args:
+            couple_id: 情侣ID
+            since: 起始时间（含），ISO 字符串或 datetime，None 表示不限
+            until: 结束时间（不含），None 表示不限
+
+        Returns:
+            历史记录列表，情侣不存在时返回 None
+        """
+        couple = self.get_couple(couple_id)
+        if couple is None:
+            return None
+        return couple.history.between(since, until)
+
     def add_reward(self, reward_id: str, name: str, points_needed: int, 
                    stock: int, description: str = "") -> bool:
         """添加奖励"""
-        for reward in self.rewards:
-            if reward.reward_id == reward_id:
-                return False
-        self.rewards.append(self.Reward(reward_id, name, points_needed, stock, description))
-        self.save_all_data()
+        with self._lock:
+            for reward in self.rewards:
+                if reward.reward_id == reward_id:
+                    return False
+            reward = self.Reward(reward_id, name, points_needed, stock, description)
+            self.rewards.append(reward)
+            self._persist("reward", reward.to_dict())
         return True
 
     def get_all_rewards(self) -> List['DataManager.Reward']:
@@ -185,27 +290,29 @@ class DataManager:
 
     def add_points_history(self, couple_id: str, points_change: int, reason: str) -> bool:
         """添加积分变动记录"""
-        couple = self.get_couple(couple_id)
-        if not couple:
-            return False
-        
-        couple.points += points_change
-        couple.history.append({
-            "timestamp": datetime.now().isoformat(),
-            "points_change": points_change,
-            "reason": reason,
-            "new_balance": couple.points
-        })
-        self.save_all_data()
+        with self._lock:
+            couple = self._get_for_update(couple_id)
+            if not couple:
+                return False
+
+            couple.points += points_change
+            entry = {
+                "timestamp": datetime.now().isoformat(),
+                "points_change": points_change,
+                "reason": reason,
+                "new_balance": couple.points
+            }
+            couple.history.append(entry)
+            self._persist("points", {"couple_id": couple_id, "entry": entry})
         return True
 
     def add_exchange_record(self, couple_id: str, reward_id: str, points_used: int) -> bool:
         """添加兑换记录"""
         record_id = f"EX{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        self.exchange_records.append(
-            self.ExchangeRecord(record_id, couple_id, reward_id, points_used)
-        )
-        self.save_all_data()
+        with self._lock:
+            record = self.ExchangeRecord(record_id, couple_id, reward_id, points_used)
+            self.exchange_records.append(record)
+            self._persist("exchange", record.to_dict())
         return True
 
     def get_all_exchange_records(self) -> List['DataManager.ExchangeRecord']:
@@ -216,7 +323,10 @@ class DataManager:
 
     def get_stats(self) -> dict:
         """获取系统统计信息"""
-        total_points = sum(c.points for c in self.couples.values())
+        if self.lazy:
+            total_points = sum(self.couples.points(couple_id) for couple_id in self.couples)
+        else:
+            total_points = sum(c.points for c in self.couples.values())
         return {
             "total_couples": len(self.couples),
             "total_rewards": len(self.rewards),
@@ -227,60 +337,265 @@ class DataManager:
 
     # ==================== 数据持久化方法 ====================
 
+    def _to_data(self) -> dict:
+        """
+        内存数据转换为可序列化的字典（历史列表是新生成的，序列化期间可以继续变更）
+
+        lazy 模式下 couples 是 SnapshotPlan，只包含修改过的情侣
+        """
+        if self.lazy:
+            couples = self.couples.capture(lambda couple: couple.to_dict())
+        else:
+            couples = {k: v.to_dict() for k, v in self.couples.items()}
+        return {
+            "couples": couples,
+            "rewards": [r.to_dict() for r in self.rewards],
+            "exchange_records": [e.to_dict() for e in self.exchange_records],
+        }
+
+    def _get_for_update(self, couple_id: str) -> Optional['DataManager.Couple']:
+        """取出准备修改的情侣，lazy 模式下同时标记为已修改，写入快照之前不会被淘汰"""
+        if self.lazy:
+            return self.couples.pin(couple_id)
+        return self.couples.get(couple_id)
+
+    def _persist(self, op: str, data: Dict[str, Any]) -> bool:
+        """持久化一次变更: json 模式重写整个文件，journal 模式追加一条日志"""
+        if self.journal is None:
+            return self.save_all_data()
+        if not self._loaded:
+            raise RuntimeError("journal 模式需要先调用 load_all_data")
+        self.journal.append(op, data)
+        return True
+
+    def _apply(self, op: str, data: Dict[str, Any]):
+        """重放一条日志记录"""
+        if op == "couple":
+            couple = self.Couple(data["couple_id"], *data["names"])
+            couple.created_time = data["created_time"]
+            self.couples[couple.couple_id] = couple
+        elif op == "points":
+            couple = self._get_for_update(data["couple_id"])
+            if couple:
+                couple.history.append(data["entry"])
+                couple.points = data["entry"]["new_balance"]
+        elif op == "reward":
+            self.rewards.append(self.Reward.from_dict(data))
+        elif op == "exchange":
+            self.exchange_records.append(self.ExchangeRecord.from_dict(data))
+        else:
+            raise ValueError(f"未知的日志操作: {op}")
+
     def save_all_data(self) -> bool:
-        """保存所有数据到文件"""
-        try:
-            data = {
-                "couples": {k: v.to_dict() for k, v in self.couples.items()},
-                "rewards": [r.to_dict() for r in self.rewards],
-                "exchange_records": [e.to_dict() for e in self.exchange_records],
-                "last_updated": datetime.now().isoformat()
-            }
-            with open(self.main_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+        """保存所有数据到文件（原子替换；journal 模式下立即压缩）"""
+        if self.journal is not None:
+            return self.compact()
+        with self._lock:
+            try:
+                data = self._to_data()
+                data["last_updated"] = datetime.now().isoformat()
+            except Exception as e:
+                print(f"保存数据失败: {e}")
+                return False
+            saved = self._write_snapshot(data, indent=2)
+            self._unsaved = not saved
+            return saved
+
+    def load_all_data(self) -> bool:
+        """从文件加载所有数据，journal 模式下加载快照后重放日志"""
+        if self._loaded:
+            # journal 模式下内存数据已经包含全部变更
             return True
+
+        self._remove_stale_temp_files()
+        snapshot_seq = 0
+        try:
+            data = {}
+            index = None
+            if os.path.exists(self.main_file):
+                if self.lazy:
+                    # 只读索引和情侣以外的字段，情侣在访问时加载
+                    index = load_index(self.main_file)
+                    data = read_fields(self.main_file, index)
+                else:
+                    with open(self.main_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                snapshot_seq = data.get("journal_seq", 0)
+
+            with self._lock:
+                if self.lazy:
+                    self.couples.close()
+                    self.couples = LazyCouples(
+                        self.main_file if index else None, index["couples"] if index else {},
+                        self.Couple.from_dict, self.cache_bytes
+                    )
+                else:
+                    self.couples = {}
+                    for k, v in data.get("couples", {}).items():
+                        self.couples[k] = self.Couple.from_dict(v)
+
+                self.rewards = [self.Reward.from_dict(r) for r in data.get("rewards", [])]
+                self.exchange_records = [
+                    self.ExchangeRecord.from_dict(e) for e in data.get("exchange_records", [])
+                ]
         except Exception as e:
-            print(f"保存数据失败: {e}")
+            print(f"加载数据失败: {e}")
             return False
 
-    def load_all_data(self) -> bool:
-        """从文件加载所有数据"""
-        if not os.path.exists(self.main_file):
+        if self.journal is None:
+            return True
+
+        seq = snapshot_seq
+        with self._lock:
+            for record in self.journal.replay(snapshot_seq):
+                self._apply(record["op"], record["data"])
+                seq = record["seq"]
+        self.journal.open(seq)
+        self._loaded = True
+
+        # 上次压缩没有完成，立即补做一次
+        if self.journal.has_rotated():
+            self.compact()
+        self._stop.clear()
+        self._compactor = threading.Thread(
+            target=self._compact_loop, name="data-compactor", daemon=True
+        )
+        self._compactor.start()
+        return True
+
+    def compact(self) -> bool:
+        """
+        把内存数据写成快照并清空日志（journal 模式）
+
+        只在持有数据锁时复制数据和轮转日志，序列化和写文件期间变更照常追加到新日志
+        """
+        if self.journal is None or not self._loaded:
+            return False
+        with self._compact_lock:
+            with self._lock:
+                data = self._to_data()
+                data["journal_seq"] = self.journal.rotate()
+            data["last_updated"] = datetime.now().isoformat()
+            if not self._write_snapshot(data):
+                return False
+            self.journal.discard_rotated()
+            self.compactions += 1
             return True
-        
+
+    def _write_snapshot(self, data: dict, indent: Optional[int] = None) -> bool:
+        """
+        原子写入快照: 写临时文件并 fsync，再用 os.replace 替换 system_data.json 并 fsync 目录
+
+        任何一步失败或进程在中途被杀，system_data.json 仍是上一个完整版本；
+        调用方负责串行化（json 模式持有数据锁，journal 模式持有压缩锁）
+        """
+        temp_file = f"{self.main_file}.{os.getpid()}.tmp"
+        plan = data["couples"] if isinstance(data["couples"], SnapshotPlan) else None
         try:
-            with open(self.main_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            self.couples = {}
-            for k, v in data.get("couples", {}).items():
-                self.couples[k] = self.Couple.from_dict(v)
-            
-            self.rewards = [self.Reward.from_dict(r) for r in data.get("rewards", [])]
-            self.exchange_records = [
-                self.ExchangeRecord.from_dict(e) for e in data.get("exchange_records", [])
-            ]
-            
+            if plan is not None:
+                # lazy 模式: 逐对写出并记录新快照中的偏移
+                with open(temp_file, 'wb') as f:
+                    fields = {k: v for k, v in data.items() if k != "couples"}
+                    index = LazyCouples.write(f, plan, fields)
+                    f.flush()
+                    os.fsync(f.fileno())
+            else:
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=indent,
+                              separators=None if indent else (",", ":"))
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_file, self.main_file)
+            _fsync_dir(self.data_dir)
+            if plan is not None:
+                self.couples.switch(self.main_file, index, plan)
+                save_index(self.main_file, index)
             return True
         except Exception as e:
-            print(f"加载数据失败: {e}")
+            print(f"写入快照失败: {e}")
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
             return False
 
+    def _remove_stale_temp_files(self):
+        """删除崩溃时没来得及替换的临时快照"""
+        prefix = os.path.basename(self.main_file) + "."
+        for name in os.listdir(self.data_dir):
+            if name.startswith(prefix) and name.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(self.data_dir, name))
+                except OSError:
+                    pass
+
+    def _ensure_snapshot(self) -> bool:
+        """确保 system_data.json 包含所有已完成的变更"""
+        if self.journal is not None:
+            if self._loaded and (self.journal.size() or self.journal.has_rotated()
+                                 or not os.path.exists(self.main_file)):
+                return self.compact()
+            return os.path.exists(self.main_file)
+        if self._unsaved or not os.path.exists(self.main_file):
+            return self.save_all_data()
+        return True
+
+    def _compact_loop(self):
+        """后台压缩: 日志超过 compact_bytes，或非空且距上次压缩超过 compact_interval"""
+        last = time.monotonic()
+        while not self._stop.wait(min(1.0, self.compact_interval)):
+            size = self.journal.size()
+            if size >= self.compact_bytes or (size and time.monotonic() - last >= self.compact_interval):
+                self.compact()
+                last = time.monotonic()
+
+    def close(self):
+        """停止后台压缩，做最后一次压缩并关闭日志（journal 模式）"""
+        if self.journal is None or not self._loaded:
+            if self.lazy:
+                self.couples.close()
+            return
+        self._stop.set()
+        if self._compactor:
+            self._compactor.join()
+            self._compactor = None
+        if self.journal.size() or self.journal.has_rotated():
+            self.compact()
+        self.journal.close()
+        if self.lazy:
+            self.couples.close()
+        self._loaded = False
+
+    def stats(self) -> Dict[str, Any]:
+        """存储统计"""
+        stats = {"storage": self.storage, "compactions": self.compactions, "reasons": REASONS.stats()}
+        if self.journal is not None:
+            stats["journal"] = self.journal.stats()
+        if self.lazy:
+            stats["cache"] = self.couples.stats()
+        return stats
+
     def create_backup(self) -> str:
-        """创建数据备份"""
+        """
+        创建数据备份: 把最新快照硬链接到备份目录，不再重新序列化
+
+        快照总是整体替换而不是原地改写，链接出去的备份不会被之后的保存修改；
+        不支持硬链接（如备份目录在另一个文件系统）时退回到复制文件
+        """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_file = os.path.join(self.backup_dir, f"backup_{timestamp}.json")
-        
+
         try:
-            data = {
-                "couples": {k: v.to_dict() for k, v in self.couples.items()},
-                "rewards": [r.to_dict() for r in self.rewards],
-                "exchange_records": [e.to_dict() for e in self.exchange_records],
-                "backup_time": datetime.now().isoformat()
-            }
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
+            if not self._ensure_snapshot():
+                print("创建备份失败: 没有可用的快照")
+                return ""
+            if os.path.exists(backup_file):
+                os.remove(backup_file)
+            try:
+                os.link(self.main_file, backup_file)
+            except OSError:
+                shutil.copy2(self.main_file, backup_file)
+
             self._cleanup_old_backups()
             return backup_file
         except Exception as e:
@@ -4,167 +4,251 @@
 """
 import sqlite3
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-import hashlib
+from typing import Optional, List, Dict, Any, Iterator, Mapping, Tuple
+import base64
+import os
 import secrets
+import threading
 from pathlib import Path
+from contextlib import contextmanager
+
+from backend import passwords
+from backend.db_pool import ConnectionPool
+from backend.metrics import SqlHook, TimedConnection
+from backend.migrations import MigrationRunner
+from backend.query_profiler import ProfiledConnection, QueryProfiler
+
+
+# 默认 PRAGMA 配置，应用到连接池中的每个连接
+DEFAULT_PRAGMAS: Dict[str, Any] = {
+    "journal_mode": "WAL",        # 读写并发，避免 database is locked
+    "synchronous": "NORMAL",      # WAL 模式下 NORMAL 已能保证一致性
+    "cache_size": -16000,         # 负数表示 KiB，约 16MB 页缓存
+    "mmap_size": 134217728,       # 128MB 内存映射读
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,         # 写锁等待 5 秒而不是立即报错
+}
+
+
+def pragma_profile_from_env(environ: Mapping[str, str] = os.environ) -> Dict[str, Any]:
+    """读取 PRAGMA 配置，环境变量 DB_PRAGMA_<名称> 可覆盖默认值"""
+    profile = dict(DEFAULT_PRAGMAS)
+    for name in DEFAULT_PRAGMAS:
+        value = environ.get(f"DB_PRAGMA_{name.upper()}")
+        if value is not None:
+            profile[name] = value
+    return profile
+
+
+# 分页接口单页最大条数
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """将 (排序值, id) 编码为不透明的分页游标"""
+    raw = f"{sort_value}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = base64.urlsafe_b64decode(padded).decode().rsplit("|", 1)
+        return sort_value, int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
+# 管理员列表可排序的字段: 名称 -> (列, 游标值类型)，每个字段都有 (列, id) 复合索引
+COUPLE_SORTS = {"created_time": ("c.created_time", str), "points": ("c.points", int)}
+USER_SORTS = {"created_time": ("created_time", str), "username": ("username", str)}
+EXCHANGE_SORTS = {"exchange_time": ("e.exchange_time", str), "points_used": ("e.points_used", int)}
+
+
+Filter = Tuple[List[str], List[Any]]
+
+
+def keyset_order(sorts: Dict[str, Tuple[str, type]], sort: str, order: str,
+                 cursor: Optional[str], id_column: str) -> Tuple[Filter, str]:
+    """
+    生成按 (排序列, id) 翻页的游标条件和 ORDER BY
+
+    Returns:
+        ((游标条件, 参数), ORDER BY 子句)；排序字段、方向或游标无效时抛出 ValueError
+    """
+    if sort not in sorts:
+        raise ValueError(f"不支持的排序字段: {sort}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"不支持的排序方向: {order}")
+
+    column, value_type = sorts[sort]
+    direction = order.upper()
+    order_by = f"ORDER BY {column} {direction}, {id_column} {direction}"
+    if not cursor:
+        return ([], []), order_by
+
+    sort_value, row_id = decode_cursor(cursor)
+    operator = "<" if order == "desc" else ">"
+    keyset = [f"({column}, {id_column}) {operator} (?, ?)"]
+    return (keyset, [value_type(sort_value), row_id]), order_by
+
+
+def range_filters(column: str, low: Any = None, high: Any = None,
+                  exclusive_high: bool = False) -> Filter:
+    """列的范围过滤条件，low/high 为 None 时不限制"""
+    conditions, params = [], []
+    if low is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(low)
+    if high is not None:
+        conditions.append(f"{column} {'<' if exclusive_high else '<='} ?")
+        params.append(high)
+    return conditions, params
+
+
+def prefix_filter(column: str, prefix: Optional[str]) -> Filter:
+    """前缀匹配写成范围条件，可以使用列上的索引（区分大小写）"""
+    if not prefix:
+        return [], []
+    return [f"{column} >= ?", f"{column} < ?"], [prefix, prefix + "\U0010ffff"]
+
+
+def where_clause(*filters: Filter) -> Tuple[str, List[Any]]:
+    """用 AND 合并多个过滤条件，返回 (WHERE 子句或空串, 参数)"""
+    conditions, params = [], []
+    for filter_conditions, filter_params in filters:
+        conditions += filter_conditions
+        params += filter_params
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
 
 
 class Database:
     """数据库管理类"""
 
-    def __init__(self, db_path: str = "data/heartbeat.db"):
-        """初始化数据库连接"""
+    def __init__(self, db_path: str = "data/heartbeat.db", pool_size: int = 5,
+                 pool_timeout: float = 30.0, pragmas: Optional[Dict[str, Any]] = None):
+        """
+        初始化数据库连接
+
+        Args:
+            db_path: 数据库文件路径
+            pool_size: 连接池大小，0 表示不复用连接
+            pool_timeout: 获取连接的最长等待时间（秒）
+            pragmas: PRAGMA 配置，默认使用 DEFAULT_PRAGMAS
+        """
         self.db_path = db_path
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
         # 确保数据目录存在
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(db_path, size=pool_size, timeout=pool_timeout,
+                                   pragmas=list(self.pragmas.items()))
+
+        # SQL 计时回调 hook(sql, 秒)，设置后 connection() 返回的连接会为每条语句计时
+        self.sql_hook: Optional[SqlHook] = None
+        # SQL 性能分析器（可选），设置后记录每条语句的行数、耗时和调用方法并写慢查询日志
+        self.profiler: Optional[QueryProfiler] = None
+
+        # 后台维护线程（WAL checkpoint 和 PRAGMA optimize）
+        self._maintenance_thread: Optional[threading.Thread] = None
+        self._maintenance_stop = threading.Event()
+        self.maintenance_status: Dict[str, Any] = {
+            "interval": None,
+            "last_checkpoint": None,
+            "last_optimize": None,
+            "last_error": None,
+        }
+
         self.init_database()
 
     def get_connection(self) -> sqlite3.Connection:
-        """获取数据库连接"""
+        """获取独立的数据库连接（调用方负责关闭，不经过连接池）"""
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row  # 使结果可以通过列名访问
         return conn
 
-    def init_database(self):
-        """初始化数据库表结构"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        # 创建用户表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                is_admin INTEGER DEFAULT 0,
-                created_time TEXT NOT NULL
-            )
-        """)
-
-        # 创建情侣表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS couples (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                couple_id TEXT UNIQUE NOT NULL,
-                user_id INTEGER NOT NULL,
-                name1 TEXT NOT NULL,
-                name2 TEXT NOT NULL,
-                points INTEGER DEFAULT 0,
-                created_time TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
-
-        # 创建积分历史表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS point_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                couple_id TEXT NOT NULL,
-                points_change INTEGER NOT NULL,
-                reason TEXT,
-                created_time TEXT NOT NULL,
-                FOREIGN KEY (couple_id) REFERENCES couples(couple_id) ON DELETE CASCADE
-            )
-        """)
-
-        # 创建基础奖励表（供参考）
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS base_rewards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                points_needed INTEGER NOT NULL,
-                description TEXT,
-                is_active INTEGER DEFAULT 1
-            )
-        """)
-
-        # 创建情侣奖励表（每对情侣自己设置）
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS couple_rewards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                reward_id TEXT UNIQUE NOT NULL,
-                couple_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                points_needed INTEGER NOT NULL,
-                stock INTEGER DEFAULT 1,
-                description TEXT,
-                created_time TEXT NOT NULL,
-                FOREIGN KEY (couple_id) REFERENCES couples(couple_id) ON DELETE CASCADE
-            )
-        """)
-
-        # 创建兑换记录表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS exchange_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                record_id TEXT UNIQUE NOT NULL,
-                couple_id TEXT NOT NULL,
-                reward_id TEXT NOT NULL,
-                points_used INTEGER NOT NULL,
-                exchange_time TEXT NOT NULL,
-                FOREIGN KEY (couple_id) REFERENCES couples(couple_id) ON DELETE CASCADE
-            )
-        """)
-
-        conn.commit()
-        conn.close()
-
-        # 初始化默认管理员账号和基础奖励
-        self._init_default_data()
-
-    def _init_default_data(self):
-        """初始化默认数据（管理员账号和基础奖励列表）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        # 检查是否已有管理员账号
-        cursor.execute("SELECT COUNT(*) FROM users WHERE is_admin = 1")
-        admin_count = cursor.fetchone()[0]
-
-        if admin_count == 0:
-            # 创建默认管理员账号: admin / admin123
-            admin_password = self.hash_password("admin123")
-            cursor.execute("""
-                INSERT INTO users (username, password_hash, is_admin, created_time)
-                VALUES (?, ?, 1, ?)
-            """, ("admin", admin_password, datetime.now().isoformat()))
-            print("已创建默认管理员账号: admin / admin123")
-
-        # 检查是否已有基础奖励
-        cursor.execute("SELECT COUNT(*) FROM base_rewards")
-        reward_count = cursor.fetchone()[0]
-
-        if reward_count == 0:
-            # 添加一些基础奖励供参考
-            base_rewards = [
-                ("一起看电影", 50, "去电影院看一场电影"),
-                ("浪漫晚餐", 100, "去喜欢的餐厅吃一顿浪漫晚餐"),
-                ("周末旅行", 200, "周末一起去附近城市旅行"),
-                ("送一束花", 30, "送对方一束鲜花"),
-                ("做一顿大餐", 40, "亲手为对方做一顿丰盛的晚餐"),
-                ("按摩服务", 60, "为对方提供30分钟按摩服务"),
-                ("游乐园一日游", 150, "一起去游乐园玩一天"),
-                ("买心仪的礼物", 120, "买一件对方心仪已久的礼物"),
-                ("温泉之旅", 250, "一起去泡温泉放松"),
-                ("演唱会门票", 300, "去看喜欢的歌手的演唱会"),
-            ]
-
-            for name, points, desc in base_rewards:
-                cursor.execute("""
-                    INSERT INTO base_rewards (name, points_needed, description)
-                    VALUES (?, ?, ?)
-                """, (name, points, desc))
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """从连接池借用连接，退出时自动归还"""
+        with self.pool.connection() as conn:
+            profiler, hook = self.profiler, self.sql_hook
+            if profiler is None:
+                yield TimedConnection(conn, hook) if hook else conn
+                return
+
+            profiled = ProfiledConnection(conn, profiler)
+            try:
+                yield TimedConnection(profiled, hook) if hook else profiled
+            finally:
+                profiled.finish()
+
+    def close(self):
+        """停止后台维护并关闭连接池中的所有连接"""
+        self.stop_maintenance()
+        self.pool.close_all()
+
+    # ==================== PRAGMA 与维护 ====================
+
+    def get_active_pragmas(self) -> Dict[str, Any]:
+        """读取连接上实际生效的 PRAGMA 值"""
+        with self.connection() as conn:
+            return {
+                name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in self.pragmas
+            }
 
-            print(f"已添加 {len(base_rewards)} 个基础奖励供参考")
+    def checkpoint(self) -> Dict[str, int]:
+        """执行 WAL checkpoint 并截断 WAL 文件"""
+        with self.connection() as conn:
+            busy, log_frames, checkpointed = conn.execute(
+                "PRAGMA wal_checkpoint(TRUNCATE)"
+            ).fetchone()
+        self.maintenance_status["last_checkpoint"] = datetime.now().isoformat()
+        return {"busy": busy, "log_frames": log_frames, "checkpointed": checkpointed}
+
+    def optimize(self):
+        """执行 PRAGMA optimize 更新查询规划统计"""
+        with self.connection() as conn:
+            conn.execute("PRAGMA optimize")
+        self.maintenance_status["last_optimize"] = datetime.now().isoformat()
+
+    def start_maintenance(self, interval: float = 300.0):
+        """启动后台维护线程，每隔 interval 秒执行 checkpoint 和 optimize"""
+        if self._maintenance_thread and self._maintenance_thread.is_alive():
+            return
+        self._maintenance_stop.clear()
+        self.maintenance_status["interval"] = interval
+
+        def run():
+            while not self._maintenance_stop.wait(interval):
+                try:
+                    self.checkpoint()
+                    self.optimize()
+                except Exception as e:
+                    self.maintenance_status["last_error"] = str(e)
+                    print(f"数据库维护失败: {e}")
+
+        self._maintenance_thread = threading.Thread(
+            target=run, name="db-maintenance", daemon=True
+        )
+        self._maintenance_thread.start()
+
+    def stop_maintenance(self):
+        """停止后台维护线程"""
+        self._maintenance_stop.set()
+        if self._maintenance_thread:
+            self._maintenance_thread.join()
+            self._maintenance_thread = None
 
-        conn.commit()
-        conn.close()
+    def init_database(self):
+        """初始化数据库表结构（按版本执行未应用的迁移）"""
+        with self.connection() as conn:
+            self.applied_migrations = MigrationRunner(conn).migrate()
 
     @staticmethod
     def hash_password(password: str) -> str:
-        """密码哈希"""
-        return hashlib.sha256(password.encode()).hexdigest()
+        """密码哈希（带盐 scrypt，见 backend.passwords）"""
+        return passwords.hash_password(password)
 
     @staticmethod
     def generate_id(prefix: str = "") -> str:
@@ -175,57 +259,78 @@ class Database:
 
     def create_user(self, username: str, password: str, is_admin: bool = False) -> Optional[int]:
         """创建用户"""
+        return self.create_user_with_hash(username, self.hash_password(password), is_admin)
+
+    def create_user_with_hash(self, username: str, password_hash: str,
+                              is_admin: bool = False) -> Optional[int]:
+        """使用已计算好的密码哈希创建用户（API 在哈希进程池中计算哈希）"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.connection() as conn:
+                cursor = conn.cursor()
 
-            password_hash = self.hash_password(password)
-            cursor.execute("""
-                INSERT INTO users (username, password_hash, is_admin, created_time)
-                VALUES (?, ?, ?, ?)
-            """, (username, password_hash, 1 if is_admin else 0, datetime.now().isoformat()))
+                cursor.execute("""
+                    INSERT INTO users (username, password_hash, is_admin, created_time)
+                    VALUES (?, ?, ?, ?)
+                """, (username, password_hash, 1 if is_admin else 0, datetime.now().isoformat()))
 
-            user_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+                user_id = cursor.lastrowid
+                conn.commit()
             return user_id
         except sqlite3.IntegrityError:
             return None  # 用户名已存在
 
-    def verify_user(self, username: str, password: str) -> Optional[Dict[str, Any]]:
-        """验证用户登录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        password_hash = self.hash_password(password)
-        cursor.execute("""
-            SELECT id, username, is_admin FROM users
-            WHERE username = ? AND password_hash = ?
-        """, (username, password_hash))
-
-        row = cursor.fetchone()
-        conn.close()
+    def get_user_credentials(self, username: str) -> Optional[Dict[str, Any]]:
+        """获取用户及密码哈希，用于登录校验"""
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT id, username, is_admin, password_hash FROM users
+                WHERE username = ?
+            """, (username,)).fetchone()
 
         if row:
             return {
                 "id": row["id"],
                 "username": row["username"],
-                "is_admin": bool(row["is_admin"])
+                "is_admin": bool(row["is_admin"]),
+                "password_hash": row["password_hash"]
             }
         return None
 
+    def update_password_hash(self, user_id: int, password_hash: str) -> bool:
+        """更新密码哈希（登录时按新参数重新哈希）"""
+        with self.connection() as conn:
+            updated = conn.execute(
+                "UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id)
+            ).rowcount
+            conn.commit()
+        return updated > 0
+
+    def verify_user(self, username: str, password: str) -> Optional[Dict[str, Any]]:
+        """验证用户登录，哈希参数过期时顺带重新哈希"""
+        user = self.get_user_credentials(username)
+        if not user or not passwords.verify_password(password, user["password_hash"]):
+            return None
+
+        if passwords.needs_rehash(user["password_hash"]):
+            self.update_password_hash(user["id"], self.hash_password(password))
+
+        return {
+            "id": user["id"],
+            "username": user["username"],
+            "is_admin": user["is_admin"]
+        }
+
     def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
         """根据ID获取用户信息"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("""
-            SELECT id, username, is_admin, created_time FROM users
-            WHERE id = ?
-        """, (user_id,))
+            cursor.execute("""
+                SELECT id, username, is_admin, created_time FROM users
+                WHERE id = ?
+            """, (user_id,))
 
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
 
         if row:
             return {
@@ -236,18 +341,36 @@ class Database:
             }
         return None
 
-    def get_all_users(self) -> List[Dict[str, Any]]:
-        """获取所有用户（管理员功能）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT id, username, is_admin, created_time FROM users
-            ORDER BY created_time DESC
-        """)
-
-        rows = cursor.fetchall()
-        conn.close()
+    def get_all_users(self, limit: int = 100, cursor: Optional[str] = None,
+                      sort: str = "created_time", order: str = "desc",
+                      username: Optional[str] = None, since: Optional[str] = None,
+                      until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        分页获取用户（管理员功能）
+
+        Args:
+            limit: 本页条数
+            cursor: 上一页最后一条的游标，按 (排序字段, id) 继续翻页
+            sort: 排序字段，见 USER_SORTS
+            order: asc / desc
+            username: 用户名前缀
+            since: 注册时间下限（含），ISO 日期或时间
+            until: 注册时间上限（不含）
+        """
+        keyset, order_by = keyset_order(USER_SORTS, sort, order, cursor, "id")
+        where, params = where_clause(
+            prefix_filter("username", username),
+            range_filters("created_time", since, until, exclusive_high=True),
+            keyset,
+        )
+
+        with self.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT id, username, is_admin, created_time FROM users
+                {where}
+                {order_by}
+                LIMIT ?
+            """, (*params, limit)).fetchall()
 
         return [dict(row) for row in rows]
 
@@ -256,17 +379,16 @@ class Database:
     def create_couple(self, user_id: int, name1: str, name2: str) -> Optional[str]:
         """创建情侣对"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.connection() as conn:
+                cursor = conn.cursor()
 
-            couple_id = self.generate_id("couple_")
-            cursor.execute("""
-                INSERT INTO couples (couple_id, user_id, name1, name2, points, created_time)
-                VALUES (?, ?, ?, ?, 0, ?)
-            """, (couple_id, user_id, name1, name2, datetime.now().isoformat()))
+                couple_id = self.generate_id("couple_")
+                cursor.execute("""
+                    INSERT INTO couples (couple_id, user_id, name1, name2, points, created_time)
+                    VALUES (?, ?, ?, ?, 0, ?)
+                """, (couple_id, user_id, name1, name2, datetime.now().isoformat()))
 
-            conn.commit()
-            conn.close()
+                conn.commit()
             return couple_id
         except Exception as e:
             print(f"创建情侣对失败: {e}")
@@ -274,15 +396,14 @@ class Database:
 
     def get_couple_by_user_id(self, user_id: int) -> Optional[Dict[str, Any]]:
         """根据用户ID获取情侣信息"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("""
-            SELECT * FROM couples WHERE user_id = ?
-        """, (user_id,))
+            cursor.execute("""
+                SELECT * FROM couples WHERE user_id = ?
+            """, (user_id,))
 
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
 
         if row:
             return dict(row)
@@ -290,76 +411,211 @@ class Database:
 
     def get_couple_by_id(self, couple_id: str) -> Optional[Dict[str, Any]]:
         """根据couple_id获取情侣信息"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("""
-            SELECT * FROM couples WHERE couple_id = ?
-        """, (couple_id,))
+            cursor.execute("""
+                SELECT * FROM couples WHERE couple_id = ?
+            """, (couple_id,))
 
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
 
         if row:
             return dict(row)
         return None
 
-    def get_all_couples(self) -> List[Dict[str, Any]]:
-        """获取所有情侣（管理员功能）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT c.*, u.username
-            FROM couples c
-            LEFT JOIN users u ON c.user_id = u.id
-            ORDER BY c.created_time DESC
-        """)
-
-        rows = cursor.fetchall()
-        conn.close()
+    def get_all_couples(self, limit: int = 100, cursor: Optional[str] = None,
+                        sort: str = "created_time", order: str = "desc",
+                        name: Optional[str] = None, username: Optional[str] = None,
+                        min_points: Optional[int] = None, max_points: Optional[int] = None,
+                        since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        分页获取情侣（管理员功能）
+
+        每页沿 (排序字段, id) 索引从游标处继续读取，耗时与页码无关；
+        名字过滤没有索引，匹配很少时需要沿索引多读一些行
+
+        Args:
+            limit: 本页条数
+            cursor: 上一页最后一条的游标
+            sort: 排序字段，见 COUPLE_SORTS
+            order: asc / desc
+            name: 名字包含的文字（任意一人）
+            username: 所属用户名前缀
+            min_points / max_points: 积分范围（含）
+            since / until: 创建时间范围，since 含、until 不含
+        """
+        keyset, order_by = keyset_order(COUPLE_SORTS, sort, order, cursor, "c.id")
+        name_filter: Filter = ([], [])
+        if name:
+            name_filter = (["(instr(c.name1, ?) > 0 OR instr(c.name2, ?) > 0)"], [name, name])
+        user_filter: Filter = ([], [])
+        if username:
+            users, params = prefix_filter("username", username)
+            user_filter = ([f"c.user_id IN (SELECT id FROM users WHERE {' AND '.join(users)})"], params)
+
+        where, params = where_clause(
+            name_filter,
+            user_filter,
+            range_filters("c.points", min_points, max_points),
+            range_filters("c.created_time", since, until, exclusive_high=True),
+            keyset,
+        )
+
+        with self.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT c.*, u.username
+                FROM couples c
+                LEFT JOIN users u ON c.user_id = u.id
+                {where}
+                {order_by}
+                LIMIT ?
+            """, (*params, limit)).fetchall()
 
         return [dict(row) for row in rows]
 
     def update_couple_points(self, couple_id: str, points_change: int, reason: str = "") -> bool:
         """更新情侣积分"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.connection() as conn:
+                cursor = conn.cursor()
 
-            # 更新积分
-            cursor.execute("""
-                UPDATE couples SET points = points + ?
-                WHERE couple_id = ?
-            """, (points_change, couple_id))
+                # 更新积分
+                cursor.execute("""
+                    UPDATE couples SET points = points + ?
+                    WHERE couple_id = ?
+                """, (points_change, couple_id))
 
-            # 记录历史
-            cursor.execute("""
-                INSERT INTO point_history (couple_id, points_change, reason, created_time)
-                VALUES (?, ?, ?, ?)
-            """, (couple_id, points_change, reason, datetime.now().isoformat()))
+                # 记录历史
+                cursor.execute("""
+                    INSERT INTO point_history (couple_id, points_change, reason, created_time)
+                    VALUES (?, ?, ?, ?)
+                """, (couple_id, points_change, reason, datetime.now().isoformat()))
 
-            conn.commit()
-            conn.close()
+                conn.commit()
             return True
         except Exception as e:
             print(f"更新积分失败: {e}")
             return False
 
-    def get_point_history(self, couple_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """获取积分历史"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def update_points_grouped(self, events: List[tuple]) -> List[Any]:
+        """
+        在一个事务中应用多个情侣的积分变动（供组提交写入线程使用）
+
+        每个事件在自己的保存点内执行，单个事件失败只回滚该事件，同批的其他事件照常提交
+
+        Args:
+            events: (couple_id, points_change, reason) 列表
+
+        Returns:
+            与 events 一一对应的新积分，情侣不存在时为 None，执行失败时为对应的异常
+        """
+        now = datetime.now().isoformat()
+        results: List[Any] = []
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for couple_id, points_change, reason in events:
+                conn.execute("SAVEPOINT grouped_event")
+                try:
+                    row = conn.execute("""
+                        UPDATE couples SET points = points + ?
+                        WHERE couple_id = ?
+                        RETURNING points
+                    """, (points_change, couple_id)).fetchone()
+                    if row:
+                        conn.execute("""
+                            INSERT INTO point_history (couple_id, points_change, reason, created_time)
+                            VALUES (?, ?, ?, ?)
+                        """, (couple_id, points_change, reason, now))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO grouped_event")
+                    conn.execute("RELEASE grouped_event")
+                    results.append(e)
+                    continue
+                conn.execute("RELEASE grouped_event")
+                results.append(row["points"] if row else None)
+            conn.commit()
+        return results
+
+    def update_couple_points_many(self, couple_id: str,
+                                  changes: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        批量更新情侣积分，所有变动在一个事务中提交
+
+        Args:
+            couple_id: 情侣ID
+            changes: 积分变动列表，每项包含 points_change、reason，
+                     可选 idempotency_key（同一情侣下重复的 key 只生效一次）
+
+        Returns:
+            {"new_points": 最终积分, "results": 每项的处理结果}，情侣不存在或失败时返回 None
+        """
+        keys = [c["idempotency_key"] for c in changes if c.get("idempotency_key")]
+        try:
+            with self.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+
+                # 已经处理过的幂等键
+                seen = set()
+                if keys:
+                    placeholders = ", ".join("?" for _ in keys)
+                    seen = {row[0] for row in conn.execute(f"""
+                        SELECT idempotency_key FROM point_history
+                        WHERE couple_id = ? AND idempotency_key IN ({placeholders})
+                    """, (couple_id, *keys))}
+
+                now = datetime.now().isoformat()
+                rows, results, total = [], [], 0
+                for index, change in enumerate(changes):
+                    key = change.get("idempotency_key")
+                    if key and key in seen:
+                        results.append({"index": index, "idempotency_key": key, "status": "duplicate"})
+                        continue
+                    if key:
+                        seen.add(key)
+                    total += change["points_change"]
+                    rows.append((couple_id, change["points_change"], change.get("reason", ""), now, key))
+                    results.append({"index": index, "idempotency_key": key, "status": "applied"})
+
+                row = conn.execute("""
+                    UPDATE couples SET points = points + ?
+                    WHERE couple_id = ?
+                    RETURNING points
+                """, (total, couple_id)).fetchone()
+                if not row:
+                    conn.rollback()
+                    return None
+
+                conn.executemany("""
+                    INSERT INTO point_history (couple_id, points_change, reason, created_time, idempotency_key)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
+
+                conn.commit()
+            return {"new_points": row["points"], "results": results}
+        except Exception as e:
+            print(f"批量更新积分失败: {e}")
+            return None
+
+    def get_point_history(self, couple_id: str, limit: int = 50,
+                          cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+        """获取积分历史（cursor 为上一页返回的游标，按时间倒序翻页）"""
+        where, params = "", [couple_id]
+        if cursor:
+            where = "AND (created_time, id) < (?, ?)"
+            params.extend(decode_cursor(cursor))
 
-        cursor.execute("""
-            SELECT * FROM point_history
-            WHERE couple_id = ?
-            ORDER BY created_time DESC
-            LIMIT ?
-        """, (couple_id, limit))
+        with self.connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(f"""
+                SELECT * FROM point_history
+                WHERE couple_id = ? {where}
+                ORDER BY created_time DESC, id DESC
+                LIMIT ?
+            """, (*params, limit))
 
-        rows = cursor.fetchall()
-        conn.close()
+            rows = cursor.fetchall()
 
         return [dict(row) for row in rows]
 
@@ -367,17 +623,16 @@ class Database:
 
     def get_base_rewards(self) -> List[Dict[str, Any]]:
         """获取基础奖励列表"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("""
-            SELECT * FROM base_rewards
-            WHERE is_active = 1
-            ORDER BY points_needed ASC
-        """)
+            cursor.execute("""
+                SELECT * FROM base_rewards
+                WHERE is_active = 1
+                ORDER BY points_needed ASC
+            """)
 
-        rows = cursor.fetchall()
-        conn.close()
+            rows = cursor.fetchall()
 
         return [dict(row) for row in rows]
 
@@ -385,17 +640,16 @@ class Database:
                             stock: int = 1, description: str = "") -> Optional[str]:
         """创建情侣专属奖励"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.connection() as conn:
+                cursor = conn.cursor()
 
-            reward_id = self.generate_id("reward_")
-            cursor.execute("""
-                INSERT INTO couple_rewards (reward_id, couple_id, name, points_needed, stock, description, created_time)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (reward_id, couple_id, name, points_needed, stock, description, datetime.now().isoformat()))
+                reward_id = self.generate_id("reward_")
+                cursor.execute("""
+                    INSERT INTO couple_rewards (reward_id, couple_id, name, points_needed, stock, description, created_time)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (reward_id, couple_id, name, points_needed, stock, description, datetime.now().isoformat()))
 
-            conn.commit()
-            conn.close()
+                conn.commit()
             return reward_id
         except Exception as e:
             print(f"创建奖励失败: {e}")
@@ -403,68 +657,75 @@ class Database:
 
     def get_couple_rewards(self, couple_id: str) -> List[Dict[str, Any]]:
         """获取情侣的奖励列表"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("""
-            SELECT * FROM couple_rewards
-            WHERE couple_id = ?
-            ORDER BY points_needed ASC
-        """, (couple_id,))
+            cursor.execute("""
+                SELECT * FROM couple_rewards
+                WHERE couple_id = ?
+                ORDER BY points_needed ASC
+            """, (couple_id,))
 
-        rows = cursor.fetchall()
-        conn.close()
+            rows = cursor.fetchall()
 
         return [dict(row) for row in rows]
 
-    def update_couple_reward(self, reward_id: str, name: str = None, points_needed: int = None,
-                            stock: int = None, description: str = None) -> bool:
-        """更新情侣奖励"""
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+    def update_couple_reward(self, couple_id: str, reward_id: str, name: str = None,
+                             points_needed: int = None, stock: int = None,
+                             description: str = None) -> bool:
+        """
+        更新情侣奖励，只修改属于该情侣的奖励
 
-            updates = []
-            params = []
-
-            if name is not None:
-                updates.append("name = ?")
-                params.append(name)
-            if points_needed is not None:
-                updates.append("points_needed = ?")
-                params.append(points_needed)
-            if stock is not None:
-                updates.append("stock = ?")
-                params.append(stock)
-            if description is not None:
-                updates.append("description = ?")
-                params.append(description)
-
-            if not updates:
-                return False
-
-            params.append(reward_id)
-            query = f"UPDATE couple_rewards SET {', '.join(updates)} WHERE reward_id = ?"
-
-            cursor.execute(query, params)
-            conn.commit()
-            conn.close()
-            return True
+        Returns:
+            是否更新了奖励；奖励不存在、不属于该情侣或没有要修改的字段时为 False
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+
+                updates = []
+                params = []
+
+                if name is not None:
+                    updates.append("name = ?")
+                    params.append(name)
+                if points_needed is not None:
+                    updates.append("points_needed = ?")
+                    params.append(points_needed)
+                if stock is not None:
+                    updates.append("stock = ?")
+                    params.append(stock)
+                if description is not None:
+                    updates.append("description = ?")
+                    params.append(description)
+
+                if not updates:
+                    return False
+
+                # reward_id 唯一索引定位，couple_id 条件校验所有权
+                params.extend([reward_id, couple_id])
+                query = f"UPDATE couple_rewards SET {', '.join(updates)} WHERE reward_id = ? AND couple_id = ?"
+
+                cursor.execute(query, params)
+                conn.commit()
+            return cursor.rowcount > 0
         except Exception as e:
             print(f"更新奖励失败: {e}")
             return False
 
-    def delete_couple_reward(self, reward_id: str) -> bool:
-        """删除情侣奖励"""
+    def delete_couple_reward(self, couple_id: str, reward_id: str) -> bool:
+        """删除情侣奖励，奖励不存在或不属于该情侣时返回 False"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            with self.connection() as conn:
+                cursor = conn.cursor()
 
-            cursor.execute("DELETE FROM couple_rewards WHERE reward_id = ?", (reward_id,))
+                cursor.execute(
+                    "DELETE FROM couple_rewards WHERE reward_id = ? AND couple_id = ?",
+                    (reward_id, couple_id)
+                )
 
-            conn.commit()
-            conn.close()
-            return True
+                conn.commit()
+            return cursor.rowcount > 0
         except Exception as e:
             print(f"删除奖励失败: {e}")
             return False
@@ -472,89 +733,175 @@ class Database:
     # ==================== 兑换相关方法 ====================
 
     def create_exchange_record(self, couple_id: str, reward_id: str, points_used: int) -> Optional[str]:
-        """创建兑换记录"""
+        """创建兑换记录（按指定积分扣除）"""
+        result = self._exchange(couple_id, reward_id, points_used)
+        return result.get("record_id")
+
+    def redeem_reward(self, couple_id: str, reward_id: str) -> Dict[str, Any]:
+        """
+        兑换奖励：按奖励所需积分扣分、减库存并记录，一次事务完成
+
+        Returns:
+            成功时包含 record_id、points_used、new_points；
+            失败时只包含 error，取值为 reward_not_found / out_of_stock /
+            insufficient_points / failed
+        """
+        return self._exchange(couple_id, reward_id)
+
+    def _exchange(self, couple_id: str, reward_id: str,
+                  points_used: Optional[int] = None) -> Dict[str, Any]:
+        """
+        原子兑换，使用条件更新防止超卖和积分为负
+
+        Args:
+            points_used: 扣除的积分，为 None 时使用奖励的 points_needed
+        """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            # 检查积分是否足够
-            cursor.execute("SELECT points FROM couples WHERE couple_id = ?", (couple_id,))
-            row = cursor.fetchone()
-            if not row or row["points"] < points_used:
-                return None
-
-            # 检查库存
-            cursor.execute("SELECT stock FROM couple_rewards WHERE reward_id = ?", (reward_id,))
-            reward_row = cursor.fetchone()
-            if not reward_row or reward_row["stock"] <= 0:
-                return None
-
-            # 创建兑换记录
-            record_id = self.generate_id("exchange_")
-            cursor.execute("""
-                INSERT INTO exchange_records (record_id, couple_id, reward_id, points_used, exchange_time)
-                VALUES (?, ?, ?, ?, ?)
-            """, (record_id, couple_id, reward_id, points_used, datetime.now().isoformat()))
-
-            # 扣除积分
-            cursor.execute("""
-                UPDATE couples SET points = points - ?
-                WHERE couple_id = ?
-            """, (points_used, couple_id))
+            with self.connection() as conn:
+                # 立即获取写锁，检查和扣减之间不会有其他写入
+                conn.execute("BEGIN IMMEDIATE")
+
+                # 减少库存（只有库存大于0才会成功）
+                row = conn.execute("""
+                    UPDATE couple_rewards SET stock = stock - 1
+                    WHERE reward_id = ? AND couple_id = ? AND stock > 0
+                    RETURNING points_needed
+                """, (reward_id, couple_id)).fetchone()
+                if not row:
+                    exists = conn.execute(
+                        "SELECT 1 FROM couple_rewards WHERE reward_id = ? AND couple_id = ?",
+                        (reward_id, couple_id)
+                    ).fetchone()
+                    conn.rollback()
+                    return {"error": "out_of_stock" if exists else "reward_not_found"}
+
+                if points_used is None:
+                    points_used = row["points_needed"]
+
+                # 扣除积分（只有积分足够才会成功）
+                row = conn.execute("""
+                    UPDATE couples SET points = points - ?
+                    WHERE couple_id = ? AND points >= ?
+                    RETURNING points
+                """, (points_used, couple_id, points_used)).fetchone()
+                if not row:
+                    conn.rollback()
+                    return {"error": "insufficient_points"}
+                new_points = row["points"]
+
+                now = datetime.now().isoformat()
+
+                # 创建兑换记录
+                record_id = self.generate_id("exchange_")
+                conn.execute("""
+                    INSERT INTO exchange_records (record_id, couple_id, reward_id, points_used, exchange_time)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (record_id, couple_id, reward_id, points_used, now))
+
+                # 记录积分历史，exchange_id 标记为兑换（统计时计入 points_redeemed 而不是 points_deducted）
+                conn.execute("""
+                    INSERT INTO point_history (couple_id, points_change, reason, created_time, exchange_id)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (couple_id, -points_used, f"兑换奖励: {reward_id}", now, record_id))
+
+                conn.commit()
+            return {"record_id": record_id, "points_used": points_used, "new_points": new_points}
+        except Exception as e:
+            print(f"创建兑换记录失败: {e}")
+            return {"error": "failed"}
 
-            # 减少库存
-            cursor.execute("""
-                UPDATE couple_rewards SET stock = stock - 1
-                WHERE reward_id = ?
-            """, (reward_id,))
+    def get_exchange_records(self, couple_id: str, limit: int = 50,
+                             cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+        """获取兑换记录（cursor 为上一页返回的游标，按时间倒序翻页）"""
+        where, params = "", [couple_id]
+        if cursor:
+            where = "AND (e.exchange_time, e.id) < (?, ?)"
+            params.extend(decode_cursor(cursor))
 
-            # 记录积分历史
-            cursor.execute("""
-                INSERT INTO point_history (couple_id, points_change, reason, created_time)
-                VALUES (?, ?, ?, ?)
-            """, (couple_id, -points_used, f"兑换奖励: {reward_id}", datetime.now().isoformat()))
+        with self.connection() as conn:
+            cursor = conn.cursor()
 
-            conn.commit()
-            conn.close()
-            return record_id
-        except Exception as e:
-            print(f"创建兑换记录失败: {e}")
-            return None
+            cursor.execute(f"""
+                SELECT e.*, r.name as reward_name
+                FROM exchange_records e
+                LEFT JOIN couple_rewards r ON e.reward_id = r.reward_id
+                WHERE e.couple_id = ? {where}
+                ORDER BY e.exchange_time DESC, e.id DESC
+                LIMIT ?
+            """, (*params, limit))
 
-    def get_exchange_records(self, couple_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """获取兑换记录"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+            rows = cursor.fetchall()
 
-        cursor.execute("""
-            SELECT e.*, r.name as reward_name
-            FROM exchange_records e
-            LEFT JOIN couple_rewards r ON e.reward_id = r.reward_id
-            WHERE e.couple_id = ?
-            ORDER BY e.exchange_time DESC
-            LIMIT ?
-        """, (couple_id, limit))
+        return [dict(row) for row in rows]
 
-        rows = cursor.fetchall()
-        conn.close()
+    def get_all_exchange_records(self, limit: int = 100, cursor: Optional[str] = None,
+                                 sort: str = "exchange_time", order: str = "desc",
+                                 couple_id: Optional[str] = None,
+                                 min_points: Optional[int] = None, max_points: Optional[int] = None,
+                                 since: Optional[str] = None,
+                                 until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        分页获取所有兑换记录（管理员功能）
+
+        Args:
+            limit: 本页条数
+            cursor: 上一页最后一条的游标
+            sort: 排序字段，见 EXCHANGE_SORTS
+            order: asc / desc
+            couple_id: 只看某对情侣
+            min_points / max_points: 消耗积分范围（含）
+            since / until: 兑换时间范围，since 含、until 不含
+        """
+        keyset, order_by = keyset_order(EXCHANGE_SORTS, sort, order, cursor, "e.id")
+        where, params = where_clause(
+            (["e.couple_id = ?"], [couple_id]) if couple_id else ([], []),
+            range_filters("e.points_used", min_points, max_points),
+            range_filters("e.exchange_time", since, until, exclusive_high=True),
+            keyset,
+        )
+
+        with self.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT e.*, r.name as reward_name, c.name1, c.name2
+                FROM exchange_records e
+                LEFT JOIN couple_rewards r ON e.reward_id = r.reward_id
+                LEFT JOIN couples c ON e.couple_id = c.couple_id
+                {where}
+                {order_by}
+                LIMIT ?
+            """, (*params, limit)).fetchall()
 
         return [dict(row) for row in rows]
 
-    def get_all_exchange_records(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """获取所有兑换记录（管理员功能）"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT e.*, r.name as reward_name, c.name1, c.name2
-            FROM exchange_records e
-            LEFT JOIN couple_rewards r ON e.reward_id = r.reward_id
-            LEFT JOIN couples c ON e.couple_id = c.couple_id
-            ORDER BY e.exchange_time DESC
-            LIMIT ?
-        """, (limit,))
-
-        rows = cursor.fetchall()
-        conn.close()
+    # ==================== 统计相关方法 ====================
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取全局统计（由触发器维护的单行汇总表）
+
+        points_deducted 只含兑换以外的扣分，兑换消耗的积分计入 points_redeemed，两者不重叠
+        """
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT total_couples, total_points, total_exchanges,
+                       points_issued, points_deducted, points_redeemed
+                FROM stats_totals WHERE id = 1
+            """).fetchone()
+
+        return dict(row) if row else {
+            "total_couples": 0, "total_points": 0, "total_exchanges": 0,
+            "points_issued": 0, "points_deducted": 0, "points_redeemed": 0,
+        }
+
+    def get_daily_stats(self, days: int = 30) -> List[Dict[str, Any]]:
+        """获取最近若干天的每日统计（按日期倒序）"""
+        with self.connection() as conn:
+            rows = conn.execute("""
+                SELECT day, new_couples, active_couples, points_issued,
+                       points_deducted, points_redeemed, exchanges
+                FROM stats_daily
+                ORDER BY day DESC
+                LIMIT ?
+            """, (days,)).fetchall()
 
         return [dict(row) for row in rows]
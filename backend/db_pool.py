@@ -0,0 +1,182 @@
+"""
+SQLite 连接池
+为 Database 提供可复用的连接，避免每次查询都重新打开数据库文件
+"""
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class PoolTimeout(Exception):
+    """在等待时间内没有可用连接"""
+
+
+class ConnectionPool:
+    """有界 SQLite 连接池
+
+    - 最多同时存在 ``size`` 个连接，按需创建
+    - 新连接创建时统一执行 PRAGMA
+    - 空闲超过 ``health_check_interval`` 秒的连接在取出时先做健康检查
+    - ``size`` 为 0 时不做池化，每次都新建并关闭连接（便于对比基准）
+    """
+
+    def __init__(self, db_path: str, size: int = 5,
+                 pragmas: Optional[List[Tuple[str, object]]] = None,
+                 timeout: float = 30.0, health_check_interval: float = 30.0):
+        """
+        初始化连接池
+
+        Args:
+            db_path: 数据库文件路径
+            size: 最大连接数，0 表示不池化
+            pragmas: 每个新连接都要执行的 (名称, 值) PRAGMA 列表
+            timeout: 获取连接的最长等待时间（秒）
+            health_check_interval: 空闲多久后取出前需要健康检查（秒）
+        """
+        self.db_path = db_path
+        self.size = max(0, size)
+        self.pragmas = list(pragmas or [])
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle: "queue.LifoQueue[Tuple[sqlite3.Connection, float]]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+        # 统计信息
+        self._acquired = 0
+        self._reused = 0
+        self._discarded = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建新连接并应用 PRAGMA"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        """检查连接是否仍可用"""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> sqlite3.Connection:
+        """从池中取出一个连接"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("连接池已关闭")
+
+        if self.size == 0:
+            with self._lock:
+                self._acquired += 1
+            return self._connect()
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    if self._created < self.size:
+                        self._created += 1
+                        create = True
+                    else:
+                        create = False
+                if create:
+                    try:
+                        conn = self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    with self._lock:
+                        self._acquired += 1
+                    return conn
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"等待数据库连接超时（{self.timeout}秒）")
+                try:
+                    conn, idle_since = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise PoolTimeout(f"等待数据库连接超时（{self.timeout}秒）")
+
+            if (time.monotonic() - idle_since > self.health_check_interval
+                    and not self._is_healthy(conn)):
+                self._discard(conn)
+                continue
+
+            with self._lock:
+                self._acquired += 1
+                self._reused += 1
+            return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        """归还连接；未结束的事务会被回滚"""
+        if self.size == 0:
+            conn.close()
+            return
+
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        if discard or self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    def _discard(self, conn: sqlite3.Connection):
+        """关闭并丢弃连接，腾出名额"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._discarded += 1
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """以上下文管理器方式借用连接，异常时回滚"""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            broken = not self._is_healthy(conn)
+            raise
+        finally:
+            self.release(conn, discard=broken)
+
+    def close_all(self):
+        """关闭所有空闲连接，之后归还的连接也会被关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self) -> Dict[str, int]:
+        """连接池统计信息"""
+        return {
+            "size": self.size,
+            "created": self._created,
+            "idle": self._idle.qsize(),
+            "acquired": self._acquired,
+            "reused": self._reused,
+            "discarded": self._discarded,
+        }
@@ -0,0 +1,147 @@
+"""
+积分变动组提交
+请求线程把积分事件放入队列，由单个后台写入线程按批次合并成一个事务提交，
+多个请求共享一次提交的开销。每个请求拿到的 Future 在所在事务提交后才完成，
+此时变动已对其他连接可见；但默认的 WAL + synchronous=NORMAL 下提交不等待 fsync，
+断电或系统崩溃可能丢失最近已确认的事件（进程崩溃不会），需要断电后仍不丢失时
+设置 DB_PRAGMA_SYNCHRONOUS=FULL。
+单个事件失败（如数值超出范围）只影响提交它的请求，同批其他事件照常提交。
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from backend.database import Database
+
+
+class GroupCommitWriter:
+    """积分事件组提交写入器"""
+
+    def __init__(self, db: Database, max_batch_size: int = 64, max_linger_ms: float = 2.0):
+        """
+        初始化写入器
+
+        Args:
+            db: 数据库实例
+            max_batch_size: 每个事务最多合并的事件数
+            max_linger_ms: 收到第一个事件后最多再等待多少毫秒凑批
+        """
+        self.db = db
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_linger = max_linger_ms / 1000.0
+
+        self._queue: "queue.Queue[Optional[Tuple[tuple, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # 保护 _running 与入队: stop 放入结束标记之后不会再有事件入队，每个 Future 都会完成
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.batches = 0
+        self.events = 0
+        self.failed = 0
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="points-group-commit", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止写入线程，队列中剩余的事件会先提交"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, couple_id: str, points_change: int, reason: str = "") -> Future:
+        """
+        提交积分事件
+
+        Returns:
+            Future，事务提交后结果为新积分（情侣不存在时为 None），该事件执行失败时为对应的异常
+        """
+        future: Future = Future()
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("组提交写入器未启动")
+            self._queue.put(((couple_id, points_change, reason), future))
+        return future
+
+    def _collect(self) -> Tuple[List[Tuple[tuple, Future]], bool]:
+        """阻塞等待第一个事件，然后在 linger 时间内凑满一批"""
+        item = self._queue.get()
+        if item is None:
+            return [], True
+
+        batch = [item]
+        stop = False
+        deadline = time.monotonic() + self.max_linger
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _run(self):
+        """写入线程主循环"""
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._commit(batch)
+            if stop:
+                break
+
+        # 处理停止信号之后仍留在队列里的事件
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftover.append(item)
+        for i in range(0, len(leftover), self.max_batch_size):
+            self._commit(leftover[i:i + self.max_batch_size])
+
+    def _commit(self, batch: List[Tuple[tuple, Future]]):
+        """在一个事务中提交一批事件并完成对应的 Future"""
+        try:
+            results = self.db.update_points_grouped([event for event, _ in batch])
+        except Exception as e:
+            print(f"组提交积分失败: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.events += len(batch)
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                self.failed += 1
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        """组提交统计信息"""
+        return {
+            "batches": self.batches,
+            "events": self.events,
+            "failed": self.failed,
+            "avg_batch_size": self.events / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
@@ -0,0 +1,239 @@
+"""
+积分历史的列式存储
+- HistoryColumns: 一对情侣的历史记录按列存放在 array 中: 时间戳（epoch 微秒，int64）、
+  积分变动（int32）、原因编码（int32）和变动后余额（int64），每条约 24 字节，
+  不再为每条记录保存一个带四个字符串键的字典
+- 原因字符串在 ReasonTable 中去重，相同原因只保存一份；原因表为所有情侣共用且有固定上限
+  （MAX_REASONS 种、每种不超过 MAX_REASON_LENGTH 个字符），表满后出现的新原因和过长的原因
+  不进表，整条记录存入旁路字典，原因表的内存不随数据增长
+- 对外仍表现为由字典组成的只读序列（按需生成字典），可以 append；
+  时间有序时 between() 用二分查找按时间范围查询
+- 不符合列类型的记录（缺少字段、多余字段、非整数、超出范围、无法解析的时间）原样保存在
+  旁路字典中，序列化结果与原数据一致
+"""
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Union
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_INT32 = (-(1 << 31), (1 << 31) - 1)
+_INT64 = (-(1 << 63), (1 << 63) - 1)
+# 遍历时每批生成的字典数
+_CHUNK = 1024
+# 原因表最多保存的原因种数和单个原因的最大长度
+MAX_REASONS = 16384
+MAX_REASON_LENGTH = 64
+
+TimeBound = Union[datetime, str, None]
+
+
+def to_micros(value: Union[datetime, str]) -> int:
+    """ISO 时间或 datetime 转为 epoch 微秒（无时区的按原样计算，带时区的先转为 UTC）"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_micros(micros: int) -> str:
+    """epoch 微秒转回 ISO 时间字符串"""
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+class ReasonTable:
+    """原因字符串去重表: 字符串 <-> int32 编码，容量固定"""
+
+    def __init__(self, max_reasons: int = MAX_REASONS, max_length: int = MAX_REASON_LENGTH):
+        self.max_reasons = max_reasons
+        self.max_length = max_length
+        self.reasons: List[str] = []
+        self.rejected = 0
+        self._codes: Dict[str, int] = {}
+        self._string_bytes = 0
+        self._lock = threading.Lock()
+
+    def code(self, reason: str) -> int:
+        """返回原因的编码，原因过长或表已满时返回 -1"""
+        code = self._codes.get(reason)
+        if code is None:
+            if len(reason) > self.max_length:
+                self.rejected += 1
+                return -1
+            with self._lock:
+                code = self._codes.get(reason)
+                if code is None:
+                    if len(self.reasons) >= self.max_reasons:
+                        self.rejected += 1
+                        return -1
+                    code = self._codes[reason] = len(self.reasons)
+                    self.reasons.append(reason)
+                    self._string_bytes += sys.getsizeof(reason)
+        return code
+
+    def memory_bytes(self) -> int:
+        """原因字符串、列表和索引字典占用的字节数（估算）"""
+        return self._string_bytes + sys.getsizeof(self.reasons) + sys.getsizeof(self._codes)
+
+    def stats(self) -> Dict[str, Any]:
+        """原因表统计"""
+        return {
+            "reasons": len(self.reasons),
+            "max_reasons": self.max_reasons,
+            "rejected": self.rejected,
+            "memory_bytes": self.memory_bytes(),
+        }
+
+    def __len__(self) -> int:
+        return len(self.reasons)
+
+
+# 所有情侣共用一张原因表
+REASONS = ReasonTable()
+
+
+class HistoryColumns(Sequence):
+    """一对情侣的积分历史（列式存储）"""
+
+    __slots__ = ("timestamps", "changes", "reasons", "balances", "_extra", "_sorted")
+
+    def __init__(self, entries: Iterable[Dict[str, Any]] = ()):
+        self.timestamps = array("q")
+        self.changes = array("i")
+        self.reasons = array("i")
+        self.balances = array("q")
+        # 不符合列类型的记录: 下标 -> 原始字典
+        self._extra: Dict[int, Dict[str, Any]] = {}
+        self._sorted = True
+        self.extend(entries)
+
+    def append(self, entry: Dict[str, Any]):
+        """追加一条记录"""
+        self.extend((entry,))
+
+    def extend(self, entries: Iterable[Dict[str, Any]]):
+        """追加多条记录"""
+        timestamps, changes, reasons, balances = self.timestamps, self.changes, self.reasons, self.balances
+        code, fromisoformat = REASONS.code, datetime.fromisoformat
+        low32, high32 = _INT32
+        low64, high64 = _INT64
+        last = timestamps[-1] if timestamps else None
+        for entry in entries:
+            exact = False
+            micros = 0
+            try:
+                timestamp = entry["timestamp"]
+                moment = fromisoformat(timestamp)
+                if moment.tzinfo is None:
+                    micros = (moment - _EPOCH) // _MICROSECOND
+                    # 只有 isoformat() 的标准格式才能原样还原
+                    exact = (len(timestamp) == 26 and moment.microsecond != 0
+                             or len(timestamp) == 19) and timestamp[10] == "T"
+                else:
+                    micros = to_micros(moment)
+                change, reason, balance = entry["points_change"], entry["reason"], entry["new_balance"]
+                exact = (exact and len(entry) == 4 and type(reason) is str
+                         and type(change) is int and low32 <= change <= high32
+                         and type(balance) is int and low64 <= balance <= high64)
+            except (KeyError, TypeError, ValueError):
+                pass
+
+            if exact:
+                reason_code = code(reason)
+                exact = reason_code >= 0
+
+            if last is not None and micros < last:
+                self._sorted = False
+            last = micros
+            timestamps.append(micros)
+            if exact:
+                changes.append(change)
+                reasons.append(reason_code)
+                balances.append(balance)
+            else:
+                changes.append(0)
+                reasons.append(-1)
+                balances.append(0)
+                self._extra[len(timestamps) - 1] = dict(entry)
+
+    def _entry(self, i: int) -> Dict[str, Any]:
+        extra = self._extra.get(i)
+        if extra is not None:
+            return dict(extra)
+        return {
+            "timestamp": from_micros(self.timestamps[i]),
+            "points_change": self.changes[i],
+            "reason": REASONS.reasons[self.reasons[i]],
+            "new_balance": self.balances[i],
+        }
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _entries(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        """批量生成 [start, stop) 的字典"""
+        names = REASONS.reasons
+        result = [
+            {"timestamp": (_EPOCH + timedelta(microseconds=micros)).isoformat(),
+             "points_change": change, "reason": names[reason], "new_balance": balance}
+            if reason >= 0 else None
+            for micros, change, reason, balance in zip(
+                self.timestamps[start:stop], self.changes[start:stop],
+                self.reasons[start:stop], self.balances[start:stop]
+            )
+        ]
+        if self._extra:
+            for i, extra in self._extra.items():
+                if start <= i < stop:
+                    result[i - start] = dict(extra)
+        return result
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self._entries(start, max(start, stop))
+            return [self._entry(i) for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self._entry(index)
+
+    def __iter__(self):
+        for start in range(0, len(self), _CHUNK):
+            yield from self._entries(start, min(start + _CHUNK, len(self)))
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """生成字典列表（用于序列化）"""
+        return self._entries(0, len(self))
+
+    def between(self, since: TimeBound = None, until: TimeBound = None) -> List[Dict[str, Any]]:
+        """时间在 [since, until) 之间的记录"""
+        low = to_micros(since) if since is not None else None
+        high = to_micros(until) if until is not None else None
+        if self._sorted:
+            start = bisect_left(self.timestamps, low) if low is not None else 0
+            end = bisect_left(self.timestamps, high) if high is not None else len(self)
+            return self._entries(start, max(start, end))
+        return [
+            self._entry(i) for i, micros in enumerate(self.timestamps)
+            if (low is None or micros >= low) and (high is None or micros < high)
+        ]
+
+    def memory_bytes(self) -> int:
+        """列数组和旁路记录占用的字节数（估算，不含共用的原因表，见 REASONS.memory_bytes()）"""
+        columns = sum(
+            column.buffer_info()[1] * column.itemsize
+            for column in (self.timestamps, self.changes, self.reasons, self.balances)
+        )
+        extra = sys.getsizeof(self._extra) + sum(
+            sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry.values())
+            for entry in self._extra.values()
+        )
+        return columns + extra
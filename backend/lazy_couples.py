@@ -0,0 +1,386 @@
+"""
+system_data.json 的延迟加载
+- scan_snapshot: 用 mmap + 正则流式扫描快照，得到每对情侣 JSON 的字节偏移、长度和积分，
+  以及其余顶层字段（奖励、兑换记录等）的位置，不解析情侣的历史记录
+- 索引写入旁路文件 system_data.json.idx（带快照大小和修改时间），下次启动直接读取，
+  快照被其他程序改写后索引失效，重新扫描
+- LazyCouples: 按 couple_id 访问的映射，第一次访问时才从快照读出并构造 Couple，
+  已加载的情侣按 LRU 淘汰，总大小（按快照中的 JSON 字节数估算）不超过 max_bytes；
+  修改过（dirty）的情侣在写入下一个快照之前不会被淘汰
+- 写快照时未修改的情侣直接复制原快照中的字节，不需要加载
+"""
+import json
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, MutableMapping, Optional, Tuple
+
+# 字符串整体匹配（跳过其中的括号），其余只关心括号
+_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_TOKEN = re.compile(_STRING + rb'|[{}\[\]]', re.S)
+
+
+def _nested_pattern(levels: int) -> "re.Pattern":
+    """最多嵌套 levels 层的完整 JSON 对象或数组（展开写法，不会回溯爆炸）"""
+    other = rb'[^"{}\[\]]*'
+    value = b""
+    for _ in range(levels):
+        alternatives = _STRING + (b"|" + value if value else b"")
+        content = other + rb"(?:(?:" + alternatives + rb")" + other + rb")*"
+        value = rb"\{" + content + rb"\}|\[" + content + rb"\]"
+    return re.compile(rb"(?:" + value + rb")", re.S)
+
+
+# 情侣（对象 > 历史列表 > 历史记录）以及奖励、兑换记录列表整体用一次正则跳过，
+# 不必逐个括号和字符串在 Python 中处理；更深的结构退回逐个处理
+_NESTED = _nested_pattern(3)
+_POINTS = re.compile(rb'"points"\s*:\s*(-?\d+)')
+_WHITESPACE = b" \t\r\n"
+
+# 情侣索引项: [偏移, 长度, 积分]
+IndexEntry = List[int]
+
+
+def _next_char(mm, pos: int) -> Tuple[int, int]:
+    """跳过空白，返回 (位置, 字节)"""
+    size = len(mm)
+    while pos < size and mm[pos] in _WHITESPACE:
+        pos += 1
+    return pos, (mm[pos] if pos < size else -1)
+
+
+def _value_span(mm, start: int, end: int) -> Tuple[int, int]:
+    """去掉值前后的空白和逗号，返回 (偏移, 长度)"""
+    while start < end and mm[start] in _WHITESPACE:
+        start += 1
+    while end > start and mm[end - 1] in _WHITESPACE + b",":
+        end -= 1
+    return start, end - start
+
+
+def scan_snapshot(path: str) -> Dict[str, Any]:
+    """
+    流式扫描快照文件
+
+    Returns:
+        {"couples": {couple_id: [偏移, 长度, 积分]}, "fields": {顶层字段: [偏移, 长度]}}
+    """
+    couples: Dict[str, IndexEntry] = {}
+    fields: Dict[str, List[int]] = {}
+    if os.path.getsize(path) == 0:
+        return {"couples": couples, "fields": fields}
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        depth = 0
+        in_couples = False
+        top_key: Optional[str] = None   # 当前顶层字段及其值的起点
+        top_start = 0
+        couple_key: Optional[str] = None
+        couple_start = 0
+
+        def close_couple(end: int):
+            offset, length = _value_span(mm, couple_start, end)
+            match = _POINTS.search(mm, offset, offset + length)
+            couples[couple_key] = [offset, length, int(match.group(1)) if match else 0]
+
+        pos = 0
+        while True:
+            match = _TOKEN.search(mm, pos)
+            if match is None:
+                break
+            pos = match.end()
+            token = match.group()
+            if token[0] == 0x22:  # 字符串
+                if depth not in (1, 2) or (depth == 2 and not in_couples):
+                    continue
+                colon, char = _next_char(mm, match.end())
+                if char != 0x3A:  # 不是键
+                    continue
+                key = json.loads(token)
+                if depth == 1:
+                    if top_key is not None and top_key != "couples":
+                        fields[top_key] = list(_value_span(mm, top_start, match.start()))
+                    top_key, top_start = key, colon + 1
+                    in_couples = key == "couples"
+                else:
+                    if couple_key is not None:
+                        close_couple(match.start())
+                    couple_key, couple_start = key, colon + 1
+            elif token in (b"{", b"["):
+                if depth >= 1 and not (depth == 1 and in_couples):
+                    nested = _NESTED.match(mm, match.start())
+                    if nested is not None:
+                        pos = nested.end()
+                        continue
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 1 and in_couples and couple_key is not None:
+                    # couples 对象结束
+                    close_couple(match.start())
+                    couple_key = None
+                    in_couples = False
+                elif depth == 0:
+                    if top_key is not None and top_key != "couples":
+                        fields[top_key] = list(_value_span(mm, top_start, match.start()))
+                    break
+    return {"couples": couples, "fields": fields}
+
+
+def _stat_key(path: str) -> List[int]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_index(path: str) -> Dict[str, Any]:
+    """读取旁路索引，不存在或与快照不匹配时重新扫描并写入"""
+    index_path = path + ".idx"
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("snapshot") == _stat_key(path):
+            return index
+    except (OSError, ValueError):
+        pass
+
+    index = scan_snapshot(path)
+    save_index(path, index)
+    return index
+
+
+def save_index(path: str, index: Dict[str, Any]):
+    """写入旁路索引（失败时忽略，下次启动重新扫描）"""
+    index_path = path + ".idx"
+    temp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        index["snapshot"] = _stat_key(path)
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, index_path)
+    except OSError as e:
+        print(f"写入快照索引失败: {e}")
+
+
+def read_fields(path: str, index: Dict[str, Any]) -> Dict[str, Any]:
+    """读取快照中除 couples 以外的顶层字段"""
+    data = {}
+    with open(path, "rb") as f:
+        for name, (offset, length) in index["fields"].items():
+            f.seek(offset)
+            data[name] = json.loads(f.read(length))
+    return data
+
+
+class SnapshotPlan:
+    """写快照时情侣部分的内容: 修改过的情侣序列化，其余从旧快照复制字节"""
+
+    def __init__(self, source_fd: Optional[int], items: List[Tuple[str, Any]], versions: Dict[str, int]):
+        self.source_fd = source_fd
+        self.items = items        # (couple_id, 字典或旧快照中的索引项)
+        self.versions = versions  # 取快照时 dirty 情侣的版本号
+
+
+class LazyCouples(MutableMapping):
+    """按需从快照加载的情侣映射"""
+
+    def __init__(self, path: Optional[str], index: Dict[str, IndexEntry],
+                 from_dict: Callable[[dict], Any], max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            path: 快照路径，None 表示还没有快照
+            index: 情侣索引
+            from_dict: 由字典构造 Couple 的函数
+            max_bytes: 已加载且未修改的情侣总大小上限（按快照中的字节数估算）
+        """
+        self.from_dict = from_dict
+        self.max_bytes = max_bytes
+        self._fd = os.open(path, os.O_RDONLY) if path else None
+        self._index = index
+        self._loaded: "OrderedDict[str, Any]" = OrderedDict()
+        self._loaded_bytes = 0
+        self._dirty: Dict[str, int] = {}
+        self._version = 0
+        self._lock = threading.RLock()
+
+        # 统计信息
+        self.hydrations = 0
+        self.evictions = 0
+
+    # ==================== 映射接口 ====================
+
+    def __getitem__(self, couple_id: str):
+        with self._lock:
+            couple = self._loaded.get(couple_id)
+            if couple is not None:
+                self._loaded.move_to_end(couple_id)
+                return couple
+            entry = self._index.get(couple_id)
+            if entry is None:
+                raise KeyError(couple_id)
+            couple = self.from_dict(json.loads(os.pread(self._fd, entry[1], entry[0])))
+            self._loaded[couple_id] = couple
+            self._loaded_bytes += entry[1]
+            self.hydrations += 1
+            self._evict()
+            return couple
+
+    def __setitem__(self, couple_id: str, couple):
+        with self._lock:
+            self._forget(couple_id)
+            self._loaded[couple_id] = couple
+            self.mark_dirty(couple_id)
+
+    def __delitem__(self, couple_id: str):
+        with self._lock:
+            if couple_id not in self:
+                raise KeyError(couple_id)
+            self._forget(couple_id)
+            self._index.pop(couple_id, None)
+            self._dirty.pop(couple_id, None)
+
+    def __contains__(self, couple_id) -> bool:
+        return couple_id in self._loaded or couple_id in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            ids = list(self._index)
+            ids += [cid for cid in self._loaded if cid not in self._index]
+        return iter(ids)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._index) + sum(1 for cid in self._loaded if cid not in self._index)
+
+    # ==================== 缓存管理 ====================
+
+    def mark_dirty(self, couple_id: str):
+        """标记情侣已修改，写入快照之前不会被淘汰"""
+        with self._lock:
+            if couple_id not in self._dirty and couple_id in self._loaded:
+                # 只有未修改的情侣计入缓存大小
+                entry = self._index.get(couple_id)
+                if entry:
+                    self._loaded_bytes -= entry[1]
+            self._version += 1
+            self._dirty[couple_id] = self._version
+
+    def pin(self, couple_id: str):
+        """取出准备修改的情侣并标记为已修改（原子操作，取出后不会先被淘汰），不存在时返回 None"""
+        with self._lock:
+            if couple_id not in self:
+                return None
+            couple = self[couple_id]
+            self.mark_dirty(couple_id)
+            return couple
+
+    def points(self, couple_id: str) -> int:
+        """情侣积分，未加载时使用索引中的值"""
+        couple = self._loaded.get(couple_id)
+        if couple is not None:
+            return couple.points
+        return self._index[couple_id][2]
+
+    def loaded_count(self) -> int:
+        return len(self._loaded)
+
+    def _forget(self, couple_id: str):
+        if self._loaded.pop(couple_id, None) is not None and couple_id not in self._dirty:
+            entry = self._index.get(couple_id)
+            if entry:
+                self._loaded_bytes -= entry[1]
+
+    def _evict(self):
+        """淘汰最久未使用的未修改情侣，直到低于上限"""
+        if self._loaded_bytes <= self.max_bytes:
+            return
+        # 刚访问的一对不淘汰
+        for couple_id in list(self._loaded)[:-1]:
+            if self._loaded_bytes <= self.max_bytes:
+                break
+            if couple_id in self._dirty:
+                continue
+            self._forget(couple_id)
+            self.evictions += 1
+
+    # ==================== 快照 ====================
+
+    def capture(self, to_dict: Callable[[Any], dict]) -> SnapshotPlan:
+        """在数据锁内取快照内容，只序列化修改过的情侣"""
+        with self._lock:
+            items = []
+            for couple_id in self:
+                if couple_id in self._dirty:
+                    items.append((couple_id, to_dict(self._loaded[couple_id])))
+                else:
+                    items.append((couple_id, self._index[couple_id]))
+            return SnapshotPlan(self._fd, items, dict(self._dirty))
+
+    @staticmethod
+    def write(f: BinaryIO, plan: SnapshotPlan, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        按快照计划写出完整快照，返回新快照的索引
+
+        每对情侣单独一行，未修改的情侣直接复制旧快照中的字节
+        """
+        couples: Dict[str, IndexEntry] = {}
+        f.write(b'{"couples":{')
+        for i, (couple_id, source) in enumerate(plan.items):
+            f.write((",\n" if i else "\n").encode())
+            f.write(json.dumps(couple_id, ensure_ascii=False).encode() + b":")
+            if isinstance(source, dict):
+                body = json.dumps(source, ensure_ascii=False, separators=(",", ":")).encode()
+                points = source["points"]
+            else:
+                body = os.pread(plan.source_fd, source[1], source[0])
+                points = source[2]
+            couples[couple_id] = [f.tell(), len(body), points]
+            f.write(body)
+        f.write(b"\n}")
+
+        spans: Dict[str, List[int]] = {}
+        for name, value in fields.items():
+            f.write(b"," + json.dumps(name).encode() + b":")
+            body = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+            spans[name] = [f.tell(), len(body)]
+            f.write(body)
+        f.write(b"}")
+        return {"couples": couples, "fields": spans}
+
+    def switch(self, path: str, index: Dict[str, Any], plan: SnapshotPlan):
+        """新快照替换完成后改为从新快照读取，取快照后没有再修改的情侣恢复为可淘汰"""
+        with self._lock:
+            old_fd = self._fd
+            self._fd = os.open(path, os.O_RDONLY)
+            if old_fd is not None:
+                os.close(old_fd)
+            # 取快照之后新增的情侣仍只在内存中（dirty），不会读取索引
+            self._index = index["couples"]
+            for couple_id, version in plan.versions.items():
+                if self._dirty.get(couple_id) == version:
+                    del self._dirty[couple_id]
+            self._loaded_bytes = sum(
+                self._index[cid][1] for cid in self._loaded
+                if cid not in self._dirty and cid in self._index
+            )
+            self._evict()
+
+    def close(self):
+        """关闭快照文件"""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        return {
+            "couples": len(self),
+            "loaded": len(self._loaded),
+            "loaded_bytes": self._loaded_bytes,
+            "max_bytes": self.max_bytes,
+            "dirty": len(self._dirty),
+            "hydrations": self.hydrations,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,304 @@
+"""
+运行指标
+- Histogram: HDR 风格的对数线性直方图（每个 2 的幂区间分 8 个子桶，相对误差约 12.5%），
+  记录是一次整数移位和一次列表自增，不做排序或分配
+- MetricsRegistry: 按路由的请求延迟直方图、状态码计数、进行中请求数，以及按语句名的 SQL 耗时
+- MetricsMiddleware: 纯 ASGI 中间件，路由匹配后按路由模板（如 /couples/{couple_id}）记录
+- TimedConnection: Database 设置 sql_hook 后用它包装连接，为每条 SQL 计时
+- render() 输出 Prometheus 文本格式
+"""
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+
+# 0..15 微秒线性分桶，之后每个 2 的幂区间 8 个子桶
+_SUB_BITS = 3
+_LINEAR = 1 << (_SUB_BITS + 1)
+_SUB_COUNT = 1 << _SUB_BITS
+_BUCKETS = 256
+
+# Prometheus 输出的桶边界（微秒）: 16us, 32us, ... 约 67s
+_EXPORT_BOUNDS = [1 << k for k in range(_SUB_BITS + 1, 27)]
+
+
+def _bucket_index(micros: int) -> int:
+    if micros < _LINEAR:
+        return micros
+    shift = micros.bit_length() - (_SUB_BITS + 1)
+    index = _LINEAR + (shift - 1) * _SUB_COUNT + ((micros >> shift) - _SUB_COUNT)
+    return index if index < _BUCKETS else _BUCKETS - 1
+
+
+def _bucket_upper(index: int) -> int:
+    """桶的上界（不含，微秒）"""
+    if index < _LINEAR:
+        return index + 1
+    shift = (index - _LINEAR) // _SUB_COUNT + 1
+    top = (index - _LINEAR) % _SUB_COUNT + _SUB_COUNT
+    return (top + 1) << shift
+
+
+class Histogram:
+    """固定分桶的延迟直方图，单位微秒
+
+    只在事件循环线程中记录时可以不加锁（thread_safe=False）
+    """
+
+    __slots__ = ("counts", "count", "total", "max", "_lock")
+
+    def __init__(self, thread_safe: bool = True):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._lock = threading.Lock() if thread_safe else None
+
+    def record(self, micros: int):
+        """记录一个值"""
+        index = _bucket_index(micros)
+        if self._lock is None:
+            self._add(index, micros)
+        else:
+            with self._lock:
+                self._add(index, micros)
+
+    def _add(self, index: int, micros: int):
+        self.counts[index] += 1
+        self.count += 1
+        self.total += micros
+        if micros > self.max:
+            self.max = micros
+
+    def percentile(self, q: float) -> int:
+        """估算分位数（返回所在桶的上界，微秒）"""
+        if not self.count:
+            return 0
+        target = max(1, int(self.count * q + 0.5))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(_bucket_upper(index), self.max)
+        return self.max
+
+    def cumulative(self, bounds: List[int]) -> List[int]:
+        """各边界（微秒，含）以下的累计数量"""
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            while index < _BUCKETS and _bucket_upper(index) <= bound:
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+
+_SQL_VERB = re.compile(r"^\s*(\w+)", re.IGNORECASE)
+_SQL_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_name(sql: str) -> str:
+    """SQL 语句名: 动词 + 第一个表名，如 "SELECT couples"、"UPDATE rewards" """
+    verb = _SQL_VERB.match(sql)
+    table = _SQL_TABLE.search(sql)
+    name = verb.group(1).upper() if verb else "SQL"
+    if name == "PRAGMA":
+        return "PRAGMA"
+    return f"{name} {table.group(1)}" if table else name
+
+
+class MetricsRegistry:
+    """指标汇总"""
+
+    def __init__(self):
+        # 请求指标只在事件循环线程中记录，SQL 指标来自多个数据库线程
+        self.routes: Dict[Tuple[str, str], Histogram] = {}
+        self.statuses: Dict[Tuple[str, str, int], int] = {}
+        self.sql: Dict[str, Histogram] = {}
+        self._sql_by_text: Dict[str, Histogram] = {}
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def record_request(self, method: str, route: str, status: int, micros: int):
+        """记录一次请求"""
+        key = (method, route)
+        histogram = self.routes.get(key)
+        if histogram is None:
+            histogram = self.routes[key] = Histogram(thread_safe=False)
+        histogram.record(micros)
+        key = (method, route, status)
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def record_sql(self, sql: str, seconds: float):
+        """Database.sql_hook 回调: 按语句名记录耗时"""
+        histogram = self._sql_by_text.get(sql)
+        if histogram is None:
+            with self._lock:
+                histogram = self.sql.setdefault(statement_name(sql), Histogram())
+                self._sql_by_text[sql] = histogram
+        histogram.record(int(seconds * 1_000_000))
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines = [
+            "# HELP http_requests_in_flight 正在处理的请求数",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total 按路由和状态码统计的请求数",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), n in sorted(self.statuses.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {n}')
+
+        lines += [
+            "# HELP http_request_duration_seconds 按路由统计的请求耗时",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(self.routes.items()):
+            lines += _render_histogram(
+                "http_request_duration_seconds", f'method="{method}",route="{route}"', histogram
+            )
+
+        lines += [
+            "# HELP db_statement_duration_seconds 按语句名统计的 SQL 执行耗时",
+            "# TYPE db_statement_duration_seconds histogram",
+        ]
+        for name, histogram in sorted(self.sql.items()):
+            lines += _render_histogram("db_statement_duration_seconds", f'statement="{name}"', histogram)
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        """按路由的请求数和 p50/p99/最大延迟（毫秒）"""
+        def describe(h: Histogram) -> Dict[str, Any]:
+            return {
+                "count": h.count,
+                "p50_ms": h.percentile(0.5) / 1000,
+                "p99_ms": h.percentile(0.99) / 1000,
+                "max_ms": h.max / 1000,
+            }
+        return {
+            "in_flight": self.in_flight,
+            "routes": {f"{m} {r}": describe(h) for (m, r), h in sorted(self.routes.items())},
+            "sql": {name: describe(h) for name, h in sorted(self.sql.items())},
+        }
+
+
+def _render_histogram(metric: str, labels: str, histogram: Histogram) -> List[str]:
+    lines = []
+    for bound, n in zip(_EXPORT_BOUNDS, histogram.cumulative(_EXPORT_BOUNDS)):
+        lines.append(f'{metric}_bucket{{{labels},le="{bound / 1_000_000:g}"}} {n}')
+    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{metric}_sum{{{labels}}} {histogram.total / 1_000_000:.6f}")
+    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+class MetricsMiddleware:
+    """记录每个 HTTP 请求的耗时、状态码和进行中数量"""
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        registry.in_flight += 1
+        start = time.perf_counter_ns()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            micros = (time.perf_counter_ns() - start) // 1000
+            registry.in_flight -= 1
+            route = scope.get("route")
+            registry.record_request(
+                scope["method"], getattr(route, "path", "<unmatched>"), status, micros
+            )
+
+
+# ==================== SQL 计时 ====================
+
+SqlHook = Callable[[str, float], None]
+
+
+class TimedCursor:
+    """为 execute/executemany 计时的游标包装"""
+
+    __slots__ = ("_cursor", "_hook")
+
+    def __init__(self, cursor, hook: SqlHook):
+        self._cursor = cursor
+        self._hook = hook
+
+    def execute(self, sql: str, *args):
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(sql, *args)
+        finally:
+            self._hook(sql, time.perf_counter() - start)
+        return self
+
+    def executemany(self, sql: str, *args):
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, *args)
+        finally:
+            self._hook(sql, time.perf_counter() - start)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """为每条 SQL 计时的连接包装，其余属性透传给原连接"""
+
+    __slots__ = ("_conn", "_hook")
+
+    def __init__(self, conn, hook: SqlHook):
+        self._conn = conn
+        self._hook = hook
+
+    def cursor(self, *args, **kwargs) -> TimedCursor:
+        return TimedCursor(self._conn.cursor(*args, **kwargs), self._hook)
+
+    def execute(self, sql: str, *args):
+        start = time.perf_counter()
+        try:
+            return self._conn.execute(sql, *args)
+        finally:
+            self._hook(sql, time.perf_counter() - start)
+
+    def executemany(self, sql: str, *args):
+        start = time.perf_counter()
+        try:
+            return self._conn.executemany(sql, *args)
+        finally:
+            self._hook(sql, time.perf_counter() - start)
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name: str, value):
+        if name in TimedConnection.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
@@ -0,0 +1,488 @@
+"""
+数据库版本迁移
+通过 PRAGMA user_version 记录当前结构版本，按编号依次应用迁移，
+数据库已是最新版本时只需读取一次 user_version，不执行任何 DDL
+
+命令行用法:
+    python -m backend.migrations status  [--db data/heartbeat.db]
+    python -m backend.migrations dry-run [--db data/heartbeat.db]
+    python -m backend.migrations apply   [--db data/heartbeat.db]
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any
+
+
+class Migration:
+    """单个迁移：一组SQL语句或一个接收连接的函数"""
+
+    def __init__(self, version: int, description: str,
+                 statements: Optional[List[str]] = None,
+                 apply: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.version = version
+        self.description = description
+        self.statements = statements or []
+        self.apply = apply
+
+    def run(self, conn: sqlite3.Connection):
+        """在当前事务中执行迁移"""
+        for sql in self.statements:
+            conn.execute(sql)
+        if self.apply:
+            self.apply(conn)
+
+
+# ==================== 迁移定义 ====================
+
+SCHEMA_V1 = [
+    # 用户表
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        is_admin INTEGER DEFAULT 0,
+        created_time TEXT NOT NULL
+    )
+    """,
+    # 情侣表
+    """
+    CREATE TABLE IF NOT EXISTS couples (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        couple_id TEXT UNIQUE NOT NULL,
+        user_id INTEGER NOT NULL,
+        name1 TEXT NOT NULL,
+        name2 TEXT NOT NULL,
+        points INTEGER DEFAULT 0,
+        created_time TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    # 积分历史表
+    """
+    CREATE TABLE IF NOT EXISTS point_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        couple_id TEXT NOT NULL,
+        points_change INTEGER NOT NULL,
+        reason TEXT,
+        created_time TEXT NOT NULL,
+        FOREIGN KEY (couple_id) REFERENCES couples(couple_id) ON DELETE CASCADE
+    )
+    """,
+    # 基础奖励表（供参考）
+    """
+    CREATE TABLE IF NOT EXISTS base_rewards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        points_needed INTEGER NOT NULL,
+        description TEXT,
+        is_active INTEGER DEFAULT 1
+    )
+    """,
+    # 情侣奖励表（每对情侣自己设置）
+    """
+    CREATE TABLE IF NOT EXISTS couple_rewards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        reward_id TEXT UNIQUE NOT NULL,
+        couple_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        points_needed INTEGER NOT NULL,
+        stock INTEGER DEFAULT 1,
+        description TEXT,
+        created_time TEXT NOT NULL,
+        FOREIGN KEY (couple_id) REFERENCES couples(couple_id) ON DELETE CASCADE
+    )
+    """,
+    # 兑换记录表
+    """
+    CREATE TABLE IF NOT EXISTS exchange_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        record_id TEXT UNIQUE NOT NULL,
+        couple_id TEXT NOT NULL,
+        reward_id TEXT NOT NULL,
+        points_used INTEGER NOT NULL,
+        exchange_time TEXT NOT NULL,
+        FOREIGN KEY (couple_id) REFERENCES couples(couple_id) ON DELETE CASCADE
+    )
+    """,
+]
+
+# 二级索引（名称, 定义）
+INDEXES: List[tuple] = [
+    # get_couple_by_user_id / get_user_couple_id
+    ("idx_couples_user_id", "couples (user_id)"),
+    # get_all_couples 按创建时间排序
+    ("idx_couples_created_time", "couples (created_time DESC)"),
+    # get_all_users 按创建时间排序
+    ("idx_users_created_time", "users (created_time DESC)"),
+    # 统计管理员数量
+    ("idx_users_is_admin", "users (is_admin)"),
+    # get_point_history: WHERE couple_id ORDER BY created_time DESC
+    ("idx_point_history_couple_time", "point_history (couple_id, created_time DESC)"),
+    # get_base_rewards: WHERE is_active ORDER BY points_needed
+    ("idx_base_rewards_active_points", "base_rewards (is_active, points_needed)"),
+    # get_couple_rewards: WHERE couple_id ORDER BY points_needed
+    ("idx_couple_rewards_couple_points", "couple_rewards (couple_id, points_needed)"),
+    # get_exchange_records: WHERE couple_id ORDER BY exchange_time DESC
+    ("idx_exchange_records_couple_time", "exchange_records (couple_id, exchange_time DESC)"),
+    # get_all_exchange_records 按兑换时间排序
+    ("idx_exchange_records_time", "exchange_records (exchange_time DESC)"),
+]
+
+# 游标分页需要 (时间, id) 完整有序，用带 id 的索引替换迁移2中的时间索引
+REPLACED_INDEXES = [
+    "idx_point_history_couple_time",
+    "idx_exchange_records_couple_time",
+    "idx_exchange_records_time",
+]
+KEYSET_INDEXES: List[tuple] = [
+    ("idx_point_history_couple_time_id", "point_history (couple_id, created_time DESC, id DESC)"),
+    ("idx_exchange_records_couple_time_id",
+     "exchange_records (couple_id, exchange_time DESC, id DESC)"),
+    ("idx_exchange_records_time_id", "exchange_records (exchange_time DESC, id DESC)"),
+]
+
+# 管理员列表按 (排序列, id) 游标翻页，每个可排序字段一个复合索引
+REPLACED_ADMIN_INDEXES = [
+    "idx_couples_created_time",
+    "idx_users_created_time",
+]
+ADMIN_LIST_INDEXES: List[tuple] = [
+    ("idx_couples_created_time_id", "couples (created_time DESC, id DESC)"),
+    ("idx_couples_points_id", "couples (points DESC, id DESC)"),
+    ("idx_users_created_time_id", "users (created_time DESC, id DESC)"),
+    ("idx_exchange_records_points_id", "exchange_records (points_used DESC, id DESC)"),
+]
+
+# 管理员统计表: 由触发器在同一事务中维护，/admin/stats 只读一行，不再扫描全表
+# 兑换产生的积分历史用 exchange_id 关联兑换记录，只计入 points_redeemed；
+# points_deducted 只统计 exchange_id 为空的扣分，两者不重叠
+STATS_TABLES = [
+    "ALTER TABLE point_history ADD COLUMN exchange_id TEXT",
+    # 全局累计（单行）
+    """
+    CREATE TABLE IF NOT EXISTS stats_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_couples INTEGER NOT NULL DEFAULT 0,
+        total_points INTEGER NOT NULL DEFAULT 0,
+        total_exchanges INTEGER NOT NULL DEFAULT 0,
+        points_issued INTEGER NOT NULL DEFAULT 0,
+        points_deducted INTEGER NOT NULL DEFAULT 0,
+        points_redeemed INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    # 按天汇总，day 为 created_time / exchange_time 的日期部分
+    """
+    CREATE TABLE IF NOT EXISTS stats_daily (
+        day TEXT PRIMARY KEY,
+        new_couples INTEGER NOT NULL DEFAULT 0,
+        active_couples INTEGER NOT NULL DEFAULT 0,
+        points_issued INTEGER NOT NULL DEFAULT 0,
+        points_deducted INTEGER NOT NULL DEFAULT 0,
+        points_redeemed INTEGER NOT NULL DEFAULT 0,
+        exchanges INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+    # 当天有积分变动的情侣，首次插入时 active_couples 加一
+    """
+    CREATE TABLE IF NOT EXISTS stats_daily_active (
+        day TEXT NOT NULL,
+        couple_id TEXT NOT NULL,
+        PRIMARY KEY (day, couple_id)
+    ) WITHOUT ROWID
+    """,
+]
+
+# 用已有数据初始化统计表（在创建触发器之前执行）
+STATS_BACKFILL = [
+    # 已有的兑换在同一事务中先写兑换记录、再写一条等额的负积分历史:
+    # 每条兑换记录关联其后一秒内同一情侣、同样金额的第一条积分历史
+    """
+    UPDATE point_history SET exchange_id = (
+        SELECT e.record_id FROM exchange_records e
+        WHERE e.couple_id = point_history.couple_id
+          AND e.points_used = -point_history.points_change
+          AND point_history.id = (
+              SELECT h.id FROM point_history h
+              WHERE h.couple_id = e.couple_id AND h.points_change = -e.points_used
+                AND h.created_time >= e.exchange_time
+                AND julianday(h.created_time) - julianday(e.exchange_time) < 1.0 / 86400
+              ORDER BY h.created_time, h.id LIMIT 1
+          )
+    )
+    WHERE points_change < 0
+    """,
+    """
+    INSERT OR REPLACE INTO stats_totals
+        (id, total_couples, total_points, total_exchanges,
+         points_issued, points_deducted, points_redeemed)
+    SELECT 1,
+        (SELECT COUNT(*) FROM couples),
+        (SELECT COALESCE(SUM(points), 0) FROM couples),
+        (SELECT COUNT(*) FROM exchange_records),
+        (SELECT COALESCE(SUM(MAX(points_change, 0)), 0) FROM point_history),
+        (SELECT COALESCE(SUM(MAX(-points_change, 0)), 0) FROM point_history WHERE exchange_id IS NULL),
+        (SELECT COALESCE(SUM(points_used), 0) FROM exchange_records)
+    """,
+    """
+    INSERT OR IGNORE INTO stats_daily_active (day, couple_id)
+    SELECT DISTINCT substr(created_time, 1, 10), couple_id FROM point_history
+    """,
+    """
+    INSERT INTO stats_daily (day, new_couples)
+    SELECT substr(created_time, 1, 10), COUNT(*) FROM couples WHERE true GROUP BY 1
+    ON CONFLICT(day) DO UPDATE SET new_couples = excluded.new_couples
+    """,
+    """
+    INSERT INTO stats_daily (day, active_couples)
+    SELECT day, COUNT(*) FROM stats_daily_active WHERE true GROUP BY day
+    ON CONFLICT(day) DO UPDATE SET active_couples = excluded.active_couples
+    """,
+    """
+    INSERT INTO stats_daily (day, points_issued, points_deducted)
+    SELECT substr(created_time, 1, 10), SUM(MAX(points_change, 0)),
+        SUM(CASE WHEN exchange_id IS NULL THEN MAX(-points_change, 0) ELSE 0 END)
+    FROM point_history WHERE true GROUP BY 1
+    ON CONFLICT(day) DO UPDATE SET
+        points_issued = excluded.points_issued, points_deducted = excluded.points_deducted
+    """,
+    """
+    INSERT INTO stats_daily (day, exchanges, points_redeemed)
+    SELECT substr(exchange_time, 1, 10), COUNT(*), SUM(points_used)
+    FROM exchange_records WHERE true GROUP BY 1
+    ON CONFLICT(day) DO UPDATE SET
+        exchanges = excluded.exchanges, points_redeemed = excluded.points_redeemed
+    """,
+]
+
+STATS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_couple_insert AFTER INSERT ON couples
+    BEGIN
+        UPDATE stats_totals SET
+            total_couples = total_couples + 1,
+            total_points = total_points + NEW.points
+        WHERE id = 1;
+        INSERT OR IGNORE INTO stats_daily (day) VALUES (substr(NEW.created_time, 1, 10));
+        UPDATE stats_daily SET new_couples = new_couples + 1
+        WHERE day = substr(NEW.created_time, 1, 10);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_couple_delete AFTER DELETE ON couples
+    BEGIN
+        UPDATE stats_totals SET
+            total_couples = total_couples - 1,
+            total_points = total_points - OLD.points
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_couple_points AFTER UPDATE OF points ON couples
+    WHEN NEW.points IS NOT OLD.points
+    BEGIN
+        UPDATE stats_totals SET total_points = total_points + NEW.points - OLD.points
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_point_history AFTER INSERT ON point_history
+    BEGIN
+        UPDATE stats_totals SET
+            points_issued = points_issued + MAX(NEW.points_change, 0),
+            points_deducted = points_deducted
+                + CASE WHEN NEW.exchange_id IS NULL THEN MAX(-NEW.points_change, 0) ELSE 0 END
+        WHERE id = 1;
+        INSERT OR IGNORE INTO stats_daily (day) VALUES (substr(NEW.created_time, 1, 10));
+        UPDATE stats_daily SET
+            points_issued = points_issued + MAX(NEW.points_change, 0),
+            points_deducted = points_deducted
+                + CASE WHEN NEW.exchange_id IS NULL THEN MAX(-NEW.points_change, 0) ELSE 0 END
+        WHERE day = substr(NEW.created_time, 1, 10);
+        INSERT OR IGNORE INTO stats_daily_active (day, couple_id)
+        VALUES (substr(NEW.created_time, 1, 10), NEW.couple_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_daily_active AFTER INSERT ON stats_daily_active
+    BEGIN
+        UPDATE stats_daily SET active_couples = active_couples + 1 WHERE day = NEW.day;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_exchange AFTER INSERT ON exchange_records
+    BEGIN
+        UPDATE stats_totals SET
+            total_exchanges = total_exchanges + 1,
+            points_redeemed = points_redeemed + NEW.points_used
+        WHERE id = 1;
+        INSERT OR IGNORE INTO stats_daily (day) VALUES (substr(NEW.exchange_time, 1, 10));
+        UPDATE stats_daily SET
+            exchanges = exchanges + 1,
+            points_redeemed = points_redeemed + NEW.points_used
+        WHERE day = substr(NEW.exchange_time, 1, 10);
+    END
+    """,
+]
+
+DEFAULT_BASE_REWARDS = [
+    ("一起看电影", 50, "去电影院看一场电影"),
+    ("浪漫晚餐", 100, "去喜欢的餐厅吃一顿浪漫晚餐"),
+    ("周末旅行", 200, "周末一起去附近城市旅行"),
+    ("送一束花", 30, "送对方一束鲜花"),
+    ("做一顿大餐", 40, "亲手为对方做一顿丰盛的晚餐"),
+    ("按摩服务", 60, "为对方提供30分钟按摩服务"),
+    ("游乐园一日游", 150, "一起去游乐园玩一天"),
+    ("买心仪的礼物", 120, "买一件对方心仪已久的礼物"),
+    ("温泉之旅", 250, "一起去泡温泉放松"),
+    ("演唱会门票", 300, "去看喜欢的歌手的演唱会"),
+]
+
+
+def _seed_default_data(conn: sqlite3.Connection):
+    """初始化默认数据（管理员账号和基础奖励列表）"""
+    from backend.database import Database
+
+    # 检查是否已有管理员账号
+    admin_count = conn.execute("SELECT COUNT(*) FROM users WHERE is_admin = 1").fetchone()[0]
+    if admin_count == 0:
+        # 创建默认管理员账号: admin / admin123
+        conn.execute("""
+            INSERT INTO users (username, password_hash, is_admin, created_time)
+            VALUES (?, ?, 1, ?)
+        """, ("admin", Database.hash_password("admin123"), datetime.now().isoformat()))
+        print("已创建默认管理员账号: admin / admin123")
+
+    # 检查是否已有基础奖励
+    reward_count = conn.execute("SELECT COUNT(*) FROM base_rewards").fetchone()[0]
+    if reward_count == 0:
+        conn.executemany("""
+            INSERT INTO base_rewards (name, points_needed, description)
+            VALUES (?, ?, ?)
+        """, DEFAULT_BASE_REWARDS)
+        print(f"已添加 {len(DEFAULT_BASE_REWARDS)} 个基础奖励供参考")
+
+
+MIGRATIONS: List[Migration] = [
+    # 使用 IF NOT EXISTS，以便接管迁移引擎之前创建的数据库
+    Migration(1, "初始表结构", statements=SCHEMA_V1),
+    Migration(2, "热点查询二级索引", statements=[
+        f"CREATE INDEX IF NOT EXISTS {name} ON {definition}" for name, definition in INDEXES
+    ]),
+    Migration(3, "默认管理员和基础奖励", apply=_seed_default_data),
+    Migration(4, "游标分页索引", statements=[
+        f"DROP INDEX IF EXISTS {name}" for name in REPLACED_INDEXES
+    ] + [
+        f"CREATE INDEX IF NOT EXISTS {name} ON {definition}" for name, definition in KEYSET_INDEXES
+    ]),
+    Migration(5, "积分变动幂等键", statements=[
+        "ALTER TABLE point_history ADD COLUMN idempotency_key TEXT",
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_point_history_idempotency
+        ON point_history (couple_id, idempotency_key)
+        WHERE idempotency_key IS NOT NULL
+        """,
+    ]),
+    Migration(6, "管理员统计表和维护触发器",
+              statements=STATS_TABLES + STATS_BACKFILL + STATS_TRIGGERS),
+    Migration(7, "管理员列表分页索引", statements=[
+        f"DROP INDEX IF EXISTS {name}" for name in REPLACED_ADMIN_INDEXES
+    ] + [
+        f"CREATE INDEX IF NOT EXISTS {name} ON {definition}" for name, definition in ADMIN_LIST_INDEXES
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# ==================== 迁移执行器 ====================
+
+class MigrationRunner:
+    """按 user_version 依次执行未应用的迁移"""
+
+    def __init__(self, conn: sqlite3.Connection, migrations: Optional[List[Migration]] = None):
+        self.conn = conn
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+
+    def current_version(self) -> int:
+        """当前数据库结构版本"""
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def pending(self) -> List[Migration]:
+        """尚未应用的迁移"""
+        version = self.current_version()
+        return [m for m in self.migrations if m.version > version]
+
+    def migrate(self, dry_run: bool = False) -> List[Dict[str, Any]]:
+        """
+        应用所有未执行的迁移，每个迁移单独一个事务
+
+        Args:
+            dry_run: 为 True 时只列出将要执行的迁移
+
+        Returns:
+            每个迁移的版本、描述和耗时（毫秒）
+        """
+        results = []
+        if dry_run:
+            return [
+                {"version": m.version, "description": m.description, "elapsed_ms": None}
+                for m in self.pending()
+            ]
+
+        for migration in self.pending():
+            start = time.perf_counter()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 拿到写锁后再检查一次，避免多个进程重复执行
+                if self.current_version() >= migration.version:
+                    self.conn.rollback()
+                    continue
+                migration.run(self.conn)
+                self.conn.execute(f"PRAGMA user_version = {migration.version}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            results.append({
+                "version": migration.version,
+                "description": migration.description,
+                "elapsed_ms": (time.perf_counter() - start) * 1000,
+            })
+        return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """迁移命令行入口"""
+    parser = argparse.ArgumentParser(description="数据库版本迁移")
+    parser.add_argument("command", choices=["status", "dry-run", "apply"], help="要执行的操作")
+    parser.add_argument("--db", default="data/heartbeat.db", help="数据库文件路径")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        runner = MigrationRunner(conn)
+        print(f"数据库: {args.db}")
+        print(f"当前版本: {runner.current_version()} / 最新版本: {LATEST_VERSION}")
+
+        if args.command == "status":
+            for m in runner.pending():
+                print(f"  待执行 {m.version:>3}: {m.description}")
+            return 0
+
+        results = runner.migrate(dry_run=(args.command == "dry-run"))
+        if not results:
+            print("数据库已是最新版本，无需迁移")
+        for r in results:
+            timing = "（预演）" if r["elapsed_ms"] is None else f"{r['elapsed_ms']:.2f} ms"
+            print(f"  {r['version']:>3}: {r['description']} - {timing}")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
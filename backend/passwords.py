@@ -0,0 +1,163 @@
+"""
+密码哈希
+- 使用 hashlib.scrypt（内存困难 KDF），每个密码独立随机盐
+- 哈希字符串自带算法和参数: scrypt$<n>$<r>$<p>$<盐>$<哈希>，调整参数后旧哈希仍可验证，
+  登录成功时 needs_rehash 为真则按当前参数重新哈希
+- 兼容旧版无盐 SHA-256 十六进制哈希，登录时自动升级
+- PasswordHasher 在独立的有界进程池中计算哈希，排队数量超过上限时直接拒绝，
+  登录高峰不会占满 API 的请求线程
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+ALGORITHM = "scrypt"
+
+# 当前 scrypt 参数，N=2^14、r=8 约占用 16MB 内存
+SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", 2 ** 14))
+SCRYPT_R = int(os.environ.get("PASSWORD_SCRYPT_R", 8))
+SCRYPT_P = int(os.environ.get("PASSWORD_SCRYPT_P", 1))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * n * r + 1024 * 1024, dklen=KEY_BYTES
+    )
+
+
+def hash_password(password: str) -> str:
+    """按当前参数生成带盐哈希"""
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"{ALGORITHM}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(key)}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """校验密码，支持 scrypt 哈希和旧版无盐 SHA-256 哈希"""
+    if not stored.startswith(ALGORITHM + "$"):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+
+    try:
+        _, n, r, p, salt, key = stored.split("$")
+        expected = _b64decode(key)
+        actual = _scrypt(password, _b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored: str) -> bool:
+    """哈希的算法或参数与当前配置不同时需要重新哈希"""
+    parts = stored.split("$")
+    if len(parts) != 6 or parts[0] != ALGORITHM:
+        return True
+    return parts[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+# 用户不存在时也执行一次校验，避免通过响应时间枚举用户名
+DUMMY_HASH = f"{ALGORITHM}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64encode(b'0' * SALT_BYTES)}${_b64encode(b'0' * KEY_BYTES)}"
+
+
+class PasswordHasherBusy(Exception):
+    """哈希队列已满"""
+    pass
+
+
+class PasswordHasher:
+    """在有界进程池中执行密码哈希，带准入控制"""
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 64, executor: str = "process"):
+        """
+        初始化密码哈希器
+
+        Args:
+            max_workers: 哈希进程数
+            max_pending: 正在执行和排队的任务上限，超过后拒绝新任务
+            executor: "process" 使用进程池，"thread" 使用线程池（scrypt 计算时释放 GIL）
+        """
+        if executor not in ("process", "thread"):
+            raise ValueError(f"未知的执行器: {executor}")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor_type = executor
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+
+    def start(self):
+        """创建进程池并预先启动全部工作进程"""
+        if self._executor is not None:
+            return
+        if self.executor_type == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="password"
+            )
+        for future in [self._executor.submit(needs_rehash, DUMMY_HASH)
+                       for _ in range(self.max_workers)]:
+            future.result()
+
+    async def _submit(self, func, *args) -> Any:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy("密码哈希队列已满")
+            self.pending += 1
+        try:
+            if self._executor is None:
+                self.start()
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, func, *args)
+            self.completed += 1
+            return result
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """生成带盐哈希"""
+        return await self._submit(hash_password, password)
+
+    async def verify(self, password: str, stored: Optional[str]) -> bool:
+        """校验密码，stored 为 None（用户不存在）时仍执行一次等价计算"""
+        if stored is None:
+            await self._submit(verify_password, password, DUMMY_HASH)
+            return False
+        return await self._submit(verify_password, password, stored)
+
+    def stats(self) -> Dict[str, Any]:
+        """队列统计"""
+        return {
+            "executor": self.executor_type,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def close(self):
+        """关闭进程池"""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,295 @@
+"""
+SQL 性能分析
+- Database.profiler 设置后，connection() 返回 ProfiledConnection，记录每条 SQL 的
+  归一化语句、参数个数、返回/影响行数、耗时（含取结果）和调用它的 Database 方法
+- 超过阈值的语句连同 EXPLAIN QUERY PLAN 写入按大小轮转的慢查询日志（每行一个 JSON）
+- top() 按总耗时等指标列出最耗时的语句
+"""
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+# 这些方法只是取连接的辅助函数，调用方向上继续查找
+_SKIP_CALLERS = {"connection", "__enter__", "__exit__", "execute", "executemany"}
+
+
+def normalize_sql(sql: str) -> str:
+    """合并空白并把字面量替换为 ?，同一语句不同参数归为一类"""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def _find_caller() -> str:
+    """调用栈中最近的 backend.database 方法名"""
+    frame = sys._getframe(3)
+    depth = 0
+    while frame is not None and depth < 12:
+        if (frame.f_globals.get("__name__") == "backend.database"
+                and frame.f_code.co_name not in _SKIP_CALLERS):
+            return frame.f_code.co_name
+        frame = frame.f_back
+        depth += 1
+    return "<unknown>"
+
+
+def _param_count(params: Sequence[Any]) -> int:
+    if not params:
+        return 0
+    return len(params[0]) if isinstance(params[0], (list, tuple, dict)) else len(params)
+
+
+class QueryStats:
+    """同一归一化语句的累计统计"""
+
+    __slots__ = ("sql", "count", "total_ms", "max_ms", "rows", "params", "callers")
+
+    def __init__(self, sql: str, params: int):
+        self.sql = sql
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.params = params
+        self.callers: Dict[str, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sql": self.sql,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "params": self.params,
+            "callers": dict(sorted(self.callers.items(), key=lambda kv: -kv[1])),
+        }
+
+
+class QueryProfiler:
+    """汇总 SQL 统计并记录慢查询"""
+
+    SORT_KEYS = ("total_ms", "avg_ms", "max_ms", "count", "rows")
+
+    def __init__(self, slow_threshold_ms: float = 50.0,
+                 log_path: Optional[str] = "data/slow_queries.log",
+                 max_bytes: int = 1024 * 1024, backup_count: int = 3,
+                 max_statements: int = 1000):
+        """
+        初始化分析器
+
+        Args:
+            slow_threshold_ms: 慢查询阈值（毫秒）
+            log_path: 慢查询日志路径，None 表示不写文件
+            max_bytes: 单个日志文件最大字节数，超过后轮转
+            backup_count: 保留的历史日志文件数
+            max_statements: 最多统计的不同语句数，超过后新语句不再单独统计
+        """
+        self.slow_threshold_ms = slow_threshold_ms
+        self.max_statements = max_statements
+        self.slow_count = 0
+        self._stats: Dict[str, QueryStats] = {}
+        self._lock = threading.Lock()
+
+        self.logger: Optional[logging.Logger] = None
+        if log_path:
+            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+            self.logger = logging.getLogger(f"heartbeat.slow_queries.{id(self)}")
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+            self._handler = RotatingFileHandler(
+                log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            self.logger.addHandler(self._handler)
+
+    def record(self, sql: str, params: Sequence[Any], elapsed_ms: float, rows: int,
+               caller: str, conn=None):
+        """记录一条已完成的语句，超过阈值时写慢查询日志"""
+        normalized = normalize_sql(sql)
+        with self._lock:
+            stats = self._stats.get(normalized)
+            if stats is None:
+                if len(self._stats) >= self.max_statements:
+                    normalized = "<other>"
+                    stats = self._stats.setdefault(normalized, QueryStats(normalized, 0))
+                else:
+                    stats = self._stats[normalized] = QueryStats(normalized, _param_count(params))
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.rows += rows
+            if elapsed_ms > stats.max_ms:
+                stats.max_ms = elapsed_ms
+            stats.callers[caller] = stats.callers.get(caller, 0) + 1
+            slow = elapsed_ms >= self.slow_threshold_ms
+            if slow:
+                self.slow_count += 1
+
+        # 慢查询日志需要执行 EXPLAIN，在锁外写入
+        if slow and self.logger:
+            self.logger.info(json.dumps({
+                "time": datetime.now().isoformat(),
+                "ms": round(elapsed_ms, 3),
+                "caller": caller,
+                "sql": normalized,
+                "params": _param_count(params),
+                "rows": rows,
+                "plan": self.explain(conn, sql, params),
+            }, ensure_ascii=False))
+
+    @staticmethod
+    def explain(conn, sql: str, params: Sequence[Any]) -> List[str]:
+        """EXPLAIN QUERY PLAN 的 detail 列，无法解释的语句返回空列表"""
+        if conn is None or not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")):
+            return []
+        if params and isinstance(params[0], (list, tuple, dict)):
+            params = params[0]  # executemany 取第一组参数
+        try:
+            return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())]
+        except Exception:
+            return []
+
+    def top(self, n: int = 10, sort: str = "total_ms") -> List[Dict[str, Any]]:
+        """按指定指标排序的前 n 条语句"""
+        if sort not in self.SORT_KEYS:
+            raise ValueError(f"未知的排序字段: {sort}")
+        with self._lock:
+            rows = [stats.to_dict() for stats in self._stats.values()]
+        rows.sort(key=lambda r: r[sort], reverse=True)
+        return rows[:n]
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._stats.clear()
+            self.slow_count = 0
+
+    def close(self):
+        """关闭日志文件"""
+        if self.logger:
+            self.logger.removeHandler(self._handler)
+            self._handler.close()
+            self.logger = None
+
+
+class ProfiledCursor:
+    """记录执行和取结果耗时的游标包装，语句在下一次执行或连接归还时结算"""
+
+    __slots__ = ("_cursor", "_owner", "_sql", "_params", "_caller", "_elapsed", "_rows")
+
+    def __init__(self, cursor, owner: "ProfiledConnection"):
+        self._cursor = cursor
+        self._owner = owner
+        self._sql: Optional[str] = None
+
+    def _begin(self, sql: str, params: Sequence[Any]):
+        self.finish()
+        self._sql = sql
+        self._params = params
+        self._caller = _find_caller()
+        self._rows = 0
+        self._owner._pending.append(self)
+
+    def execute(self, sql: str, *args):
+        self._begin(sql, args[0] if args else ())
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(sql, *args)
+        finally:
+            self._elapsed = time.perf_counter() - start
+        return self
+
+    def executemany(self, sql: str, *args):
+        params = list(args[0]) if args else []
+        self._begin(sql, params)
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, params)
+        finally:
+            self._elapsed = time.perf_counter() - start
+        return self
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        result = fetch(*args)
+        self._elapsed += time.perf_counter() - start
+        return result
+
+    def fetchone(self):
+        row = self._timed_fetch(self._cursor.fetchone)
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._timed_fetch(self._cursor.fetchmany, *args)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def finish(self):
+        """结算当前语句"""
+        if self._sql is None:
+            return
+        sql, self._sql = self._sql, None
+        rows = self._rows
+        if rows == 0 and self._cursor.rowcount > 0:
+            rows = self._cursor.rowcount  # INSERT/UPDATE/DELETE 影响的行数
+        self._owner.profiler.record(
+            sql, self._params, self._elapsed * 1000, rows, self._caller, self._owner._conn
+        )
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+class ProfiledConnection:
+    """记录每条 SQL 的连接包装，其余属性透传给原连接"""
+
+    __slots__ = ("_conn", "profiler", "_pending")
+
+    def __init__(self, conn, profiler: QueryProfiler):
+        self._conn = conn
+        self.profiler = profiler
+        self._pending: List[ProfiledCursor] = []
+
+    def cursor(self, *args, **kwargs) -> ProfiledCursor:
+        return ProfiledCursor(self._conn.cursor(*args, **kwargs), self)
+
+    def execute(self, sql: str, *args) -> ProfiledCursor:
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql: str, *args) -> ProfiledCursor:
+        return self.cursor().executemany(sql, *args)
+
+    def finish(self):
+        """连接归还前结算所有未结算的语句"""
+        pending, self._pending = self._pending, []
+        for cursor in pending:
+            cursor.finish()
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name: str, value):
+        if name in ProfiledConnection.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
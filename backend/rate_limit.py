@@ -0,0 +1,240 @@
+"""
+请求限流
+- 令牌桶: 每个键一个桶，按 rate（个/秒）补充令牌，最多 burst 个，每次请求消耗一个
+- MemoryRateLimitBackend: 进程内固定大小的桶表，超出容量时淘汰最久未使用的键
+- SQLiteRateLimitBackend: 多个 worker 进程共享的桶表（独立的小 SQLite 文件，不访问业务数据库）
+- RateLimiter.limit(): 生成 FastAPI 依赖，路由通过 dependencies=[...] 声明限流，
+  超限请求在进入路由函数之前直接返回 429；会阻塞的后端（SQLite）在线程池中调用
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from backend.db_pool import ConnectionPool
+
+
+class RateLimitBackend(ABC):
+    """令牌桶存储接口（抽象基类，未实现全部抽象方法的后端在实例化时报错）"""
+
+    # hit() 是否可能阻塞（文件 IO、等待锁），为真时限流依赖在线程池中调用
+    blocking = True
+
+    @abstractmethod
+    def hit(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        """消耗一个令牌，返回 (是否允许, 需要等待的秒数)"""
+
+    @abstractmethod
+    def size(self) -> int:
+        """当前桶数量"""
+
+
+def _take(tokens: float, last: float, now: float, rate: float, burst: int) -> Tuple[float, bool, float]:
+    """补充令牌后尝试消耗一个，返回 (剩余令牌, 是否允许, 需要等待的秒数)"""
+    tokens = min(float(burst), tokens + (now - last) * rate)
+    if tokens >= 1:
+        return tokens - 1, True, 0.0
+    return tokens, False, (1 - tokens) / rate
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """进程内令牌桶表，固定容量，LRU 淘汰"""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self.evicted = 0
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+            bucket[0], allowed, retry_after = _take(bucket[0], bucket[1], now, rate, burst)
+            bucket[1] = now
+        return allowed, retry_after
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """多进程共享的令牌桶表
+
+    每次请求在一个 BEGIN IMMEDIATE 事务内读取并更新桶；
+    长时间未使用的桶（已经补满）定期删除，表大小不超过 max_keys 量级
+    """
+
+    PRAGMAS = [
+        ("journal_mode", "WAL"),
+        ("synchronous", "NORMAL"),
+        ("busy_timeout", 5000),
+    ]
+
+    def __init__(self, db_path: str = "data/rate_limits.db", pool_size: int = 4,
+                 max_keys: int = 100000, idle_seconds: float = 3600.0):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_keys = max_keys
+        self.idle_seconds = idle_seconds
+        self.pool = ConnectionPool(db_path, size=pool_size, pragmas=self.PRAGMAS)
+        self._hits = 0
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limits_updated ON rate_limits (updated)")
+            conn.commit()
+
+    def hit(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, last = (row["tokens"], row["updated"]) if row else (float(burst), now)
+            tokens, allowed, retry_after = _take(tokens, last, now, rate, burst)
+            conn.execute("""
+                INSERT INTO rate_limits (key, tokens, updated) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated
+            """, (key, tokens, now))
+            conn.commit()
+
+        self._hits += 1
+        if self._hits % 1000 == 0:
+            self.prune(now)
+        return allowed, retry_after
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """删除长时间未使用的桶，超出 max_keys 时删除最久未使用的桶"""
+        now = now or time.time()
+        with self.pool.connection() as conn:
+            deleted = conn.execute(
+                "DELETE FROM rate_limits WHERE updated < ?", (now - self.idle_seconds,)
+            ).rowcount
+            deleted += conn.execute("""
+                DELETE FROM rate_limits WHERE key IN (
+                    SELECT key FROM rate_limits ORDER BY updated DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_keys,)).rowcount
+            conn.commit()
+        return deleted
+
+    def size(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+    def close(self):
+        """关闭连接池"""
+        self.pool.close_all()
+
+
+def create_rate_limit_backend(backend: str = "memory", **kwargs) -> RateLimitBackend:
+    """按名称创建限流存储: memory / sqlite"""
+    if backend == "memory":
+        return MemoryRateLimitBackend(**kwargs)
+    if backend == "sqlite":
+        return SQLiteRateLimitBackend(**kwargs)
+    raise ValueError(f"未知的限流后端: {backend}")
+
+
+# ==================== 限流键 ====================
+
+KeyFunc = Callable[[Request], Awaitable[Optional[str]]]
+
+
+def client_ip(trust_proxy: bool = False) -> KeyFunc:
+    """按客户端 IP 限流，trust_proxy 为真时使用 X-Forwarded-For 的第一个地址"""
+    async def key(request: Request) -> Optional[str]:
+        if trust_proxy:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else None
+    return key
+
+
+def json_field(name: str) -> KeyFunc:
+    """按 JSON 请求体中的字段限流（如登录用户名），字段缺失时不限流"""
+    async def key(request: Request) -> Optional[str]:
+        try:
+            body = await request.json()
+        except ValueError:
+            return None
+        value = body.get(name) if isinstance(body, dict) else None
+        return str(value).lower() if value else None
+    return key
+
+
+class RateLimiter:
+    """按路由声明的令牌桶限流"""
+
+    def __init__(self, backend: RateLimitBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.allowed = 0
+        self.rejected: Dict[str, int] = {}
+
+    def limit(self, name: str, per_minute: float, burst: int, key: KeyFunc):
+        """
+        生成限流依赖
+
+        Args:
+            name: 限流规则名称，作为键前缀和统计名
+            per_minute: 每分钟补充的令牌数
+            burst: 桶容量（允许的突发请求数）
+            key: 从请求中取限流键的函数，返回 None 时不限流
+        """
+        rate = per_minute / 60.0
+        self.rejected.setdefault(name, 0)
+
+        async def dependency(request: Request):
+            if not self.enabled:
+                return
+            value = await key(request)
+            if value is None:
+                return
+            if self.backend.blocking:
+                allowed, retry_after = await run_in_threadpool(
+                    self.backend.hit, f"{name}:{value}", rate, burst
+                )
+            else:
+                allowed, retry_after = self.backend.hit(f"{name}:{value}", rate, burst)
+            if not allowed:
+                self.rejected[name] += 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="请求过于频繁，请稍后再试",
+                    headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+                )
+            self.allowed += 1
+
+        return dependency
+
+    def stats(self) -> Dict[str, Any]:
+        """限流统计"""
+        return {
+            "enabled": self.enabled,
+            "buckets": self.backend.size(),
+            "allowed": self.allowed,
+            "rejected": dict(self.rejected),
+        }
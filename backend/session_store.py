@@ -0,0 +1,426 @@
+"""
+会话存储后端
+- MemorySessionStore: 进程内字典，单进程部署使用
+- SQLiteSessionStore: WAL 模式的 SQLite 表，多个 uvicorn worker 进程共享，重启不丢失会话
+- 两种存储都保存无状态令牌的吊销记录（见 backend.session_tokens），
+  SQLite 存储中的吊销对所有 worker 可见且重启不丢失，内存存储中的只在当前进程有效
+- SessionExpirer: 后台线程定期清理过期会话
+- RefreshCoalescer: 合并滑动过期的续期写入
+"""
+import heapq
+import threading
+from abc import ABC, abstractmethod
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backend.db_pool import ConnectionPool
+
+
+class SessionStore(ABC):
+    """会话存储接口（抽象基类，未实现全部抽象方法的后端在实例化时报错）
+
+    会话数据为字典: user_id, username, is_admin, created_at, expires_at（datetime）
+    """
+
+    @abstractmethod
+    def create(self, token: str, session: Dict[str, Any]):
+        """保存新会话"""
+
+    @abstractmethod
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """按 token 读取会话，不检查过期"""
+
+    @abstractmethod
+    def delete(self, token: str) -> bool:
+        """删除会话，返回是否存在"""
+
+    @abstractmethod
+    def touch(self, token: str, expires_at: datetime) -> bool:
+        """更新过期时间，返回是否存在"""
+
+    def touch_many(self, items: Iterable[Tuple[str, datetime]]) -> int:
+        """批量更新过期时间，返回更新数量"""
+        return sum(1 for token, expires_at in items if self.touch(token, expires_at))
+
+    @abstractmethod
+    def cleanup_expired(self, now: datetime) -> int:
+        """批量删除已过期会话，返回删除数量"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """当前会话数量"""
+
+    @abstractmethod
+    def revoke(self, jti: str, expires_at: float):
+        """吊销无状态令牌，记录保留到令牌过期（epoch 秒）"""
+
+    @abstractmethod
+    def is_revoked(self, jti: str) -> bool:
+        """无状态令牌是否已吊销"""
+
+
+class MemorySessionStore(SessionStore):
+    """进程内字典存储
+
+    按过期时间维护一个最小堆，清理时只弹出堆顶已到期的条目，不扫描整个字典。
+    touch 不修改堆，条目弹出时若会话已被续期则按新的过期时间重新入堆，
+    因此每个会话在堆中最多一个条目，堆大小与会话数量成正比
+    """
+
+    def __init__(self, data: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.data = data if data is not None else {}
+        self._heap: List[Tuple[float, str]] = [
+            (s["expires_at"].timestamp(), token) for token, s in self.data.items()
+        ]
+        heapq.heapify(self._heap)
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def create(self, token: str, session: Dict[str, Any]):
+        with self._lock:
+            self.data[token] = session
+            heapq.heappush(self._heap, (session["expires_at"].timestamp(), token))
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        return self.data.get(token)
+
+    def delete(self, token: str) -> bool:
+        with self._lock:
+            return self.data.pop(token, None) is not None
+
+    def touch(self, token: str, expires_at: datetime) -> bool:
+        with self._lock:
+            session = self.data.get(token)
+            if session is None:
+                return False
+            session["expires_at"] = expires_at
+            return True
+
+    def cleanup_expired(self, now: datetime) -> int:
+        cutoff = now.timestamp()
+        evicted = 0
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] < cutoff:
+                _, token = heapq.heappop(heap)
+                session = self.data.get(token)
+                if session is None:
+                    # 已登出的会话
+                    continue
+                expires_at = session["expires_at"].timestamp()
+                if expires_at < cutoff:
+                    self.data.pop(token, None)
+                    evicted += 1
+                else:
+                    # 会话已续期，按新的过期时间重新排队
+                    heapq.heappush(heap, (expires_at, token))
+
+            # 大量登出后堆中残留的条目过多时重建
+            if len(heap) > 2 * len(self.data) + 1024:
+                self._heap = [(s["expires_at"].timestamp(), t) for t, s in list(self.data.items())]
+                heapq.heapify(self._heap)
+
+            for jti in [j for j, expires_at in self._revoked.items() if expires_at < cutoff]:
+                del self._revoked[jti]
+        return evicted
+
+    def count(self) -> int:
+        return len(self.data)
+
+    def revoke(self, jti: str, expires_at: float):
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti: str) -> bool:
+        return jti in self._revoked
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite 共享会话存储
+
+    表使用 token 作为主键的 WITHOUT ROWID 表，一次 B 树查找即可取出整行；
+    时间以 epoch 秒存储，expires_at 上的索引用于批量过期删除
+    """
+
+    PRAGMAS = [
+        ("journal_mode", "WAL"),
+        ("synchronous", "NORMAL"),
+        ("busy_timeout", 5000),
+        ("temp_store", "MEMORY"),
+    ]
+
+    def __init__(self, db_path: str = "data/sessions.db", pool_size: int = 4):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, size=pool_size, pragmas=self.PRAGMAS)
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    token TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    username TEXT NOT NULL,
+                    is_admin INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS revoked_tokens (
+                    jti TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires ON revoked_tokens (expires_at)"
+            )
+            conn.commit()
+
+    @staticmethod
+    def _to_session(row) -> Dict[str, Any]:
+        return {
+            "user_id": row["user_id"],
+            "username": row["username"],
+            "is_admin": bool(row["is_admin"]),
+            "created_at": datetime.fromtimestamp(row["created_at"]),
+            "expires_at": datetime.fromtimestamp(row["expires_at"]),
+        }
+
+    def create(self, token: str, session: Dict[str, Any]):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO sessions
+                    (token, user_id, username, is_admin, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (token, session["user_id"], session["username"], int(session["is_admin"]),
+                  session["created_at"].timestamp(), session["expires_at"].timestamp()))
+            conn.commit()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            row = conn.execute("""
+                SELECT user_id, username, is_admin, created_at, expires_at
+                FROM sessions WHERE token = ?
+            """, (token,)).fetchone()
+        return self._to_session(row) if row else None
+
+    def delete(self, token: str) -> bool:
+        with self.pool.connection() as conn:
+            deleted = conn.execute("DELETE FROM sessions WHERE token = ?", (token,)).rowcount
+            conn.commit()
+        return deleted > 0
+
+    def touch(self, token: str, expires_at: datetime) -> bool:
+        with self.pool.connection() as conn:
+            updated = conn.execute(
+                "UPDATE sessions SET expires_at = ? WHERE token = ?",
+                (expires_at.timestamp(), token)
+            ).rowcount
+            conn.commit()
+        return updated > 0
+
+    def touch_many(self, items: Iterable[Tuple[str, datetime]]) -> int:
+        with self.pool.connection() as conn:
+            cursor = conn.executemany(
+                "UPDATE sessions SET expires_at = ? WHERE token = ?",
+                [(expires_at.timestamp(), token) for token, expires_at in items]
+            )
+            conn.commit()
+        return cursor.rowcount
+
+    def cleanup_expired(self, now: datetime) -> int:
+        with self.pool.connection() as conn:
+            deleted = conn.execute(
+                "DELETE FROM sessions WHERE expires_at < ?", (now.timestamp(),)
+            ).rowcount
+            conn.execute("DELETE FROM revoked_tokens WHERE expires_at < ?", (now.timestamp(),))
+            conn.commit()
+        return deleted
+
+    def count(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def revoke(self, jti: str, expires_at: float):
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)",
+                (jti, expires_at)
+            )
+            conn.commit()
+
+    def is_revoked(self, jti: str) -> bool:
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT 1 FROM revoked_tokens WHERE jti = ?", (jti,)).fetchone()
+        return row is not None
+
+    def close(self):
+        """关闭连接池"""
+        self.pool.close_all()
+
+
+class RefreshCoalescer:
+    """
+    合并滑动过期续期
+
+    只有剩余有效期不足 TTL 的 threshold 比例时才续期，其余请求不产生写入；
+    需要续期的会话先放入待写表，refresh() 只入队不写存储，由后台线程（start()）
+    在累计 max_batch 个或每隔 max_delay 秒时用一次 touch_many 批量写入；
+    未启动后台线程时由 SessionExpirer 在清理前写入
+    """
+
+    def __init__(self, store: SessionStore, ttl: timedelta, threshold: float = 0.5,
+                 max_batch: int = 128, max_delay: float = 1.0):
+        self.store = store
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.avoided = 0
+        self.refreshed = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+        self._pending: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self, token: str, session: Dict[str, Any]) -> bool:
+        """按需续期会话（只入队），返回是否安排了写入"""
+        now = datetime.now()
+        if session["expires_at"] - now > self.ttl * self.threshold:
+            self.avoided += 1
+            return False
+
+        with self._lock:
+            if token in self._pending:
+                self.avoided += 1
+            self._pending[token] = now + self.ttl
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wake.set()
+        return True
+
+    def flush(self) -> int:
+        """写入所有待续期的会话，返回写入数量"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        self.store.touch_many(pending.items())
+        self.refreshed += len(pending)
+        self.batches += 1
+        return len(pending)
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self._wake.wait(self.max_delay)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"会话续期写入失败: {e}")
+
+        self._thread = threading.Thread(target=run, name="session-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程并写入剩余的续期"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """续期统计"""
+        return {
+            "threshold": self.threshold,
+            "avoided_writes": self.avoided,
+            "refreshed": self.refreshed,
+            "batches": self.batches,
+            "pending": len(self._pending),
+            "last_error": self.last_error,
+        }
+
+
+class SessionExpirer:
+    """后台会话清理线程，每隔 interval 秒清理一次过期会话（清理前先写入待续期的会话）"""
+
+    def __init__(self, store: SessionStore, interval: float = 60.0,
+                 refresher: Optional[RefreshCoalescer] = None):
+        self.store = store
+        self.interval = interval
+        self.refresher = refresher
+        self.evicted = 0
+        self.runs = 0
+        self.last_run_ms = 0.0
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        """执行一次清理，返回清理数量"""
+        start = time.perf_counter()
+        if self.refresher:
+            self.refresher.flush()
+        evicted = self.store.cleanup_expired(datetime.now())
+        self.last_run_ms = (time.perf_counter() - start) * 1000
+        self.evicted += evicted
+        self.runs += 1
+        return evicted
+
+    def start(self):
+        """启动后台线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"会话清理失败: {e}")
+
+        self._thread = threading.Thread(target=run, name="session-expirer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        """存活和已清理的会话数量"""
+        return {
+            "live": self.store.count(),
+            "evicted": self.evicted,
+            "runs": self.runs,
+            "interval": self.interval,
+            "last_run_ms": round(self.last_run_ms, 3),
+            "last_error": self.last_error,
+        }
+
+
+def create_session_store(backend: str = "memory", **kwargs) -> SessionStore:
+    """按名称创建会话存储: memory / sqlite"""
+    if backend == "memory":
+        return MemorySessionStore(**kwargs)
+    if backend == "sqlite":
+        return SQLiteSessionStore(**kwargs)
+    raise ValueError(f"未知的会话存储后端: {backend}")
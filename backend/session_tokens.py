@@ -0,0 +1,121 @@
+"""
+无状态签名会话令牌
+令牌自身携带 user_id、username、is_admin、couple_id 和过期时间，用 HMAC-SHA256 签名，
+任何持有密钥的进程都能独立校验，不需要共享会话存储。
+
+登出把令牌ID写入吊销表: 传入共享的 SessionStore（如 SQLiteSessionStore）时吊销对所有进程可见、
+重启不丢失；默认的 RevocationList 只在当前进程内有效，其他 worker 和重启后的进程
+仍会接受已登出的令牌，直到它自然过期
+
+令牌格式: base64url(载荷JSON) + "." + base64url(签名)
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class RevocationList:
+    """进程内的已吊销令牌表，条目在令牌自然过期后移除（不在进程间共享）"""
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def revoke(self, jti: str, expires_at: float):
+        """吊销令牌"""
+        with self._lock:
+            self._revoked[jti] = expires_at
+            if len(self._revoked) > self.max_size:
+                self._prune(time.time())
+
+    def is_revoked(self, jti: str) -> bool:
+        """检查令牌是否已吊销"""
+        return jti in self._revoked
+
+    def _prune(self, now: float):
+        """移除已经过期的吊销记录"""
+        for jti in [j for j, exp in self._revoked.items() if exp < now]:
+            del self._revoked[jti]
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+class TokenSigner:
+    """签发和校验无状态会话令牌"""
+
+    def __init__(self, secret: str, revocations=None):
+        """
+        Args:
+            secret: 签名密钥，所有进程必须相同
+            revocations: 吊销表，需提供 revoke(jti, expires_at) 和 is_revoked(jti)，
+                可以是 SessionStore；默认使用进程内的 RevocationList
+        """
+        if not secret:
+            raise ValueError("无状态会话需要签名密钥")
+        self._key = secret.encode()
+        self.revocations = revocations or RevocationList()
+
+    def _sign(self, payload: bytes) -> str:
+        return _b64encode(hmac.new(self._key, payload, hashlib.sha256).digest())
+
+    def issue(self, user_id: int, username: str, is_admin: bool,
+              couple_id: Optional[str], ttl_seconds: float) -> str:
+        """签发令牌"""
+        # 紧凑的数组载荷: [user_id, username, is_admin, couple_id, 过期时间, 令牌ID]
+        payload = json.dumps(
+            [user_id, username, int(is_admin), couple_id,
+             int(time.time() + ttl_seconds), secrets.token_hex(8)],
+            separators=(",", ":"), ensure_ascii=False
+        ).encode()
+        encoded = _b64encode(payload)
+        return f"{encoded}.{self._sign(encoded.encode())}"
+
+    def _decode(self, token: str) -> Optional[list]:
+        """校验签名并解析载荷，不检查过期和吊销"""
+        try:
+            encoded, signature = token.split(".", 1)
+            # compare_digest 对非 ASCII 的 str 会抛 TypeError，统一按字节比较
+            if not hmac.compare_digest(signature.encode(), self._sign(encoded.encode()).encode()):
+                return None
+            return json.loads(_b64decode(encoded))
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """校验令牌，返回会话信息；签名错误、已过期或已吊销时返回 None"""
+        data = self._decode(token)
+        if data is None:
+            return None
+        user_id, username, is_admin, couple_id, expires_at, jti = data
+        if expires_at < time.time() or self.revocations.is_revoked(jti):
+            return None
+        return {
+            "user_id": user_id,
+            "username": username,
+            "is_admin": bool(is_admin),
+            "couple_id": couple_id,
+            "expires_at": expires_at,
+        }
+
+    def revoke(self, token: str) -> bool:
+        """吊销令牌（登出）"""
+        data = self._decode(token)
+        if data is None:
+            return False
+        self.revocations.revoke(data[5], data[4])
+        return True
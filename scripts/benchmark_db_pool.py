@@ -0,0 +1,97 @@
+"""
+连接池基准测试
+对比不使用连接池（每次查询新建连接）与使用连接池时
+/points 和 /exchanges 接口的每秒请求数
+
+用法: python scripts/benchmark_db_pool.py [--requests 2000] [--threads 8] [--pool-size 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+import backend.api.main as api
+from backend.async_database import AsyncDatabase
+from backend.database import Database
+
+# 基准测试反复注册和登录同一账号，关闭登录限流
+api.rate_limiter.enabled = False
+
+
+def setup_account(client: TestClient, stock: int) -> tuple:
+    """注册测试账号，返回 (请求头, 奖励ID)"""
+    client.post("/auth/register", json={
+        "username": "bench_user", "password": "bench123", "name1": "甲", "name2": "乙"
+    })
+    token = client.post("/auth/login", json={
+        "username": "bench_user", "password": "bench123"
+    }).json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    reward_id = client.post("/rewards", headers=headers, json={
+        "name": "基准奖励", "points_needed": 1, "stock": stock
+    }).json()["reward_id"]
+    client.post("/points", headers=headers, json={"points_change": stock, "reason": "基准"})
+    return headers, reward_id
+
+
+def run_route(client: TestClient, total: int, threads: int, call) -> float:
+    """并发执行请求，返回每秒请求数"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda _: call(client), range(total)))
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for r in results if r.status_code >= 400)
+    if failed:
+        print(f"   警告: {failed} 个请求失败")
+    return total / elapsed
+
+
+def bench(pool_size: int, total: int, threads: int) -> dict:
+    """在临时数据库上对指定连接池大小进行测试"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db = AsyncDatabase(Database(os.path.join(temp_dir, "bench.db"), pool_size=pool_size),
+                           max_workers=threads)
+        original_db, api.db = api.db, db
+        try:
+            client = TestClient(api.app)
+            headers, reward_id = setup_account(client, total)
+            points_rps = run_route(client, total, threads, lambda c: c.post(
+                "/points", headers=headers, json={"points_change": 1, "reason": "基准"}))
+            exchanges_rps = run_route(client, total, threads, lambda c: c.post(
+                "/exchanges", headers=headers, json={"reward_id": reward_id}))
+        finally:
+            api.db = original_db
+            db.close()
+    return {"points": points_rps, "exchanges": exchanges_rps}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="连接池基准测试")
+    parser.add_argument("--requests", type=int, default=2000, help="每个接口的请求数")
+    parser.add_argument("--threads", type=int, default=8, help="并发线程数")
+    parser.add_argument("--pool-size", type=int, default=8, help="连接池大小")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"连接池基准测试: {args.requests} 请求 / {args.threads} 线程")
+    print("=" * 60)
+
+    before = bench(0, args.requests, args.threads)
+    after = bench(args.pool_size, args.requests, args.threads)
+
+    print(f"{'接口':<16}{'无连接池 req/s':>16}{'连接池 req/s':>16}{'提升':>10}")
+    for route in ("points", "exchanges"):
+        speedup = after[route] / before[route]
+        print(f"POST /{route:<10}{before[route]:>16.1f}{after[route]:>16.1f}{speedup:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
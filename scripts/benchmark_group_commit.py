@@ -0,0 +1,95 @@
+"""
+积分组提交基准测试
+对比逐条提交（Database.update_couple_points）与不同批量/等待参数下的组提交，
+输出写入吞吐量与单次写入延迟的对应关系
+
+用法: python scripts/benchmark_group_commit.py [--threads 32] [--events 4000] [--synchronous FULL]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.database import Database, DEFAULT_PRAGMAS
+from backend.group_commit import GroupCommitWriter
+
+
+def make_db(temp_dir: str, couples: int, synchronous: str) -> tuple:
+    """创建测试数据库和若干情侣"""
+    pragmas = dict(DEFAULT_PRAGMAS, synchronous=synchronous)
+    db = Database(os.path.join(temp_dir, "group.db"), pool_size=8, pragmas=pragmas)
+    couple_ids = []
+    password_hash = db.hash_password("bench123")
+    for i in range(couples):
+        user_id = db.create_user_with_hash(f"bench_{i}", password_hash)
+        couple_ids.append(db.create_couple(user_id, "甲", "乙"))
+    return db, couple_ids
+
+
+def measure(write: Callable[[str], None], couple_ids: List[str], threads: int, events: int) -> dict:
+    """多线程执行写入，统计吞吐量和延迟"""
+    latencies: List[float] = []
+
+    def work(i: int):
+        start = time.perf_counter()
+        write(couple_ids[i % len(couple_ids)])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(work, range(events)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    return {"eps": events / elapsed, "p50": pick(0.5), "p99": pick(0.99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="积分组提交基准测试")
+    parser.add_argument("--threads", type=int, default=32, help="并发请求线程数")
+    parser.add_argument("--events", type=int, default=4000, help="每组配置写入的事件数")
+    parser.add_argument("--couples", type=int, default=100, help="情侣数量")
+    parser.add_argument("--synchronous", default="NORMAL", help="PRAGMA synchronous（FULL 可模拟每次提交 fsync）")
+    args = parser.parse_args()
+
+    configs = [("逐条提交", None, None)]
+    for batch in (16, 64, 256):
+        for linger in (0.5, 2.0, 5.0):
+            configs.append((f"组提交 b={batch} l={linger}ms", batch, linger))
+
+    print("=" * 72)
+    print(f"组提交基准: {args.threads} 线程 / {args.events} 事件 / synchronous={args.synchronous}")
+    print("=" * 72)
+    print(f"{'配置':<28}{'事件/秒':>10}{'p50 ms':>10}{'p99 ms':>10}{'平均批量':>10}")
+
+    for label, batch, linger in configs:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db, couple_ids = make_db(temp_dir, args.couples, args.synchronous)
+            writer = None
+            if batch is None:
+                write = lambda cid: db.update_couple_points(cid, 1, "基准")
+            else:
+                writer = GroupCommitWriter(db, max_batch_size=batch, max_linger_ms=linger)
+                writer.start()
+                write = lambda cid: writer.submit(cid, 1, "基准").result()
+            try:
+                r = measure(write, couple_ids, args.threads, args.events)
+            finally:
+                avg_batch = 1.0
+                if writer:
+                    writer.stop()
+                    avg_batch = writer.stats()["avg_batch_size"]
+                db.close()
+        print(f"{label:<28}{r['eps']:>10.0f}{r['p50']:>10.2f}{r['p99']:>10.2f}{avg_batch:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
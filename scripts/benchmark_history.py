@@ -0,0 +1,83 @@
+"""
+积分历史存储基准测试
+对比字典列表（从 JSON 解析得到，和旧实现加载后的内存形态一致）与列式存储（HistoryColumns）:
+每百万条记录的内存占用、构造耗时、序列化耗时，以及按时间范围查询一天记录的耗时
+
+内存为 tracemalloc 统计的 Python 对象占用，耗时不开启 tracemalloc
+
+用法: python scripts/benchmark_history.py [--entries 1000000] [--reasons 50]
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.history_store import HistoryColumns
+
+
+def make_json(entries: int, reasons: int) -> str:
+    """每分钟一条记录的 JSON 文本"""
+    start = datetime(2024, 1, 1)
+    return json.dumps([
+        {"timestamp": (start + timedelta(minutes=i, microseconds=i % 1000)).isoformat(),
+         "points_change": (i % 21) - 10, "reason": f"完成任务{i % reasons}", "new_balance": i}
+        for i in range(entries)
+    ], ensure_ascii=False)
+
+
+def measure(build):
+    """返回 (结果, 内存MB, 耗时秒)，耗时在关闭 tracemalloc 后另行构造一次测量"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    build()
+    return result, current / 1024 / 1024, time.perf_counter() - start
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="积分历史存储基准测试")
+    parser.add_argument("--entries", type=int, default=1_000_000, help="记录条数")
+    parser.add_argument("--reasons", type=int, default=50, help="不同原因的个数")
+    args = parser.parse_args()
+
+    text = make_json(args.entries, args.reasons)
+    dicts, dict_mb, dict_s = measure(lambda: json.loads(text))
+    columns, column_mb, column_s = measure(lambda: HistoryColumns(dicts))
+    per_million = 1_000_000 / args.entries
+
+    since, until = "2024-01-15", "2024-01-16"
+    linear_ms = timed(lambda: [e for e in dicts if since <= e["timestamp"] < until])
+    range_ms = timed(lambda: columns.between(since, until))
+    dump_dicts_ms = timed(lambda: json.dumps(dicts, ensure_ascii=False))
+    dump_columns_ms = timed(lambda: json.dumps(columns.to_list(), ensure_ascii=False))
+
+    print("=" * 64)
+    print(f"积分历史存储基准（{args.entries} 条，{args.reasons} 种原因）")
+    print("=" * 64)
+    print(f"{'':<20}{'字典列表':>14}{'列式存储':>14}")
+    print(f"{'内存 MB/百万条':<20}{dict_mb * per_million:>14.1f}{column_mb * per_million:>14.1f}")
+    print(f"{'每条字节':<20}{dict_mb * 1024 * 1024 / args.entries:>14.1f}"
+          f"{column_mb * 1024 * 1024 / args.entries:>14.1f}")
+    print(f"{'构造 秒':<20}{dict_s:>14.2f}{column_s:>14.2f}")
+    print(f"{'一天范围查询 毫秒':<20}{linear_ms:>14.2f}{range_ms:>14.2f}")
+    print(f"{'序列化 毫秒':<20}{dump_dicts_ms:>14.1f}{dump_columns_ms:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
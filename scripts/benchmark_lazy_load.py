@@ -0,0 +1,96 @@
+"""
+DataManager 延迟加载基准测试
+按数据量对比完整加载（json.load + 构造全部 Couple）与 lazy 模式的启动耗时和启动后的内存占用:
+- lazy 首次启动: 流式扫描快照建立索引并写入 system_data.json.idx
+- lazy 再次启动: 直接读取索引
+以及 lazy 模式下第一次访问一对情侣的耗时
+
+内存为 tracemalloc 统计的 Python 对象占用（加载完成后仍在使用的部分和加载期间的峰值）
+
+用法: python scripts/benchmark_lazy_load.py [--sizes 1000x100,5000x100,5000x400]
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Tuple
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.data_manager import DataManager
+
+
+def build_snapshot(data_dir: str, couples: int, history: int):
+    """直接在内存中构造数据并保存一次快照"""
+    dm = DataManager(data_dir=data_dir)
+    for i in range(couples):
+        couple = dm.Couple(f"couple_{i}", "甲", "乙")
+        couple.history = [
+            {"timestamp": "2024-01-01T00:00:00", "points_change": 1,
+             "reason": "基准", "new_balance": j + 1}
+            for j in range(history)
+        ]
+        couple.points = history
+        dm.couples[couple.couple_id] = couple
+    dm.save_all_data()
+
+
+def measure(load: Callable[[], object]) -> Tuple[float, float, float, object]:
+    """返回 (耗时毫秒, 加载后内存MB, 峰值内存MB, 加载结果)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = (time.perf_counter() - start) * 1000
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, current / 1024 / 1024, peak / 1024 / 1024, result
+
+
+def loaded(data_dir: str, **kwargs) -> DataManager:
+    dm = DataManager(data_dir=data_dir, **kwargs)
+    dm.load_all_data()
+    return dm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DataManager 延迟加载基准测试")
+    parser.add_argument("--sizes", default="1000x100,5000x100,5000x400",
+                        help="数据规模列表，格式为 情侣数x每对历史条数")
+    args = parser.parse_args()
+
+    print("=" * 96)
+    print("DataManager 启动耗时（毫秒）与内存（MB，加载后/峰值）")
+    print("=" * 96)
+    print(f"{'规模':<12}{'文件MB':>8}{'完整加载':>10}{'内存':>14}{'lazy首次':>10}"
+          f"{'lazy再次':>10}{'内存':>14}{'首次访问':>10}")
+
+    for size in args.sizes.split(","):
+        couples, history = (int(n) for n in size.split("x"))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            build_snapshot(temp_dir, couples, history)
+            size_mb = os.path.getsize(os.path.join(temp_dir, "system_data.json")) / 1024 / 1024
+
+            eager_ms, eager_mb, eager_peak, eager = measure(lambda: loaded(temp_dir))
+            del eager
+            cold_ms, _, _, cold = measure(lambda: loaded(temp_dir, lazy=True))
+            cold.close()
+            del cold
+            warm_ms, warm_mb, warm_peak, warm = measure(lambda: loaded(temp_dir, lazy=True))
+
+            start = time.perf_counter()
+            warm.get_couple(f"couple_{couples // 2}")
+            access_ms = (time.perf_counter() - start) * 1000
+            warm.close()
+
+        print(f"{size:<12}{size_mb:>8.1f}{eager_ms:>10.1f}{f'{eager_mb:.1f}/{eager_peak:.1f}':>14}"
+              f"{cold_ms:>10.1f}{warm_ms:>10.1f}{f'{warm_mb:.1f}/{warm_peak:.1f}':>14}{access_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
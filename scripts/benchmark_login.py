@@ -0,0 +1,132 @@
+"""
+登录吞吐量基准测试
+以不同的密码哈希配置启动 uvicorn，大量并发客户端持续登录，
+同时测量 /health 的延迟，观察登录高峰期间其他接口是否仍能及时响应
+
+用法: python scripts/benchmark_login.py [--clients 200] [--seconds 10] [--users 20]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import httpx
+
+ROOT = Path(__file__).parent.parent
+
+# (标签, PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+CONFIGS = [
+    ("thread x2", "thread", 2, 64),
+    ("process x1", "process", 1, 64),
+    ("process x2", "process", 2, 64),
+    ("process x4", "process", 4, 64),
+    ("process x2 q=8", "process", 2, 8),
+]
+
+
+def start_server(port: int, db_path: str, executor: str, workers: int, pending: int) -> subprocess.Popen:
+    """按指定哈希配置启动 API 服务并等待就绪"""
+    env = dict(os.environ, DB_PATH=db_path, DB_MAINTENANCE_INTERVAL="0", RATE_LIMIT_ENABLED="0",
+               PASSWORD_HASH_EXECUTOR=executor, PASSWORD_HASH_WORKERS=str(workers),
+               PASSWORD_HASH_MAX_PENDING=str(pending))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.api.main:app",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    for _ in range(100):
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("服务启动超时")
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else 0.0
+
+
+async def run_storm(port: int, clients: int, seconds: float, users: int) -> dict:
+    """并发登录，同时每 50ms 请求一次 /health"""
+    limits = httpx.Limits(max_connections=clients + 1, max_keepalive_connections=clients + 1)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits,
+                                 timeout=60) as client:
+        for i in range(users):
+            await client.post("/auth/register", json={
+                "username": f"login_user_{i}", "password": "login123", "name1": "甲", "name2": "乙"
+            })
+
+        deadline = time.perf_counter() + seconds
+        login_latencies: List[float] = []
+        health_latencies: List[float] = []
+        statuses = {"ok": 0, "busy": 0, "error": 0}
+
+        async def login_worker(n: int):
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                resp = await client.post("/auth/login", json={
+                    "username": f"login_user_{n % users}", "password": "login123"
+                })
+                if resp.status_code == 200:
+                    statuses["ok"] += 1
+                    login_latencies.append(time.perf_counter() - start)
+                elif resp.status_code == 503:
+                    statuses["busy"] += 1
+                    await asyncio.sleep(float(resp.headers.get("Retry-After", 1)))
+                else:
+                    statuses["error"] += 1
+
+        async def health_probe():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        await asyncio.gather(health_probe(), *(login_worker(n) for n in range(clients)))
+
+    return {
+        "logins": statuses["ok"] / seconds,
+        "busy": statuses["busy"],
+        "errors": statuses["error"],
+        "login_p99": percentile(login_latencies, 0.99),
+        "health_p99": percentile(health_latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登录吞吐量基准测试")
+    parser.add_argument("--clients", type=int, default=200, help="并发登录客户端数")
+    parser.add_argument("--seconds", type=float, default=10, help="每组配置持续时间")
+    parser.add_argument("--users", type=int, default=20, help="测试账号数")
+    parser.add_argument("--port", type=int, default=8766, help="服务端口")
+    args = parser.parse_args()
+
+    print("=" * 76)
+    print(f"登录基准: {args.clients} 并发客户端 / 每组 {args.seconds:.0f} 秒 / CPU {os.cpu_count()} 核")
+    print("=" * 76)
+    print(f"{'配置':<18}{'登录/秒':>10}{'503':>8}{'错误':>8}{'登录p99 ms':>14}{'health p99 ms':>16}")
+
+    for label, executor, workers, pending in CONFIGS:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            proc = start_server(args.port, os.path.join(temp_dir, "login.db"),
+                                executor, workers, pending)
+            try:
+                r = asyncio.run(run_storm(args.port, args.clients, args.seconds, args.users))
+            finally:
+                proc.terminate()
+                proc.wait()
+        print(f"{label:<18}{r['logins']:>10.1f}{r['busy']:>8}{r['errors']:>8}"
+              f"{r['login_p99']:>14.1f}{r['health_p99']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
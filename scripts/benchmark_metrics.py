@@ -0,0 +1,92 @@
+"""
+指标记录开销基准测试
+- 直接调用一个空 ASGI 应用，对比有无 MetricsMiddleware 的单次请求耗时
+- 对比原始连接与 TimedConnection 执行 SELECT 1 的耗时
+两者之差即为每个请求/每条 SQL 的记录开销
+
+用法: python scripts/benchmark_metrics.py [--requests 200000] [--statements 200000]
+"""
+import argparse
+import asyncio
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.metrics import MetricsMiddleware, MetricsRegistry, TimedConnection
+
+
+class Route:
+    path = "/bench/{item_id}"
+
+
+async def empty_app(scope, receive, send):
+    """最小的 ASGI 应用: 设置路由并返回 200"""
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def noop_send(message):
+    pass
+
+
+async def noop_receive():
+    return {"type": "http.request", "body": b""}
+
+
+def bench_requests(app, count: int) -> float:
+    """返回每次调用的平均纳秒数"""
+    async def run():
+        scope = {"type": "http", "method": "GET", "path": "/bench/1"}
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            await app(dict(scope), noop_receive, noop_send)
+        return (time.perf_counter_ns() - start) / count
+    return asyncio.run(run())
+
+
+def bench_statements(conn, count: int) -> float:
+    """返回每条 SQL 的平均纳秒数"""
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        conn.execute("SELECT 1").fetchone()
+    return (time.perf_counter_ns() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指标记录开销基准测试")
+    parser.add_argument("--requests", type=int, default=200000, help="模拟请求数")
+    parser.add_argument("--statements", type=int, default=200000, help="SQL 语句数")
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    raw_conn = sqlite3.connect(":memory:")
+
+    # 预热
+    bench_requests(empty_app, 1000)
+    bench_requests(MetricsMiddleware(empty_app, registry), 1000)
+
+    bare = bench_requests(empty_app, args.requests)
+    instrumented = bench_requests(MetricsMiddleware(empty_app, registry), args.requests)
+    sql_bare = bench_statements(raw_conn, args.statements)
+    sql_timed = bench_statements(TimedConnection(raw_conn, registry.record_sql), args.statements)
+
+    print("=" * 60)
+    print("指标记录开销")
+    print("=" * 60)
+    print(f"{'':<20}{'无指标 us':>12}{'有指标 us':>12}{'开销 us':>12}")
+    print(f"{'每个请求':<20}{bare / 1000:>12.2f}{instrumented / 1000:>12.2f}"
+          f"{(instrumented - bare) / 1000:>12.2f}")
+    print(f"{'每条 SQL':<20}{sql_bare / 1000:>12.2f}{sql_timed / 1000:>12.2f}"
+          f"{(sql_timed - sql_bare) / 1000:>12.2f}")
+
+    summary = registry.summary()["routes"]["GET /bench/{item_id}"]
+    print(f"\n记录的请求数: {summary['count']}，p50 {summary['p50_ms']:.4f} ms，p99 {summary['p99_ms']:.4f} ms")
+
+
+if __name__ == "__main__":
+    main()
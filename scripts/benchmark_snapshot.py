@@ -0,0 +1,99 @@
+"""
+DataManager 快照基准测试
+按数据量对比: 原地覆盖写入（旧实现）、原子快照（临时文件 + fsync + os.replace）、
+journal 模式压缩，以及完整序列化备份（旧实现）与硬链接备份的耗时
+
+用法: python scripts/benchmark_snapshot.py [--sizes 100x10,1000x50,5000x100] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.data_manager import DataManager
+
+
+def populate(dm: DataManager, couples: int, history: int):
+    """直接在内存中构造数据，避免逐条保存"""
+    for i in range(couples):
+        couple = dm.Couple(f"couple_{i}", "甲", "乙")
+        couple.history = [
+            {"timestamp": "2024-01-01T00:00:00", "points_change": 1,
+             "reason": "基准", "new_balance": j + 1}
+            for j in range(history)
+        ]
+        couple.points = history
+        dm.couples[couple.couple_id] = couple
+    for i in range(min(couples, 100)):
+        dm.rewards.append(dm.Reward(f"reward_{i}", "奖励", 10, 5))
+
+
+def legacy_save(dm: DataManager):
+    """旧实现: 原地截断并写入"""
+    data = dm._to_data()
+    with open(dm.main_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def legacy_backup(dm: DataManager):
+    """旧实现: 再完整序列化一次写入备份目录"""
+    data = dm._to_data()
+    with open(os.path.join(dm.backup_dir, "legacy_backup.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def timed(func: Callable[[], object], repeat: int) -> float:
+    """多次执行取中位数（毫秒）"""
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DataManager 快照基准测试")
+    parser.add_argument("--sizes", default="100x10,1000x50,5000x100",
+                        help="数据规模列表，格式为 情侣数x每对历史条数")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数")
+    args = parser.parse_args()
+
+    print("=" * 84)
+    print("DataManager 快照基准（中位数，毫秒）")
+    print("=" * 84)
+    print(f"{'规模':<14}{'文件MB':>8}{'原地写入':>10}{'原子快照':>10}{'日志压缩':>10}"
+          f"{'序列化备份':>12}{'硬链接备份':>12}")
+
+    for size in args.sizes.split(","):
+        couples, history = (int(n) for n in size.split("x"))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dm = DataManager(data_dir=os.path.join(temp_dir, "json"))
+            populate(dm, couples, history)
+
+            legacy_ms = timed(lambda: legacy_save(dm), args.repeat)
+            atomic_ms = timed(dm.save_all_data, args.repeat)
+            size_mb = os.path.getsize(dm.main_file) / 1024 / 1024
+            legacy_backup_ms = timed(lambda: legacy_backup(dm), args.repeat)
+            link_backup_ms = timed(dm.create_backup, args.repeat)
+
+            journal = DataManager(data_dir=os.path.join(temp_dir, "journal"), storage="journal")
+            journal.load_all_data()
+            populate(journal, couples, history)
+            compact_ms = timed(journal.compact, args.repeat)
+            journal.close()
+
+        print(f"{size:<14}{size_mb:>8.1f}{legacy_ms:>10.1f}{atomic_ms:>10.1f}{compact_ms:>10.1f}"
+              f"{legacy_backup_ms:>12.1f}{link_backup_ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
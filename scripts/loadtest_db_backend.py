@@ -0,0 +1,119 @@
+"""
+数据库后端压力测试
+分别以 DB_BACKEND=sync 和 DB_BACKEND=async 启动 uvicorn，
+用大量并发客户端请求积分接口，对比吞吐量和延迟分布
+
+用法: python scripts/loadtest_db_backend.py [--clients 500] [--requests 10] [--users 50]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import httpx
+
+ROOT = Path(__file__).parent.parent
+
+
+def start_server(backend: str, port: int, db_path: str) -> subprocess.Popen:
+    """启动指定后端的 API 服务并等待就绪"""
+    env = dict(os.environ, DB_BACKEND=backend, DB_PATH=db_path, DB_MAINTENANCE_INTERVAL="0",
+               RATE_LIMIT_ENABLED="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.api.main:app",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    for _ in range(100):
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("服务启动超时")
+
+
+async def prepare_users(client: httpx.AsyncClient, count: int) -> List[dict]:
+    """注册并登录测试账号，返回各账号的请求头"""
+    headers = []
+    for i in range(count):
+        username = f"load_user_{i}"
+        await client.post("/auth/register", json={
+            "username": username, "password": "load123", "name1": "甲", "name2": "乙"
+        })
+        resp = await client.post("/auth/login", json={"username": username, "password": "load123"})
+        headers.append({"Authorization": f"Bearer {resp.json()['token']}"})
+    return headers
+
+
+async def run_clients(port: int, clients: int, requests_per_client: int, users: int) -> dict:
+    """并发客户端交替写积分、读历史，统计延迟"""
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits,
+                                 timeout=60) as client:
+        headers = await prepare_users(client, users)
+        latencies: List[float] = []
+        errors = 0
+
+        async def worker(n: int):
+            nonlocal errors
+            h = headers[n % len(headers)]
+            for i in range(requests_per_client):
+                start = time.perf_counter()
+                if i % 2 == 0:
+                    resp = await client.post("/points", headers=h,
+                                             json={"points_change": 1, "reason": "压测"})
+                else:
+                    resp = await client.get("/points/history?limit=20", headers=h)
+                latencies.append(time.perf_counter() - start)
+                if resp.status_code >= 400:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": pick(0.50),
+        "p99": pick(0.99),
+        "max": latencies[-1] * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同步/异步数据库后端压力测试")
+    parser.add_argument("--clients", type=int, default=500, help="并发客户端数")
+    parser.add_argument("--requests", type=int, default=10, help="每个客户端的请求数")
+    parser.add_argument("--users", type=int, default=50, help="测试账号数")
+    parser.add_argument("--port", type=int, default=8765, help="服务端口")
+    args = parser.parse_args()
+
+    print("=" * 64)
+    print(f"压力测试: {args.clients} 并发客户端 x {args.requests} 请求")
+    print("=" * 64)
+    print(f"{'后端':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'错误':>8}")
+
+    for backend in ("sync", "async"):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            proc = start_server(backend, args.port, os.path.join(temp_dir, "load.db"))
+            try:
+                r = asyncio.run(run_clients(args.port, args.clients, args.requests, args.users))
+            finally:
+                proc.terminate()
+                proc.wait()
+        print(f"{backend:<8}{r['rps']:>10.1f}{r['p50']:>10.1f}{r['p99']:>10.1f}"
+              f"{r['max']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
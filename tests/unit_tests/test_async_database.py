@@ -0,0 +1,70 @@
+import unittest
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+from backend.async_database import AsyncDatabase
+from backend.database import Database
+
+
+class TestAsyncDatabase(unittest.TestCase):
+    """测试异步数据库包装"""
+
+    def setUp(self):
+        """创建临时数据库"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "async.db"), pool_size=2)
+
+    def tearDown(self):
+        """清理临时文件"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def run_flow(self, adb: AsyncDatabase):
+        """执行一组与同步接口同名的异步调用"""
+        async def flow():
+            user_id = await adb.create_user("alice", "secret1")
+            couple_id = await adb.create_couple(user_id, "张三", "李四")
+            await asyncio.gather(*(
+                adb.update_couple_points(couple_id, 1, "并发") for _ in range(20)
+            ))
+            return await adb.get_couple_by_id(couple_id)
+
+        return asyncio.run(flow())
+
+    def test_dedicated_executor_backend(self):
+        """测试专用线程池后端"""
+        adb = AsyncDatabase(self.db, backend="async")
+        self.assertEqual(self.run_flow(adb)["points"], 20)
+        adb._executor.shutdown()
+
+    def test_threadpool_backend(self):
+        """测试Starlette线程池后端"""
+        adb = AsyncDatabase(self.db, backend="sync")
+        self.assertEqual(self.run_flow(adb)["points"], 20)
+
+    def test_passthrough_attributes(self):
+        """测试非I/O方法和属性直接透传"""
+        adb = AsyncDatabase(self.db, backend="sync")
+        self.assertIs(adb.pool, self.db.pool)
+        self.assertIs(adb.hash_password, Database.hash_password)
+
+    def test_close_shuts_down_executor(self):
+        """测试关闭时等待线程池结束并关闭底层数据库"""
+        adb = AsyncDatabase(self.db, backend="async")
+        self.run_flow(adb)
+        adb.close()
+        with self.assertRaises(RuntimeError):
+            adb._executor.submit(int)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            self.db.get_couple_by_id("missing")
+
+    def test_unknown_backend(self):
+        """测试未知后端报错"""
+        with self.assertRaises(ValueError):
+            AsyncDatabase(self.db, backend="gevent")
+
+
+if __name__ == "__main__":
+    unittest.main()
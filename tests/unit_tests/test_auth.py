@@ -0,0 +1,132 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from backend import auth
+from backend.auth import CoupleIdCache, SessionManager, get_current_user, get_user_couple_id, couple_id_cache
+from backend.session_store import MemorySessionStore, SQLiteSessionStore
+
+
+class FakeDatabase:
+    """记录查询次数的假数据库"""
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.queries = 0
+
+    async def get_couple_by_user_id(self, user_id):
+        self.queries += 1
+        couple_id = self.mapping.get(user_id)
+        return {"couple_id": couple_id} if couple_id else None
+
+
+class TestCoupleIdCache(unittest.TestCase):
+    """测试 user_id -> couple_id 缓存"""
+
+    def setUp(self):
+        """每个测试前清空全局缓存"""
+        couple_id_cache.clear()
+
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的条目"""
+        cache = CoupleIdCache(max_size=2)
+        cache.put(1, "c1")
+        cache.put(2, "c2")
+        cache.get(1)
+        cache.put(3, "c3")
+        self.assertEqual(cache.get(1), "c1")
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(3), "c3")
+
+    def test_hit_miss_counters(self):
+        """测试命中和未命中计数"""
+        cache = CoupleIdCache()
+        cache.get(1)
+        cache.put(1, "c1")
+        cache.get(1)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_invalidate(self):
+        """测试显式失效"""
+        cache = CoupleIdCache()
+        cache.put(1, "c1")
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1))
+
+    def test_repeated_requests_query_once(self):
+        """测试同一用户的多次请求只查询一次数据库"""
+        db = FakeDatabase({1: "couple_1"})
+
+        async def requests():
+            return [await get_user_couple_id(db, 1) for _ in range(100)]
+
+        self.assertEqual(set(asyncio.run(requests())), {"couple_1"})
+        self.assertEqual(db.queries, 1)
+
+    def test_missing_couple_not_cached(self):
+        """测试没有情侣的用户不缓存，创建后能立即查到"""
+        db = FakeDatabase({})
+        self.assertIsNone(asyncio.run(get_user_couple_id(db, 2)))
+        db.mapping[2] = "couple_2"
+        self.assertEqual(asyncio.run(get_user_couple_id(db, 2)), "couple_2")
+
+
+class RecordingStore(SQLiteSessionStore):
+    """记录 get 调用所在线程的 SQLite 会话存储"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.threads = []
+
+    def get(self, token):
+        self.threads.append(threading.get_ident())
+        return super().get(token)
+
+
+class TestSessionOffload(unittest.TestCase):
+    """测试 async 依赖中的会话存储调用不阻塞事件循环"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def current_user(self, store, token):
+        """在指定存储下调用 get_current_user，返回 (结果, 事件循环线程)"""
+        async def call():
+            user = await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+            return user, threading.get_ident()
+
+        with mock.patch.object(auth, "session_store", store), \
+                mock.patch.object(auth.session_refresher, "store", store):
+            return asyncio.run(call())
+
+    def test_sqlite_store_runs_in_threadpool(self):
+        """测试 SQLite 存储在线程池中查询会话"""
+        store = RecordingStore(os.path.join(self.tmpdir.name, "sessions.db"))
+        self.addCleanup(store.close)
+        with mock.patch.object(auth, "session_store", store):
+            token = SessionManager.create_session(1, "alice", False)
+
+        user, loop_thread = self.current_user(store, token)
+        self.assertEqual(user["username"], "alice")
+        self.assertEqual(len(store.threads), 1)
+        self.assertNotEqual(store.threads[0], loop_thread)
+
+    def test_memory_store_called_inline(self):
+        """测试内存存储直接调用"""
+        store = MemorySessionStore({})
+        with mock.patch.object(auth, "session_store", store):
+            token = SessionManager.create_session(2, "bob", True)
+        user, _ = self.current_user(store, token)
+        self.assertTrue(user["is_admin"])
+
+
+if __name__ == "__main__":
+    unittest.main()
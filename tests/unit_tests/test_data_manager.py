@@ -1,8 +1,18 @@
 import unittest
+import json
 import os
+import shutil
+import signal
+import subprocess
+import sys
 import tempfile
+import time
+from pathlib import Path
+from unittest import mock
 from backend.data_manager import DataManager
 
+PROJECT_ROOT = str(Path(__file__).resolve().parents[2])
+
 
 class TestDataManager(unittest.TestCase):
     """测试数据管理模块的单元测试"""
@@ -126,5 +136,344 @@ class TestDataManager(unittest.TestCase):
         self.assertEqual(stats["total_points"], 300)
 
 
+class TestAtomicSnapshots(unittest.TestCase):
+    """测试快照原子写入、备份和故障注入"""
+
+    def setUp(self):
+        """保存一个包含积分记录的初始快照"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.dm = DataManager(data_dir=self.temp_dir)
+        self.dm.load_all_data()
+        self.dm.add_couple("test001", "张三", "李四")
+        self.dm.add_points_history("test001", 100, "初始")
+
+    def tearDown(self):
+        """清理临时文件"""
+        shutil.rmtree(self.temp_dir)
+
+    def stored_points(self) -> int:
+        """重新加载后的积分"""
+        dm = DataManager(data_dir=self.temp_dir)
+        self.assertTrue(dm.load_all_data())
+        return dm.get_couple("test001").points
+
+    def temp_files(self):
+        return [name for name in os.listdir(self.temp_dir) if name.endswith(".tmp")]
+
+    def test_failed_serialization_keeps_previous_snapshot(self):
+        """测试序列化中途出错时原快照完整，临时文件被删除"""
+        def partial_dump(data, f, **kwargs):
+            f.write('{"couples": {"test001": ')
+            raise OSError("磁盘已满")
+
+        self.dm.get_couple("test001").points = 999
+        with mock.patch("backend.data_manager.json.dump", side_effect=partial_dump):
+            self.assertFalse(self.dm.save_all_data())
+        self.assertEqual(self.stored_points(), 100)
+        self.assertEqual(self.temp_files(), [])
+
+    def test_failed_replace_keeps_previous_snapshot(self):
+        """测试 fsync 或替换失败时原快照完整"""
+        for target in ("backend.data_manager.os.fsync", "backend.data_manager.os.replace"):
+            with mock.patch(target, side_effect=OSError("I/O 错误")):
+                self.dm.add_points_history("test001", 1, "失败")
+                self.assertFalse(self.dm.save_all_data())
+            self.assertEqual(self.stored_points(), 100)
+            self.assertEqual(self.temp_files(), [])
+
+    def test_killed_writer_never_truncates_snapshot(self):
+        """测试保存进程在任意时刻被杀，快照都能完整加载"""
+        script = (
+            "import sys; from backend.data_manager import DataManager\n"
+            "dm = DataManager(data_dir=sys.argv[1]); dm.load_all_data()\n"
+            "c = dm.get_couple('test001'); c.history = list(c.history) * 20000\n"
+            "print('ready', flush=True)\n"
+            "while True: dm.save_all_data()\n"
+        )
+        for delay in (0.05, 0.2):
+            child = subprocess.Popen(
+                [sys.executable, "-c", script, self.temp_dir],
+                cwd=PROJECT_ROOT, stdout=subprocess.PIPE
+            )
+            child.stdout.readline()
+            time.sleep(delay)
+            child.send_signal(signal.SIGKILL)
+            child.wait()
+            child.stdout.close()
+            with open(self.dm.main_file, encoding="utf-8") as f:
+                json.load(f)
+
+        dm = DataManager(data_dir=self.temp_dir)
+        self.assertTrue(dm.load_all_data())
+        self.assertEqual(self.temp_files(), [])
+
+    def test_backup_is_hard_link(self):
+        """测试备份链接到当前快照，之后的保存不影响备份"""
+        backup = self.dm.create_backup()
+        self.assertEqual(os.stat(backup).st_ino, os.stat(self.dm.main_file).st_ino)
+        self.assertEqual(self.dm.list_backups(), [backup])
+
+        self.dm.add_points_history("test001", 50, "备份后")
+        with open(backup, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["couples"]["test001"]["points"], 100)
+        self.assertEqual(self.stored_points(), 150)
+
+    def test_backup_falls_back_to_copy(self):
+        """测试不支持硬链接时复制快照"""
+        with mock.patch("backend.data_manager.os.link", side_effect=OSError("跨设备")):
+            backup = self.dm.create_backup()
+        self.assertNotEqual(os.stat(backup).st_ino, os.stat(self.dm.main_file).st_ino)
+        with open(backup, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["couples"]["test001"]["points"], 100)
+
+    def test_backup_after_failed_save_resaves(self):
+        """测试最近一次保存失败时，备份前先重新保存"""
+        with mock.patch("backend.data_manager.os.replace", side_effect=OSError("I/O 错误")):
+            self.dm.add_points_history("test001", 5, "失败")
+        backup = self.dm.create_backup()
+        with open(backup, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["couples"]["test001"]["points"], 105)
+
+
+class TestJournalStorage(unittest.TestCase):
+    """测试 journal 存储模式"""
+
+    def setUp(self):
+        """创建 journal 模式的数据管理器"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.dm = self.open()
+
+    def tearDown(self):
+        """关闭数据管理器并清理临时文件"""
+        self.dm.close()
+        shutil.rmtree(self.temp_dir)
+
+    def open(self, **kwargs) -> DataManager:
+        dm = DataManager(data_dir=self.temp_dir, storage="journal", **kwargs)
+        dm.load_all_data()
+        return dm
+
+    def reopen(self) -> DataManager:
+        """模拟进程崩溃后重启: 不做最后一次压缩，直接从快照和日志恢复"""
+        self.dm._stop.set()
+        self.dm.journal.close()
+        self.dm = self.open()
+        return self.dm
+
+    def populate(self):
+        self.dm.add_couple("test001", "张三", "李四")
+        self.dm.add_reward("reward001", "电影票", 50, 10)
+        for i in range(5):
+            self.dm.add_points_history("test001", 20, f"任务{i}")
+        self.dm.add_exchange_record("test001", "reward001", 50)
+
+    def assert_state(self, dm: DataManager):
+        couple = dm.get_couple("test001")
+        self.assertEqual(couple.names, ["张三", "李四"])
+        self.assertEqual(couple.points, 100)
+        self.assertEqual([h["reason"] for h in couple.history], [f"任务{i}" for i in range(5)])
+        self.assertEqual([r.reward_id for r in dm.rewards], ["reward001"])
+        self.assertEqual(len(dm.exchange_records), 1)
+
+    def test_writes_append_without_rewriting_snapshot(self):
+        """测试变更只追加日志，不写 system_data.json"""
+        self.populate()
+        self.assertFalse(os.path.exists(self.dm.main_file))
+        with open(self.dm.journal.path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r["seq"] for r in records], list(range(1, 9)))
+        self.assertEqual(records[2]["op"], "points")
+
+    def test_replay_after_crash(self):
+        """测试未压缩时重启，从日志恢复全部数据"""
+        self.populate()
+        self.assert_state(self.reopen())
+
+    def test_compaction(self):
+        """测试压缩后日志清空，快照加新日志恢复出完整数据"""
+        self.populate()
+        self.assertTrue(self.dm.compact())
+        self.assertEqual(self.dm.journal.size(), 0)
+        with open(self.dm.main_file, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["journal_seq"], 8)
+
+        self.dm.add_points_history("test001", 1, "压缩后")
+        dm = self.reopen()
+        self.assertEqual(dm.get_couple("test001").points, 101)
+        self.assertEqual(dm.journal.seq, 9)
+
+    def test_interrupted_compaction_is_not_applied_twice(self):
+        """测试快照已写入但旧日志未删除时，重放跳过快照中已有的记录"""
+        self.populate()
+        with self.dm._lock:
+            data = self.dm._to_data()
+            data["journal_seq"] = self.dm.journal.rotate()
+        self.dm._write_snapshot(data)
+        self.dm.add_points_history("test001", 5, "轮转后")
+
+        dm = self.reopen()
+        self.assertEqual(dm.get_couple("test001").points, 105)
+        self.assertFalse(dm.journal.has_rotated())
+
+    def test_torn_tail_is_discarded(self):
+        """测试日志末尾写了一半的记录被丢弃并截断"""
+        self.populate()
+        self.dm.journal.sync()
+        with open(self.dm.journal.path, "ab") as f:
+            f.write(b'{"seq":9,"op":"points","data":{"couple')
+
+        dm = self.reopen()
+        self.assert_state(dm)
+        dm.add_points_history("test001", 1, "截断后")
+        self.assertEqual(self.reopen().get_couple("test001").points, 101)
+
+    def test_background_compaction(self):
+        """测试日志超过阈值后后台压缩"""
+        self.dm.close()
+        self.dm = self.open(compact_bytes=512, compact_interval=0.05)
+        self.populate()
+        deadline = time.monotonic() + 5
+        while self.dm.compactions == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertGreater(self.dm.compactions, 0)
+        self.assert_state(self.dm)
+
+    def test_backup_includes_journal_tail(self):
+        """测试 journal 模式下备份前先压缩"""
+        self.populate()
+        backup = self.dm.create_backup()
+        with open(backup, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["couples"]["test001"]["points"], 100)
+        self.assertEqual(self.dm.journal.size(), 0)
+
+    def test_requires_load(self):
+        """测试未加载时写入报错，未知存储模式报错"""
+        dm = DataManager(data_dir=self.temp_dir, storage="journal")
+        with self.assertRaises(RuntimeError):
+            dm.add_couple("x", "a", "b")
+        with self.assertRaises(ValueError):
+            DataManager(data_dir=self.temp_dir, storage="yaml")
+
+
 if __name__ == "__main__":
     unittest.main()
+
+
+class TestLazyLoading(unittest.TestCase):
+    """测试 lazy 模式的按需加载"""
+
+    def setUp(self):
+        """用普通 json 模式写一个快照（缩进格式），原因里带引号和括号"""
+        self.temp_dir = tempfile.mkdtemp()
+        dm = DataManager(data_dir=self.temp_dir)
+        for i in range(20):
+            couple = dm.Couple(f"c{i}", "张三", '李"四')
+            couple.history = [
+                {"timestamp": f"2024-01-{j + 1:02d}T00:00:00", "points_change": 1,
+                 "reason": f'任务{j} {{"x": [1]}} \\ "引号"', "new_balance": j + 1}
+                for j in range(30)
+            ]
+            couple.points = 30 + i
+            dm.couples[couple.couple_id] = couple
+        dm.add_reward("reward001", "电影票", 50, 10)
+        self.expected = {k: v.to_dict() for k, v in dm.couples.items()}
+        self.managers = []
+
+    def tearDown(self):
+        for dm in self.managers:
+            dm.close()
+        shutil.rmtree(self.temp_dir)
+
+    def open(self, **kwargs) -> DataManager:
+        dm = DataManager(data_dir=self.temp_dir, lazy=True, **kwargs)
+        dm.load_all_data()
+        self.managers.append(dm)
+        return dm
+
+    def test_load_does_not_materialize_couples(self):
+        """加载后不构造情侣，计数和积分统计来自索引"""
+        dm = self.open()
+        self.assertEqual(len(dm.couples), 20)
+        self.assertIn("c3", dm.couples)
+        self.assertEqual([r.reward_id for r in dm.rewards], ["reward001"])
+        self.assertEqual(dm.get_stats()["total_points"], sum(30 + i for i in range(20)))
+        self.assertEqual(dm.stats()["cache"]["hydrations"], 0)
+
+        self.assertEqual(dm.get_couple("c7").to_dict(), self.expected["c7"])
+        self.assertIsNone(dm.get_couple("missing"))
+        self.assertEqual(dm.stats()["cache"]["hydrations"], 1)
+
+    def test_index_reused_until_snapshot_changes(self):
+        """第二次启动读取旁路索引，快照被改写后重新扫描"""
+        self.open()
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "system_data.json.idx")))
+        with mock.patch("backend.lazy_couples.scan_snapshot", side_effect=AssertionError):
+            dm = self.open()
+        self.assertEqual(dm.get_couple("c19").to_dict(), self.expected["c19"])
+
+        eager = DataManager(data_dir=self.temp_dir)
+        eager.load_all_data()
+        eager.add_points_history("c0", 5, "外部修改")
+        dm = self.open()
+        self.assertEqual(dm.get_couple("c0").history[-1]["reason"], "外部修改")
+        self.assertEqual(dm.get_couple("c1").to_dict(), self.expected["c1"])
+
+    def test_eviction_under_cap(self):
+        """超过上限时淘汰最久未使用的情侣，再次访问重新加载"""
+        dm = self.open(cache_bytes=10000)
+        couples = dm.get_all_couples()
+        self.assertEqual({c.couple_id: c.to_dict() for c in couples}, self.expected)
+        stats = dm.stats()["cache"]
+        self.assertLessEqual(stats["loaded_bytes"], 10000)
+        self.assertGreater(stats["evictions"], 0)
+        self.assertLess(stats["loaded"], 20)
+        self.assertEqual(dm.get_couple("c0").to_dict(), self.expected["c0"])
+
+    def test_dirty_couple_pinned_until_snapshot(self):
+        """修改过的情侣在写入快照之前不会被淘汰，写入后恢复为可淘汰"""
+        dm = self.open(storage="journal", cache_bytes=1)
+        dm.add_points_history("c1", 10, "奖励")
+        for couple_id in list(dm.couples):
+            dm.get_couple(couple_id)
+        self.assertEqual(dm.get_couple("c1").points, 41)
+        self.assertEqual(dm.get_stats()["total_points"], sum(30 + i for i in range(20)) + 10)
+        self.assertEqual(dm.stats()["cache"]["dirty"], 1)
+
+        self.assertTrue(dm.compact())
+        self.assertEqual(dm.stats()["cache"]["dirty"], 0)
+        self.assertLessEqual(dm.stats()["cache"]["loaded"], 1)
+        self.assertEqual(dm.get_couple("c1").history[-1]["reason"], "奖励")
+
+    def test_save_copies_unchanged_couples(self):
+        """保存快照时只加载修改过的情侣，其余直接复制字节"""
+        dm = self.open()
+        dm.add_points_history("c2", -5, "兑换")
+        dm.add_couple("new", "王五", "赵六")
+        self.assertEqual(dm.stats()["cache"]["hydrations"], 1)
+
+        with open(dm.main_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.expected["c2"]["points"] -= 5
+        self.assertEqual(data["couples"]["c2"]["history"][-1]["reason"], "兑换")
+        data["couples"]["c2"]["history"].pop()
+        self.assertEqual(data["couples"]["c2"], self.expected["c2"])
+        self.assertEqual(data["couples"]["c9"], self.expected["c9"])
+        self.assertEqual(data["couples"]["new"]["names"], ["王五", "赵六"])
+
+        reopened = self.open()
+        self.assertEqual(reopened.get_couple("c2").points, 27)
+        self.assertEqual(len(reopened.couples), 21)
+
+    def test_journal_replay_after_crash(self):
+        """lazy + journal 模式崩溃后从快照和日志恢复"""
+        dm = self.open(storage="journal")
+        dm.add_points_history("c4", 7, "崩溃前")
+        dm.add_couple("new", "王五", "赵六")
+        dm._stop.set()
+        dm.journal.close()
+        self.managers.remove(dm)
+
+        reopened = self.open(storage="journal")
+        self.assertEqual(reopened.get_couple("c4").history[-1]["reason"], "崩溃前")
+        self.assertEqual(reopened.get_couple("c4").points, 41)
+        self.assertEqual(reopened.get_couple("new").names, ["王五", "赵六"])
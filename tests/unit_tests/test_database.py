@@ -0,0 +1,522 @@
+import unittest
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from backend.database import (
+    Database, DEFAULT_PRAGMAS, pragma_profile_from_env, encode_cursor, decode_cursor
+)
+from backend.migrations import (
+    ADMIN_LIST_INDEXES, INDEXES, KEYSET_INDEXES, REPLACED_ADMIN_INDEXES, REPLACED_INDEXES
+)
+
+
+class TestDatabase(unittest.TestCase):
+    """测试SQLite数据库层"""
+
+    def setUp(self):
+        """在每个测试前创建临时数据库"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "test.db"), pool_size=2)
+
+    def tearDown(self):
+        """在每个测试后关闭连接并清理临时文件"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_pragma_profile_applied(self):
+        """测试PRAGMA配置在连接上生效"""
+        active = self.db.get_active_pragmas()
+        self.assertEqual(active["journal_mode"], "wal")
+        self.assertEqual(active["synchronous"], 1)  # NORMAL
+        self.assertEqual(active["temp_store"], 2)  # MEMORY
+        self.assertEqual(active["busy_timeout"], DEFAULT_PRAGMAS["busy_timeout"])
+        self.assertEqual(active["cache_size"], DEFAULT_PRAGMAS["cache_size"])
+
+    def test_pragma_profile_from_env(self):
+        """测试环境变量覆盖PRAGMA配置"""
+        profile = pragma_profile_from_env({"DB_PRAGMA_BUSY_TIMEOUT": "100"})
+        self.assertEqual(profile["busy_timeout"], "100")
+        self.assertEqual(profile["journal_mode"], DEFAULT_PRAGMAS["journal_mode"])
+
+    def test_checkpoint_and_optimize(self):
+        """测试WAL checkpoint和optimize维护操作"""
+        user_id = self.db.create_user("alice", "secret1")
+        self.db.create_couple(user_id, "张三", "李四")
+        result = self.db.checkpoint()
+        self.assertEqual(result["busy"], 0)
+        self.db.optimize()
+        self.assertIsNotNone(self.db.maintenance_status["last_checkpoint"])
+        self.assertIsNotNone(self.db.maintenance_status["last_optimize"])
+
+    def test_background_maintenance(self):
+        """测试后台维护线程可以启动和停止"""
+        self.db.start_maintenance(0.01)
+        thread = self.db._maintenance_thread
+        self.assertTrue(thread.is_alive())
+        self.db.stop_maintenance()
+        self.assertFalse(thread.is_alive())
+
+
+class TestQueryPlans(unittest.TestCase):
+    """查询计划回归测试：热点查询不能全表扫描或使用临时排序"""
+
+    def setUp(self):
+        """创建只有一个连接的数据库，便于跟踪执行的SQL"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "plan.db"), pool_size=1)
+        user_id = self.db.create_user("alice", "secret1")
+        self.couple_id = self.db.create_couple(user_id, "张三", "李四")
+        self.user_id = user_id
+
+    def tearDown(self):
+        """关闭连接并清理临时文件"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def capture_sql(self, func, *args):
+        """执行Database方法并返回它发出的SQL语句"""
+        statements = []
+        with self.db.connection() as conn:
+            conn.set_trace_callback(statements.append)
+        try:
+            func(*args)
+        finally:
+            with self.db.connection() as conn:
+                conn.set_trace_callback(None)
+        return [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+    def assert_indexed(self, func, *args):
+        """断言方法中的每条查询都走索引"""
+        statements = self.capture_sql(func, *args)
+        self.assertTrue(statements)
+        with self.db.connection() as conn:
+            for sql in statements:
+                plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+                for step in plan:
+                    self.assertNotRegex(step, r"^SCAN \w+$", f"全表扫描: {sql}")
+                    self.assertNotIn("TEMP B-TREE", step, f"临时排序: {sql}")
+
+    def test_indexes_created(self):
+        """测试索引全部创建且重复初始化是幂等的"""
+        self.db.init_database()
+        with self.db.connection() as conn:
+            names = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )}
+        replaced = REPLACED_INDEXES + REPLACED_ADMIN_INDEXES
+        for name, _ in INDEXES + KEYSET_INDEXES + ADMIN_LIST_INDEXES:
+            if name not in replaced:
+                self.assertIn(name, names)
+        for name in replaced:
+            self.assertNotIn(name, names)
+
+    def test_hot_queries_use_indexes(self):
+        """测试热点查询都使用索引"""
+        self.assert_indexed(self.db.get_couple_by_user_id, self.user_id)
+        self.assert_indexed(self.db.get_couple_by_id, self.couple_id)
+        self.assert_indexed(self.db.verify_user, "alice", "secret1")
+        self.assert_indexed(self.db.get_point_history, self.couple_id)
+        self.assert_indexed(self.db.get_base_rewards)
+        self.assert_indexed(self.db.get_couple_rewards, self.couple_id)
+        self.assert_indexed(self.db.get_exchange_records, self.couple_id)
+
+    def test_keyset_pages_use_indexes(self):
+        """测试带游标的翻页查询使用索引"""
+        cursor = encode_cursor("2024-01-01T00:00:00", 10)
+        self.assert_indexed(self.db.get_point_history, self.couple_id, 20, cursor)
+        self.assert_indexed(self.db.get_exchange_records, self.couple_id, 20, cursor)
+        self.assert_indexed(self.db.get_all_exchange_records, 20, cursor)
+
+    def test_admin_listings_use_indexes(self):
+        """测试管理员列表每种排序和方向的翻页都沿索引读取"""
+        time_cursor = encode_cursor("2024-01-01T00:00:00", 10)
+        points_cursor = encode_cursor(50, 10)
+        for order in ("asc", "desc"):
+            self.assert_indexed(self.db.get_all_couples, 20, time_cursor, "created_time", order)
+            self.assert_indexed(self.db.get_all_couples, 20, points_cursor, "points", order)
+            self.assert_indexed(self.db.get_all_users, 20, time_cursor, "created_time", order)
+            self.assert_indexed(self.db.get_all_users, 20, time_cursor, "username", order)
+            self.assert_indexed(self.db.get_all_exchange_records, 20, time_cursor, "exchange_time", order)
+            self.assert_indexed(self.db.get_all_exchange_records, 20, points_cursor, "points_used", order)
+
+
+class TestKeysetPagination(unittest.TestCase):
+    """测试游标分页"""
+
+    def setUp(self):
+        """创建带积分历史的临时数据库"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "page.db"), pool_size=1)
+        user_id = self.db.create_user("alice", "secret1")
+        self.couple_id = self.db.create_couple(user_id, "张三", "李四")
+        # 同一时间戳的多条记录依靠 id 区分顺序
+        with self.db.connection() as conn:
+            conn.executemany("""
+                INSERT INTO point_history (couple_id, points_change, reason, created_time)
+                VALUES (?, ?, ?, ?)
+            """, [(self.couple_id, i, "测试", f"2024-01-01T00:00:{i // 3:02d}") for i in range(25)])
+            conn.commit()
+
+    def tearDown(self):
+        """关闭连接并清理临时文件"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_pages_cover_all_rows_once(self):
+        """测试逐页翻完所有记录且不重复不遗漏"""
+        seen, cursor = [], None
+        while True:
+            page = self.db.get_point_history(self.couple_id, 7, cursor)
+            seen.extend(row["points_change"] for row in page)
+            if len(page) < 7:
+                break
+            cursor = encode_cursor(page[-1]["created_time"], page[-1]["id"])
+        self.assertEqual(seen, list(range(24, -1, -1)))
+
+    def test_cursor_round_trip(self):
+        """测试游标编码和解析"""
+        cursor = encode_cursor("2024-01-01T00:00:00", 42)
+        self.assertEqual(decode_cursor(cursor), ("2024-01-01T00:00:00", 42))
+
+    def test_invalid_cursor(self):
+        """测试无效游标报错"""
+        with self.assertRaises(ValueError):
+            self.db.get_point_history(self.couple_id, 10, "not-a-cursor")
+
+
+class TestAdminListings(unittest.TestCase):
+    """测试管理员列表的分页、过滤和排序"""
+
+    def setUp(self):
+        """创建 30 对情侣，部分创建时间和积分相同"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "admin.db"), pool_size=1)
+        password_hash = self.db.hash_password("secret1")
+        with self.db.connection() as conn:
+            for i in range(30):
+                user_id = conn.execute("""
+                    INSERT INTO users (username, password_hash, created_time) VALUES (?, ?, ?)
+                """, (f"user{i:02d}", password_hash, f"2024-01-{i // 2 + 1:02d}T08:00:00")).lastrowid
+                conn.execute("""
+                    INSERT INTO couples (couple_id, user_id, name1, name2, points, created_time)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (f"couple_{i:02d}", user_id, f"甲{i}", "乙" if i % 3 else "丙",
+                      (i % 5) * 10, f"2024-01-{i // 2 + 1:02d}T08:00:00"))
+            conn.commit()
+
+    def tearDown(self):
+        """关闭连接并清理临时文件"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def collect(self, fetch, sort: str, order: str, page_size: int = 7, **filters):
+        """逐页读取全部结果"""
+        seen, cursor = [], None
+        while True:
+            page = fetch(page_size, cursor, sort, order, **filters)
+            seen.extend(page)
+            if len(page) < page_size:
+                return seen
+            cursor = encode_cursor(page[-1][sort], page[-1]["id"])
+
+    def test_pages_cover_all_rows_in_order(self):
+        """测试每种排序翻完所有记录且顺序正确、不重复"""
+        for sort in ("created_time", "points"):
+            for order in ("asc", "desc"):
+                rows = self.collect(self.db.get_all_couples, sort, order)
+                keys = [(row[sort], row["id"]) for row in rows]
+                self.assertEqual(len(rows), 30)
+                self.assertEqual(keys, sorted(keys, reverse=(order == "desc")))
+
+        users = self.collect(self.db.get_all_users, "username", "asc", username="user")
+        self.assertEqual([u["username"] for u in users], [f"user{i:02d}" for i in range(30)])
+
+    def test_filters(self):
+        """测试名字、用户名、积分和日期过滤"""
+        rows = self.collect(self.db.get_all_couples, "points", "desc",
+                            name="丙", min_points=10, max_points=30)
+        self.assertTrue(rows)
+        for row in rows:
+            self.assertEqual(row["name2"], "丙")
+            self.assertTrue(10 <= row["points"] <= 30)
+
+        rows = self.db.get_all_couples(100, username="user1")
+        self.assertEqual(sorted(r["username"] for r in rows), [f"user{i}" for i in range(10, 20)])
+
+        rows = self.db.get_all_couples(100, since="2024-01-02", until="2024-01-04")
+        self.assertEqual(len(rows), 4)
+        users = self.db.get_all_users(100, since="2024-01-15", until="2024-02-01")
+        self.assertEqual([u["username"] for u in users], ["user29", "user28"])
+
+    def test_invalid_sort(self):
+        """测试不在白名单中的排序字段、方向和游标报错"""
+        with self.assertRaises(ValueError):
+            self.db.get_all_couples(10, sort="name1; DROP TABLE couples")
+        with self.assertRaises(ValueError):
+            self.db.get_all_users(10, order="sideways")
+        with self.assertRaises(ValueError):
+            self.db.get_all_couples(10, encode_cursor("abc", 1), "points")
+
+
+class TestScopedRewards(unittest.TestCase):
+    """测试按 (reward_id, couple_id) 修改奖励"""
+
+    def setUp(self):
+        """创建两对情侣，各有一个奖励"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "rewards.db"), pool_size=1)
+        password_hash = self.db.hash_password("secret1")
+        self.mine = self.db.create_couple(self.db.create_user_with_hash("alice", password_hash), "张三", "李四")
+        self.other = self.db.create_couple(self.db.create_user_with_hash("bob", password_hash), "王五", "赵六")
+        self.reward_id = self.db.create_couple_reward(self.mine, "电影票", 60, 1)
+        self.other_reward_id = self.db.create_couple_reward(self.other, "旅行", 100, 1)
+
+    def tearDown(self):
+        """关闭连接并清理临时文件"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_update_only_own_reward(self):
+        """测试只能修改自己的奖励"""
+        self.assertTrue(self.db.update_couple_reward(self.mine, self.reward_id, stock=5))
+        self.assertFalse(self.db.update_couple_reward(self.mine, self.other_reward_id, stock=0))
+        self.assertFalse(self.db.update_couple_reward(self.mine, "missing", stock=0))
+        self.assertFalse(self.db.update_couple_reward(self.mine, self.reward_id))
+
+        self.assertEqual(self.db.get_couple_rewards(self.mine)[0]["stock"], 5)
+        self.assertEqual(self.db.get_couple_rewards(self.other)[0]["stock"], 1)
+
+    def test_delete_only_own_reward(self):
+        """测试只能删除自己的奖励"""
+        self.assertFalse(self.db.delete_couple_reward(self.mine, self.other_reward_id))
+        self.assertEqual(len(self.db.get_couple_rewards(self.other)), 1)
+
+        self.assertTrue(self.db.delete_couple_reward(self.mine, self.reward_id))
+        self.assertFalse(self.db.delete_couple_reward(self.mine, self.reward_id))
+        self.assertEqual(self.db.get_couple_rewards(self.mine), [])
+
+    def test_foreign_couple_cannot_modify(self):
+        """测试用其他情侣的ID调用修改和删除都返回 False，奖励保持不变"""
+        before = self.db.get_couple_rewards(self.mine)
+        self.assertFalse(self.db.update_couple_reward(
+            self.other, self.reward_id, name="改名", points_needed=1, stock=99, description="x"
+        ))
+        self.assertFalse(self.db.delete_couple_reward(self.other, self.reward_id))
+        self.assertEqual(self.db.get_couple_rewards(self.mine), before)
+
+    def test_scoped_statements_use_unique_index(self):
+        """测试修改和删除实际执行的语句按 reward_id 唯一索引定位，不扫描情侣的奖励列表"""
+        statements = []
+        with self.db.connection() as conn:
+            conn.set_trace_callback(statements.append)
+        try:
+            self.db.update_couple_reward(self.other, self.reward_id, stock=0)
+            self.db.delete_couple_reward(self.other, self.reward_id)
+        finally:
+            with self.db.connection() as conn:
+                conn.set_trace_callback(None)
+
+        writes = [sql for sql in statements if sql.lstrip().startswith(("UPDATE", "DELETE"))]
+        self.assertEqual(len(writes), 2)
+        with self.db.connection() as conn:
+            for sql in writes:
+                plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+                self.assertEqual(len(plan), 1)
+                self.assertIn("sqlite_autoindex_couple_rewards_1 (reward_id=?)", plan[0])
+
+
+class TestAtomicExchange(unittest.TestCase):
+    """测试原子兑换在并发下的不变量"""
+
+    def setUp(self):
+        """创建一对有积分的情侣和一个有限库存的奖励"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "exchange.db"), pool_size=8)
+        user_id = self.db.create_user("alice", "secret1")
+        self.couple_id = self.db.create_couple(user_id, "张三", "李四")
+
+    def tearDown(self):
+        """关闭连接并清理临时文件"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_redeem_reward(self):
+        """测试兑换成功返回新积分，失败返回原因"""
+        self.db.update_couple_points(self.couple_id, 100, "初始")
+        reward_id = self.db.create_couple_reward(self.couple_id, "电影票", 60, 1)
+
+        result = self.db.redeem_reward(self.couple_id, reward_id)
+        self.assertEqual(result["new_points"], 40)
+        self.assertEqual(result["points_used"], 60)
+        self.assertEqual(self.db.redeem_reward(self.couple_id, reward_id), {"error": "out_of_stock"})
+        self.assertEqual(self.db.redeem_reward(self.couple_id, "missing"), {"error": "reward_not_found"})
+
+        other = self.db.create_couple_reward(self.couple_id, "旅行", 100, 1)
+        self.assertEqual(self.db.redeem_reward(self.couple_id, other), {"error": "insufficient_points"})
+        # 失败的兑换不能扣减库存
+        self.assertEqual(self.db.get_couple_rewards(self.couple_id)[-1]["stock"], 1)
+
+    def test_parallel_redemptions_keep_invariants(self):
+        """测试大量并发兑换不会超卖或让积分为负"""
+        stock, cost, points = 500, 3, 1200
+        self.db.update_couple_points(self.couple_id, points, "初始")
+        reward_id = self.db.create_couple_reward(self.couple_id, "咖啡", cost, stock)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(
+                lambda _: self.db.redeem_reward(self.couple_id, reward_id), range(2000)
+            ))
+
+        succeeded = [r for r in results if "record_id" in r]
+        couple = self.db.get_couple_by_id(self.couple_id)
+        reward = self.db.get_couple_rewards(self.couple_id)[0]
+        with self.db.connection() as conn:
+            records = conn.execute("SELECT COUNT(*) FROM exchange_records").fetchone()[0]
+
+        self.assertEqual(len(succeeded), min(stock, points // cost))
+        self.assertEqual(records, len(succeeded))
+        self.assertGreaterEqual(reward["stock"], 0)
+        self.assertGreaterEqual(couple["points"], 0)
+        self.assertEqual(reward["stock"], stock - len(succeeded))
+        self.assertEqual(couple["points"], points - cost * len(succeeded))
+        self.assertNotIn({"error": "failed"}, results)
+
+
+class TestBatchPoints(unittest.TestCase):
+    """测试批量积分更新"""
+
+    def setUp(self):
+        """创建临时数据库和情侣"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "batch.db"), pool_size=1)
+        user_id = self.db.create_user("alice", "secret1")
+        self.couple_id = self.db.create_couple(user_id, "张三", "李四")
+
+    def tearDown(self):
+        """关闭连接并清理临时文件"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_batch_applied_in_one_commit(self):
+        """测试批量变动只提交一次"""
+        commits = []
+        with self.db.connection() as conn:
+            conn.set_trace_callback(lambda sql: commits.append(sql) if sql == "COMMIT" else None)
+        changes = [{"points_change": i, "reason": f"任务{i}"} for i in range(1, 21)]
+        result = self.db.update_couple_points_many(self.couple_id, changes)
+        self.assertEqual(result["new_points"], 210)
+        self.assertEqual(len(result["results"]), 20)
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(len(self.db.get_point_history(self.couple_id, 100)), 20)
+
+    def test_idempotency_keys(self):
+        """测试幂等键重复提交只生效一次"""
+        changes = [
+            {"points_change": 10, "reason": "a", "idempotency_key": "k1"},
+            {"points_change": 5, "reason": "b", "idempotency_key": "k1"},
+            {"points_change": 1, "reason": "c"},
+        ]
+        first = self.db.update_couple_points_many(self.couple_id, changes)
+        self.assertEqual(first["new_points"], 11)
+        self.assertEqual([r["status"] for r in first["results"]], ["applied", "duplicate", "applied"])
+
+        retry = self.db.update_couple_points_many(self.couple_id, changes[:1])
+        self.assertEqual(retry["new_points"], 11)
+        self.assertEqual(retry["results"][0]["status"], "duplicate")
+
+    def test_unknown_couple(self):
+        """测试情侣不存在时不写入任何记录"""
+        result = self.db.update_couple_points_many("missing", [{"points_change": 1, "reason": "x"}])
+        self.assertIsNone(result)
+        with self.db.connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM point_history").fetchone()[0], 0)
+
+
+class TestMaterializedStats(unittest.TestCase):
+    """测试触发器维护的统计表"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "stats.db"), pool_size=2)
+        password_hash = self.db.hash_password("secret1")
+        self.couple_ids = [
+            self.db.create_couple(self.db.create_user_with_hash(f"user{i}", password_hash), "甲", "乙")
+            for i in range(3)
+        ]
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def recompute(self) -> dict:
+        """用全表聚合重新计算，作为对照"""
+        with self.db.connection() as conn:
+            row = conn.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM couples) AS total_couples,
+                    (SELECT COALESCE(SUM(points), 0) FROM couples) AS total_points,
+                    (SELECT COUNT(*) FROM exchange_records) AS total_exchanges,
+                    (SELECT COALESCE(SUM(MAX(points_change, 0)), 0) FROM point_history) AS points_issued,
+                    (SELECT COALESCE(SUM(MAX(-points_change, 0)), 0) FROM point_history
+                     WHERE exchange_id IS NULL) AS points_deducted,
+                    (SELECT COALESCE(SUM(points_used), 0) FROM exchange_records) AS points_redeemed
+            """).fetchone()
+        return dict(row)
+
+    def test_totals_follow_every_write_path(self):
+        """测试积分变动、批量、组提交和兑换后统计与全表聚合一致"""
+        a, b, c = self.couple_ids
+        self.db.update_couple_points(a, 100, "初始")
+        self.db.update_couple_points(b, -5, "扣分")
+        self.db.update_couple_points_many(c, [{"points_change": 7, "reason": "x"}] * 3)
+        self.db.update_points_grouped([(a, 1, "组"), (b, 2, "组"), ("missing", 3, "无")])
+        reward_id = self.db.create_couple_reward(a, "电影票", 60, 1)
+        self.db.redeem_reward(a, reward_id)
+        self.db.redeem_reward(a, reward_id)  # 库存不足，不计入
+
+        stats = self.db.get_stats()
+        self.assertEqual(stats, self.recompute())
+        self.assertEqual(stats["total_exchanges"], 1)
+        self.assertEqual(stats["points_redeemed"], 60)
+        # 兑换只计入 points_redeemed，points_deducted 只有手动扣分
+        self.assertEqual(stats["points_deducted"], 5)
+
+    def test_redemption_reason_text_not_trusted(self):
+        """测试手动扣分即使原因写成兑换的格式也计入 points_deducted"""
+        a = self.couple_ids[0]
+        self.db.update_couple_points(a, 100, "初始")
+        self.db.update_couple_points(a, -40, "兑换奖励: 伪造")
+        self.db.update_couple_points_many(a, [{"points_change": -10, "reason": "兑换奖励: 伪造"}])
+        stats = self.db.get_stats()
+        self.assertEqual((stats["points_deducted"], stats["points_redeemed"]), (50, 0))
+        self.assertEqual(stats, self.recompute())
+
+    def test_daily_aggregates(self):
+        """测试每日新增情侣、活跃情侣和积分发放/兑换"""
+        a, b, _ = self.couple_ids
+        for _ in range(3):
+            self.db.update_couple_points(a, 50, "加分")
+        self.db.update_couple_points(b, 10, "加分")
+        reward_id = self.db.create_couple_reward(a, "电影票", 30, 1)
+        self.db.redeem_reward(a, reward_id)
+
+        today = self.db.get_daily_stats(1)[0]
+        self.assertEqual(today["new_couples"], 3)
+        self.assertEqual(today["active_couples"], 2)
+        self.assertEqual(today["points_issued"], 160)
+        self.assertEqual(today["points_deducted"], 0)
+        self.assertEqual((today["exchanges"], today["points_redeemed"]), (1, 30))
+
+    def test_stats_read_uses_primary_key(self):
+        """测试统计读取按主键定位，不需要聚合或排序"""
+        with self.db.connection() as conn:
+            totals = [row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM stats_totals WHERE id = 1")]
+            daily = [row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM stats_daily ORDER BY day DESC LIMIT 7")]
+        self.assertTrue(totals[0].startswith("SEARCH stats_totals"))
+        self.assertFalse(any("TEMP B-TREE" in detail for detail in daily))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from backend.db_pool import ConnectionPool, PoolTimeout
+from backend.database import Database
+
+
+class TestConnectionPool(unittest.TestCase):
+    """测试SQLite连接池"""
+
+    def setUp(self):
+        """创建临时数据库文件"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "pool.db")
+
+    def tearDown(self):
+        """清理临时文件"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_connection_reused(self):
+        """测试连接被复用而不是重新打开"""
+        pool = ConnectionPool(self.db_path, size=2)
+        with pool.connection() as conn1:
+            pass
+        with pool.connection() as conn2:
+            pass
+        self.assertIs(conn1, conn2)
+        self.assertEqual(pool.stats()["created"], 1)
+        self.assertEqual(pool.stats()["reused"], 1)
+        pool.close_all()
+
+    def test_counters_exact_under_concurrency(self):
+        """测试多线程借还连接后计数准确"""
+        pool = ConnectionPool(self.db_path, size=4)
+
+        def work():
+            for _ in range(500):
+                with pool.connection():
+                    pass
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = pool.stats()
+        self.assertEqual(stats["acquired"], 4000)
+        self.assertEqual(stats["reused"], 4000 - stats["created"])
+        pool.close_all()
+
+    def test_pool_is_bounded(self):
+        """测试连接数达到上限后等待超时"""
+        pool = ConnectionPool(self.db_path, size=1, timeout=0.05)
+        conn = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        pool.release(conn)
+        pool.close_all()
+
+    def test_waiter_gets_released_connection(self):
+        """测试等待中的线程能拿到被归还的连接"""
+        pool = ConnectionPool(self.db_path, size=1, timeout=2)
+        conn = pool.acquire()
+        got = []
+
+        def worker():
+            with pool.connection() as c:
+                got.append(c)
+
+        t = threading.Thread(target=worker)
+        t.start()
+        pool.release(conn)
+        t.join()
+        self.assertEqual(got, [conn])
+        pool.close_all()
+
+    def test_pragmas_applied(self):
+        """测试新连接会预先执行PRAGMA"""
+        pool = ConnectionPool(self.db_path, size=1, pragmas=[("foreign_keys", "ON")])
+        with pool.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+        pool.close_all()
+
+    def test_open_transaction_rolled_back_on_release(self):
+        """测试归还连接时未提交的事务会被回滚"""
+        pool = ConnectionPool(self.db_path, size=1)
+        with pool.connection() as conn:
+            conn.execute("CREATE TABLE t (x INTEGER)")
+            conn.commit()
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+        with pool.connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+        pool.close_all()
+
+    def test_unhealthy_connection_replaced(self):
+        """测试健康检查失败的连接会被替换"""
+        pool = ConnectionPool(self.db_path, size=1, health_check_interval=0)
+        with pool.connection() as conn1:
+            pass
+        conn1.close()
+        with pool.connection() as conn2:
+            self.assertIsNot(conn1, conn2)
+            conn2.execute("SELECT 1")
+        self.assertEqual(pool.stats()["discarded"], 1)
+        pool.close_all()
+
+    def test_unpooled_mode(self):
+        """测试size为0时每次都打开新连接"""
+        pool = ConnectionPool(self.db_path, size=0)
+        with pool.connection() as conn1:
+            pass
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn1.execute("SELECT 1")
+
+    def test_database_uses_pool(self):
+        """测试Database的查询复用连接池"""
+        db = Database(self.db_path, pool_size=2)
+        user_id = db.create_user("alice", "secret1")
+        couple_id = db.create_couple(user_id, "张三", "李四")
+        db.update_couple_points(couple_id, 10, "测试")
+        self.assertEqual(db.get_couple_by_id(couple_id)["points"], 10)
+        self.assertLessEqual(db.pool.stats()["created"], 2)
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
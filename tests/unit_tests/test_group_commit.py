@@ -0,0 +1,112 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from backend.database import Database
+from backend.group_commit import GroupCommitWriter
+
+
+class TestGroupCommitWriter(unittest.TestCase):
+    """测试积分组提交写入器"""
+
+    def setUp(self):
+        """创建临时数据库和两对情侣"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "group.db"), pool_size=4)
+        self.couples = []
+        for name in ("alice", "bob"):
+            user_id = self.db.create_user(name, "secret1")
+            self.couples.append(self.db.create_couple(user_id, "甲", "乙"))
+        self.writer = GroupCommitWriter(self.db, max_batch_size=32, max_linger_ms=5)
+        self.writer.start()
+
+    def tearDown(self):
+        """停止写入器并清理临时文件"""
+        self.writer.stop()
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_submit_returns_new_points(self):
+        """测试提交后返回事务提交后的新积分"""
+        self.assertEqual(self.writer.submit(self.couples[0], 10, "任务").result(timeout=5), 10)
+        self.assertEqual(self.writer.submit(self.couples[0], -3, "扣分").result(timeout=5), 7)
+        self.assertIsNone(self.writer.submit("missing", 1, "x").result(timeout=5))
+
+    def test_concurrent_events_are_grouped(self):
+        """测试多线程并发事件被合并提交且结果正确"""
+        def work(i):
+            return self.writer.submit(self.couples[i % 2], 1, "并发").result(timeout=10)
+
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            list(executor.map(work, range(400)))
+
+        for couple_id in self.couples:
+            self.assertEqual(self.db.get_couple_by_id(couple_id)["points"], 200)
+        self.assertEqual(len(self.db.get_point_history(self.couples[0], 500)), 200)
+        stats = self.writer.stats()
+        self.assertEqual(stats["events"], 400)
+        self.assertLess(stats["batches"], 400)
+
+    def test_stop_flushes_queue(self):
+        """测试停止时队列中的事件仍会提交"""
+        futures = [self.writer.submit(self.couples[1], 1, "x") for _ in range(50)]
+        self.writer.stop()
+        self.assertTrue(all(f.done() for f in futures))
+        self.assertEqual(self.db.get_couple_by_id(self.couples[1])["points"], 50)
+
+    def test_submit_racing_stop(self):
+        """测试与 stop 并发的提交要么被拒绝，要么对应的 Future 一定完成"""
+        futures, rejected = [], []
+        started = threading.Event()
+
+        def work():
+            started.set()
+            while True:
+                try:
+                    futures.append(self.writer.submit(self.couples[0], 1, "x"))
+                except RuntimeError:
+                    rejected.append(True)
+                    return
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+        self.writer.stop()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(rejected), 4)
+        self.assertTrue(all(f.done() for f in futures))
+        self.assertEqual(self.db.get_couple_by_id(self.couples[0])["points"], len(futures))
+
+    def test_failed_event_isolated(self):
+        """测试同批中单个事件失败只影响它自己的请求"""
+        results = self.db.update_points_grouped([
+            (self.couples[0], 5, "正常"),
+            (self.couples[0], 1 << 70, "超出范围"),
+            (self.couples[1], 3, "正常"),
+        ])
+        self.assertEqual(results[0], 5)
+        self.assertIsInstance(results[1], OverflowError)
+        self.assertEqual(results[2], 3)
+        self.assertEqual(self.db.get_couple_by_id(self.couples[0])["points"], 5)
+        self.assertEqual(len(self.db.get_point_history(self.couples[0], 10)), 1)
+
+    def test_failed_future_gets_exception(self):
+        """测试失败事件的 Future 收到异常，其他 Future 正常完成"""
+        self.writer.stop()
+        writer = GroupCommitWriter(self.db, max_batch_size=32, max_linger_ms=50)
+        writer.start()
+        good = writer.submit(self.couples[1], 2, "x")
+        bad = writer.submit(self.couples[1], 1 << 70, "x")
+        writer.stop()
+        self.assertEqual(good.result(timeout=5), 2)
+        self.assertIsInstance(bad.exception(timeout=5), OverflowError)
+        self.assertEqual(writer.stats()["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import shutil
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from unittest import mock
+from backend import history_store
+from backend.data_manager import DataManager
+from backend.history_store import REASONS, HistoryColumns, ReasonTable, from_micros, to_micros
+
+
+def make_entries(n: int):
+    """每小时一条，从 2024-01-01 开始"""
+    return [
+        {"timestamp": (datetime(2024, 1, 1) + timedelta(hours=i, microseconds=i)).isoformat(),
+         "points_change": i - 5, "reason": f"任务{i % 3}", "new_balance": 1000 + i}
+        for i in range(n)
+    ]
+
+
+class TestHistoryColumns(unittest.TestCase):
+    """测试积分历史的列式存储"""
+
+    def test_round_trip(self):
+        """测试按列保存后生成的字典与原记录一致"""
+        entries = make_entries(50)
+        history = HistoryColumns(entries)
+        self.assertEqual(len(history), 50)
+        self.assertEqual(history.to_list(), entries)
+        self.assertEqual(history[-1], entries[-1])
+        self.assertEqual(history[10:13], entries[10:13])
+        self.assertEqual([h["reason"] for h in history], [e["reason"] for e in entries])
+        with self.assertRaises(IndexError):
+            history[50]
+
+    def test_reasons_interned(self):
+        """测试相同原因只保存一份"""
+        before = len(REASONS)
+        HistoryColumns(make_entries(30))
+        HistoryColumns(make_entries(30))
+        self.assertLessEqual(len(REASONS) - before, 3)
+
+    def test_reason_table_bounded(self):
+        """测试原因表满后和过长的原因不进表，记录仍原样保留"""
+        table = ReasonTable(max_reasons=2, max_length=8)
+        entries = make_entries(6)
+        entries[0]["reason"] = "很长很长很长很长的原因"
+        with mock.patch.object(history_store, "REASONS", table):
+            history = HistoryColumns(entries)
+            self.assertEqual(history.to_list(), entries)
+            self.assertEqual(history.between("2024-01-01T02:00:00", None), entries[2:])
+        # 表中只有最先出现的两种原因
+        self.assertEqual(table.reasons, ["任务1", "任务2"])
+        self.assertEqual(sorted(history._extra), [0, 3])
+        stats = table.stats()
+        self.assertEqual((stats["reasons"], stats["rejected"]), (2, 2))
+        self.assertGreater(stats["memory_bytes"], 0)
+
+    def test_irregular_entries_kept_verbatim(self):
+        """测试不符合列类型的记录原样保留"""
+        entries = [
+            {"timestamp": "2024-01-01T00:00:00", "points_change": 1.5, "reason": "小数", "new_balance": 1.5},
+            {"timestamp": "昨天", "points_change": 1, "reason": "时间", "new_balance": 2},
+            {"timestamp": "2024-01-02T00:00:00", "points_change": 1 << 40, "reason": "很大", "new_balance": 3},
+            {"timestamp": "2024-01-03T00:00:00", "points_change": 1, "reason": "多余", "new_balance": 4, "by": "管理员"},
+            {"timestamp": "2024-01-04", "points_change": 1, "reason": "只有日期", "new_balance": 5},
+        ]
+        history = HistoryColumns(entries)
+        self.assertEqual(history.to_list(), entries)
+
+        history[0]["reason"] = "修改副本"
+        self.assertEqual(history[0]["reason"], "小数")
+
+    def test_between(self):
+        """测试按时间范围查询（含起点，不含终点）"""
+        entries = make_entries(72)
+        history = HistoryColumns(entries)
+        self.assertEqual(history.between("2024-01-02", "2024-01-03"), entries[24:48])
+        self.assertEqual(history.between(since=datetime(2024, 1, 3)), entries[48:])
+        self.assertEqual(history.between(until="2024-01-01T02:00:00"), entries[:2])
+        self.assertEqual(history.between(), entries)
+
+        shuffled = HistoryColumns(entries[40:] + entries[:40])
+        self.assertEqual(
+            sorted(shuffled.between("2024-01-02", "2024-01-03"), key=lambda e: e["timestamp"]),
+            entries[24:48]
+        )
+
+    def test_timestamp_conversion(self):
+        """测试时间戳与 epoch 微秒互转，带时区的时间转换为 UTC"""
+        self.assertEqual(to_micros("1970-01-01T00:00:01.5"), 1_500_000)
+        self.assertEqual(from_micros(1_500_000), "1970-01-01T00:00:01.500000")
+        self.assertEqual(to_micros("1970-01-01T08:00:00+08:00"), 0)
+
+    def test_memory_smaller_than_dicts(self):
+        """测试列式存储的内存占用明显小于字典列表"""
+        entries_n = 20000
+
+        tracemalloc.start()
+        as_dicts = [dict(e) for e in make_entries(entries_n)]
+        dict_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        as_columns = HistoryColumns(as_dicts)
+        column_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        self.assertLess(column_bytes * 5, dict_bytes)
+        self.assertEqual(len(as_columns), entries_n)
+
+
+class TestDataManagerHistory(unittest.TestCase):
+    """测试 DataManager 中的积分历史"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.dm = DataManager(data_dir=self.temp_dir)
+        self.dm.add_couple("test001", "张三", "李四")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_history_saved_as_list(self):
+        """测试快照中仍是字典列表，重新加载后一致"""
+        self.dm.add_points_history("test001", 10, "完成任务")
+        self.dm.add_points_history("test001", -3, "兑换")
+        history = self.dm.get_couple("test001").to_dict()["history"]
+        self.assertEqual([h["new_balance"] for h in history], [10, 7])
+
+        dm = DataManager(data_dir=self.temp_dir)
+        dm.load_all_data()
+        self.assertEqual(dm.get_couple("test001").to_dict()["history"], history)
+
+    def test_get_history_range(self):
+        """测试按时间范围查询情侣历史"""
+        couple = self.dm.get_couple("test001")
+        couple.history = make_entries(48)
+        self.assertEqual(self.dm.get_history("test001", "2024-01-02"), make_entries(48)[24:])
+        self.assertIsNone(self.dm.get_history("missing"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import os
+import shutil
+import tempfile
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from backend.database import Database
+from backend.metrics import Histogram, MetricsMiddleware, MetricsRegistry, statement_name
+
+
+class TestHistogram(unittest.TestCase):
+    """测试对数线性直方图"""
+
+    def test_percentiles_within_bucket_precision(self):
+        """测试分位数误差在子桶精度（12.5%）以内"""
+        h = Histogram()
+        for v in range(1, 10001):
+            h.record(v)
+        for q, expected in ((0.5, 5000), (0.9, 9000), (0.99, 9900)):
+            self.assertLessEqual(abs(h.percentile(q) - expected) / expected, 0.125)
+        self.assertEqual(h.percentile(1.0), 10000)
+        self.assertEqual((h.count, h.max), (10000, 10000))
+
+    def test_small_values_exact(self):
+        """测试 16 微秒以下精确分桶"""
+        h = Histogram()
+        for v in (3, 3, 7):
+            h.record(v)
+        self.assertEqual(h.percentile(0.5), 4)
+        self.assertEqual(h.cumulative([16, 32]), [3, 3])
+
+    def test_huge_value_clamped(self):
+        """测试超大值落入最后一个桶"""
+        h = Histogram()
+        h.record(10 ** 12)
+        self.assertEqual(h.count, 1)
+        self.assertEqual(h.counts[-1], 1)
+
+
+class TestStatementName(unittest.TestCase):
+    """测试 SQL 语句命名"""
+
+    def test_names(self):
+        self.assertEqual(statement_name("SELECT * FROM couples WHERE couple_id = ?"), "SELECT couples")
+        self.assertEqual(statement_name("\n  INSERT INTO point_history (a) VALUES (?)"), "INSERT point_history")
+        self.assertEqual(statement_name("UPDATE rewards SET stock = stock - 1"), "UPDATE rewards")
+        self.assertEqual(statement_name("BEGIN IMMEDIATE"), "BEGIN")
+        self.assertEqual(statement_name("PRAGMA journal_mode"), "PRAGMA")
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+    """测试请求指标中间件"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware, registry=self.registry)
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: int):
+            if item_id == 0:
+                raise HTTPException(status_code=404)
+            return {"id": item_id}
+
+        self.client = TestClient(app)
+
+    def test_records_route_template_and_status(self):
+        """测试按路由模板和状态码记录"""
+        for item_id in (1, 2, 0):
+            self.client.get(f"/items/{item_id}")
+        self.client.get("/missing")
+
+        self.assertEqual(self.registry.routes[("GET", "/items/{item_id}")].count, 3)
+        self.assertEqual(self.registry.statuses[("GET", "/items/{item_id}", 200)], 2)
+        self.assertEqual(self.registry.statuses[("GET", "/items/{item_id}", 404)], 1)
+        self.assertEqual(self.registry.statuses[("GET", "<unmatched>", 404)], 1)
+        self.assertEqual(self.registry.in_flight, 0)
+
+    def test_render(self):
+        """测试 Prometheus 文本输出"""
+        self.client.get("/items/1")
+        text = self.registry.render()
+        self.assertIn('http_requests_total{method="GET",route="/items/{item_id}",status="200"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/items/{item_id}",le="+Inf"} 1', text)
+        self.assertIn("# TYPE db_statement_duration_seconds histogram", text)
+
+
+class TestSqlHook(unittest.TestCase):
+    """测试 Database 的 SQL 计时回调"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "test.db"), pool_size=1)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_statements_timed_by_name(self):
+        """测试每条 SQL 按语句名计时"""
+        registry = MetricsRegistry()
+        self.db.sql_hook = registry.record_sql
+        user_id = self.db.create_user_with_hash("alice", "x")
+        couple_id = self.db.create_couple(user_id, "甲", "乙")
+        self.db.get_couple_by_id(couple_id)
+        self.db.update_couple_points(couple_id, 5, "测试")
+
+        self.assertEqual(registry.sql["INSERT users"].count, 1)
+        self.assertGreaterEqual(registry.sql["SELECT couples"].count, 1)
+        self.assertGreaterEqual(registry.sql["UPDATE couples"].count, 1)
+
+    def test_no_hook_returns_raw_connection(self):
+        """测试未设置回调时不包装连接"""
+        with self.db.connection() as conn:
+            self.assertEqual(type(conn).__name__, "Connection")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+from backend.database import Database
+from backend.migrations import (
+    LATEST_VERSION, MIGRATIONS, SCHEMA_V1, Migration, MigrationRunner, main
+)
+
+
+class TestMigrations(unittest.TestCase):
+    """测试数据库版本迁移"""
+
+    def setUp(self):
+        """创建临时数据库路径"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "migrate.db")
+
+    def tearDown(self):
+        """清理临时文件"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_fresh_database_reaches_latest(self):
+        """测试新数据库应用全部迁移"""
+        db = Database(self.db_path, pool_size=1)
+        self.assertEqual([m["version"] for m in db.applied_migrations],
+                         [m.version for m in MIGRATIONS])
+        self.assertIsNotNone(db.verify_user("admin", "admin123"))
+        db.close()
+
+    def test_current_database_skips_migrations(self):
+        """测试已是最新版本时不再执行任何迁移"""
+        Database(self.db_path, pool_size=1).close()
+        db = Database(self.db_path, pool_size=1)
+        self.assertEqual(db.applied_migrations, [])
+        with db.connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM base_rewards").fetchone()[0], 10)
+        db.close()
+
+    def test_adopts_legacy_database(self):
+        """测试接管没有版本号的旧数据库"""
+        conn = sqlite3.connect(self.db_path)
+        for sql in SCHEMA_V1:
+            conn.execute(sql)
+        conn.execute("INSERT INTO base_rewards (name, points_needed) VALUES ('旧奖励', 10)")
+        conn.commit()
+        conn.close()
+
+        db = Database(self.db_path, pool_size=1)
+        self.assertEqual(len(db.get_base_rewards()), 1)
+        with db.connection() as conn:
+            self.assertEqual(MigrationRunner(conn).current_version(), LATEST_VERSION)
+        db.close()
+
+    def test_stats_backfilled_from_existing_data(self):
+        """测试统计表迁移用已有数据初始化"""
+        conn = sqlite3.connect(self.db_path)
+        MigrationRunner(conn, [m for m in MIGRATIONS if m.version < 6]).migrate()
+        conn.execute("""
+            INSERT INTO couples (couple_id, user_id, name1, name2, points, created_time)
+            VALUES ('c1', 1, '甲', '乙', 30, '2024-01-01T10:00:00'),
+                   ('c2', 1, '丙', '丁', 5, '2024-01-02T10:00:00')
+        """)
+        conn.executemany("""
+            INSERT INTO point_history (couple_id, points_change, reason, created_time)
+            VALUES (?, ?, '', ?)
+        """, [("c1", 50, "2024-01-01T11:00:00"), ("c1", -20, "2024-01-02T11:00:00"),
+              ("c2", 5, "2024-01-02T12:00:00")])
+        conn.execute("""
+            INSERT INTO exchange_records (record_id, couple_id, reward_id, points_used, exchange_time)
+            VALUES ('e1', 'c1', 'r1', 20, '2024-01-02T11:00:00')
+        """)
+        conn.commit()
+        conn.close()
+
+        db = Database(self.db_path, pool_size=1)
+        self.assertEqual(db.get_stats(), {
+            "total_couples": 2, "total_points": 35, "total_exchanges": 1,
+            "points_issued": 55, "points_deducted": 0, "points_redeemed": 20,
+        })
+        day2, day1 = db.get_daily_stats()
+        self.assertEqual((day1["day"], day1["new_couples"], day1["active_couples"]), ("2024-01-01", 1, 1))
+        self.assertEqual((day2["active_couples"], day2["points_issued"], day2["exchanges"]), (2, 5, 1))
+
+        # 迁移后由触发器继续维护
+        db.update_couple_points("c2", 10, "加分")
+        self.assertEqual(db.get_stats()["total_points"], 45)
+        db.close()
+
+    def test_existing_redemptions_linked(self):
+        """测试已有的兑换积分历史按兑换记录关联，只计入 points_redeemed；手动扣分不受原因文本影响"""
+        conn = sqlite3.connect(self.db_path)
+        MigrationRunner(conn, [m for m in MIGRATIONS if m.version < 6]).migrate()
+        conn.execute("""
+            INSERT INTO couples (couple_id, user_id, name1, name2, points, created_time)
+            VALUES ('c1', 1, '甲', '乙', 100, '2024-01-01T10:00:00')
+        """)
+        conn.execute("""
+            INSERT INTO exchange_records (record_id, couple_id, reward_id, points_used, exchange_time)
+            VALUES ('e1', 'c1', 'r1', 20, '2024-01-01T11:00:00.100000')
+        """)
+        conn.executemany("""
+            INSERT INTO point_history (couple_id, points_change, reason, created_time)
+            VALUES ('c1', ?, ?, ?)
+        """, [(-20, "兑换奖励: r1", "2024-01-01T11:00:00.100200"),
+              (-20, "扣分", "2024-01-01T12:00:00"),
+              (-7, "兑换奖励: 伪造", "2024-01-02T12:00:00")])
+        conn.commit()
+        conn.close()
+
+        db = Database(self.db_path, pool_size=1)
+        linked = [row["exchange_id"] for row in db.get_point_history("c1")]
+        self.assertEqual(linked, [None, None, "e1"])
+        self.assertEqual(db.get_stats()["points_deducted"], 27)
+        day2, day1 = db.get_daily_stats()
+        self.assertEqual((day1["points_deducted"], day2["points_deducted"]), (20, 7))
+
+        reward_id = db.create_couple_reward("c1", "电影票", 30, 1)
+        db.redeem_reward("c1", reward_id)
+        db.update_couple_points("c1", -3, "兑换奖励: 伪造")
+        stats = db.get_stats()
+        self.assertEqual((stats["points_deducted"], stats["points_redeemed"]), (30, 50))
+        db.close()
+
+    def test_dry_run_does_not_change_database(self):
+        """测试预演模式不修改数据库"""
+        conn = sqlite3.connect(self.db_path)
+        runner = MigrationRunner(conn)
+        planned = runner.migrate(dry_run=True)
+        self.assertEqual(len(planned), len(MIGRATIONS))
+        self.assertEqual(runner.current_version(), 0)
+        conn.close()
+
+    def test_failed_migration_rolled_back(self):
+        """测试失败的迁移整体回滚且版本号不变"""
+        conn = sqlite3.connect(self.db_path)
+        migrations = [
+            Migration(1, "ok", statements=["CREATE TABLE a (x INTEGER)"]),
+            Migration(2, "bad", statements=["CREATE TABLE b (x INTEGER)", "NOT SQL"]),
+        ]
+        with self.assertRaises(sqlite3.OperationalError):
+            MigrationRunner(conn, migrations).migrate()
+        self.assertEqual(MigrationRunner(conn, migrations).current_version(), 1)
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertIn("a", tables)
+        self.assertNotIn("b", tables)
+        conn.close()
+
+    def test_cli_apply(self):
+        """测试命令行应用迁移"""
+        self.assertEqual(main(["apply", "--db", self.db_path]), 0)
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(MigrationRunner(conn).current_version(), LATEST_VERSION)
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+from backend import passwords
+from backend.database import Database
+from backend.passwords import (
+    PasswordHasher, PasswordHasherBusy, hash_password, needs_rehash, verify_password
+)
+
+
+class TestPasswordHashing(unittest.TestCase):
+    """测试带盐 scrypt 密码哈希"""
+
+    def test_hash_and_verify(self):
+        """测试哈希后可以校验，错误密码校验失败"""
+        stored = hash_password("secret1")
+        self.assertTrue(stored.startswith("scrypt$"))
+        self.assertTrue(verify_password("secret1", stored))
+        self.assertFalse(verify_password("secret2", stored))
+
+    def test_salted(self):
+        """测试相同密码每次得到不同哈希"""
+        self.assertNotEqual(hash_password("secret1"), hash_password("secret1"))
+
+    def test_legacy_sha256(self):
+        """测试兼容旧版无盐 SHA-256 哈希，且需要重新哈希"""
+        legacy = hashlib.sha256(b"admin123").hexdigest()
+        self.assertTrue(verify_password("admin123", legacy))
+        self.assertFalse(verify_password("wrong", legacy))
+        self.assertTrue(needs_rehash(legacy))
+
+    def test_parameter_change_needs_rehash(self):
+        """测试参数调整后旧哈希仍能校验且需要重新哈希"""
+        stored = hash_password("secret1")
+        self.assertFalse(needs_rehash(stored))
+        original = passwords.SCRYPT_N
+        passwords.SCRYPT_N = original * 2
+        try:
+            self.assertTrue(verify_password("secret1", stored))
+            self.assertTrue(needs_rehash(stored))
+        finally:
+            passwords.SCRYPT_N = original
+
+    def test_malformed_hash(self):
+        """测试格式错误的哈希校验失败"""
+        self.assertFalse(verify_password("secret1", "scrypt$x$8$1$abc$def"))
+
+
+class TestPasswordHasher(unittest.TestCase):
+    """测试有界密码哈希进程池"""
+
+    def test_process_pool(self):
+        """测试在进程池中哈希和校验"""
+        hasher = PasswordHasher(max_workers=1)
+
+        async def flow():
+            stored = await hasher.hash("secret1")
+            return await hasher.verify("secret1", stored), await hasher.verify("secret1", None)
+
+        try:
+            self.assertEqual(asyncio.run(flow()), (True, False))
+        finally:
+            hasher.close()
+        self.assertEqual(hasher.stats()["completed"], 3)
+
+    def test_admission_control(self):
+        """测试排队超过上限时拒绝新任务"""
+        hasher = PasswordHasher(max_workers=1, max_pending=2, executor="thread")
+
+        async def storm():
+            return await asyncio.gather(
+                *[hasher.hash("secret1") for _ in range(6)], return_exceptions=True
+            )
+
+        try:
+            results = asyncio.run(storm())
+        finally:
+            hasher.close()
+        rejected = [r for r in results if isinstance(r, PasswordHasherBusy)]
+        self.assertEqual(len(rejected), 4)
+        self.assertEqual(hasher.stats()["rejected"], 4)
+        self.assertEqual(hasher.stats()["pending"], 0)
+
+
+class TestDatabaseRehash(unittest.TestCase):
+    """测试登录时旧哈希自动升级"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.temp_dir, "test.db"), pool_size=1)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_legacy_hash_upgraded_on_login(self):
+        """测试旧版哈希用户登录后存储为 scrypt 哈希"""
+        legacy = hashlib.sha256(b"secret1").hexdigest()
+        user_id = self.db.create_user_with_hash("alice", legacy)
+        self.assertIsNone(self.db.verify_user("alice", "wrong"))
+        self.assertEqual(self.db.get_user_credentials("alice")["password_hash"], legacy)
+
+        self.assertEqual(self.db.verify_user("alice", "secret1")["id"], user_id)
+        stored = self.db.get_user_credentials("alice")["password_hash"]
+        self.assertFalse(needs_rehash(stored))
+        self.assertEqual(self.db.verify_user("alice", "secret1")["id"], user_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import threading
+from backend.database import Database
+from backend.metrics import MetricsRegistry
+from backend.query_profiler import QueryProfiler, normalize_sql
+
+
+class TestNormalizeSql(unittest.TestCase):
+    """测试 SQL 归一化"""
+
+    def test_literals_and_whitespace(self):
+        sql = """
+            SELECT * FROM couples
+            WHERE name1 = 'it''s' AND points > 10 LIMIT ?
+        """
+        self.assertEqual(normalize_sql(sql), "SELECT * FROM couples WHERE name1 = ? AND points > ? LIMIT ?")
+
+
+class TestQueryProfiler(unittest.TestCase):
+    """测试 SQL 性能分析"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.temp_dir, "slow.log")
+        self.db = Database(os.path.join(self.temp_dir, "test.db"), pool_size=1)
+        self.user_id = self.db.create_user_with_hash("alice", "x")
+        self.couple_id = self.db.create_couple(self.user_id, "甲", "乙")
+
+    def tearDown(self):
+        if self.db.profiler:
+            self.db.profiler.close()
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def enable(self, threshold_ms: float) -> QueryProfiler:
+        self.db.profiler = QueryProfiler(slow_threshold_ms=threshold_ms, log_path=self.log_path)
+        return self.db.profiler
+
+    def test_rows_params_and_callers(self):
+        """测试记录返回行数、参数个数和调用方法"""
+        profiler = self.enable(threshold_ms=10_000)
+        for i in range(3):
+            self.db.update_couple_points(self.couple_id, 1, f"测试{i}")
+        history = self.db.get_point_history(self.couple_id, limit=10)
+        self.assertEqual(len(history), 3)
+
+        by_caller = {}
+        for query in profiler.top(50):
+            for caller in query["callers"]:
+                by_caller.setdefault(caller, []).append(query)
+
+        history_query = by_caller["get_point_history"][0]
+        self.assertEqual(history_query["rows"], 3)
+        self.assertEqual(history_query["count"], 1)
+        self.assertEqual(history_query["params"], 2)
+        self.assertIn("update_couple_points", by_caller)
+        self.assertFalse(os.path.exists(self.log_path) and os.path.getsize(self.log_path))
+
+    def test_top_sorting(self):
+        """测试按次数排序和非法排序字段"""
+        profiler = self.enable(threshold_ms=10_000)
+        for _ in range(5):
+            self.db.get_couple_by_id(self.couple_id)
+        self.db.get_all_couples()
+        top = profiler.top(1, sort="count")
+        self.assertEqual(top[0]["count"], 5)
+        self.assertEqual(top[0]["callers"], {"get_couple_by_id": 5})
+        with self.assertRaises(ValueError):
+            profiler.top(1, sort="bogus")
+        profiler.reset()
+        self.assertEqual(profiler.top(), [])
+
+    def test_slow_query_log_with_plan(self):
+        """测试超过阈值的语句写入日志并附带执行计划"""
+        profiler = self.enable(threshold_ms=0)
+        self.db.get_point_history(self.couple_id, limit=10)
+        profiler.close()
+
+        with open(self.log_path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        entry = next(e for e in entries if e["caller"] == "get_point_history")
+        self.assertTrue(entry["sql"].startswith("SELECT"))
+        self.assertTrue(any("idx_point_history" in step for step in entry["plan"]))
+        self.assertGreaterEqual(profiler.slow_count, 1)
+
+    def test_slow_count_exact_under_concurrency(self):
+        """测试多线程记录慢查询时计数准确"""
+        profiler = QueryProfiler(slow_threshold_ms=0)
+
+        def work():
+            for _ in range(1000):
+                profiler.record("SELECT 1", (), 1.0, 1, "work")
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(profiler.slow_count, 8000)
+        self.assertEqual(profiler.top(1)[0]["count"], 8000)
+
+    def test_combined_with_sql_hook(self):
+        """测试与 SQL 计时回调同时启用"""
+        profiler = self.enable(threshold_ms=10_000)
+        registry = MetricsRegistry()
+        self.db.sql_hook = registry.record_sql
+        self.db.get_couple_by_id(self.couple_id)
+        self.assertEqual(registry.sql["SELECT couples"].count, 1)
+        self.assertEqual(profiler.top(1)[0]["callers"], {"get_couple_by_id": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
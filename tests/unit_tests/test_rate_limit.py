@@ -0,0 +1,183 @@
+import unittest
+import os
+import shutil
+import tempfile
+import asyncio
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from backend.rate_limit import (
+    MemoryRateLimitBackend, SQLiteRateLimitBackend, RateLimitBackend, RateLimiter, client_ip, json_field,
+    create_rate_limit_backend
+)
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestMemoryRateLimitBackend(unittest.TestCase):
+    """测试进程内令牌桶"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.backend = MemoryRateLimitBackend(max_keys=3, clock=self.clock)
+
+    def test_burst_then_refill(self):
+        """测试突发额度用完后按速率补充"""
+        results = [self.backend.hit("k", rate=1.0, burst=3)[0] for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        allowed, retry_after = self.backend.hit("k", rate=1.0, burst=3)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 1.0)
+
+        self.clock.now += 1.0
+        self.assertTrue(self.backend.hit("k", rate=1.0, burst=3)[0])
+        self.assertFalse(self.backend.hit("k", rate=1.0, burst=3)[0])
+
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的键"""
+        for key in ("a", "b", "c"):
+            self.backend.hit(key, rate=1.0, burst=1)
+        self.backend.hit("a", rate=1.0, burst=1)
+        self.backend.hit("d", rate=1.0, burst=1)
+        self.assertEqual(self.backend.size(), 3)
+        self.assertEqual(self.backend.evicted, 1)
+        self.assertNotIn("b", self.backend._buckets)
+        self.assertFalse(self.backend.hit("a", rate=1.0, burst=1)[0])
+
+
+class TestSQLiteRateLimitBackend(unittest.TestCase):
+    """测试多进程共享的令牌桶"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "rate_limits.db")
+        self.backend = SQLiteRateLimitBackend(self.path, max_keys=2)
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_shared_between_instances(self):
+        """测试不同实例（模拟不同worker进程）共享同一个桶"""
+        other = SQLiteRateLimitBackend(self.path)
+        self.assertTrue(self.backend.hit("k", rate=0.001, burst=2)[0])
+        self.assertTrue(other.hit("k", rate=0.001, burst=2)[0])
+        self.assertFalse(self.backend.hit("k", rate=0.001, burst=2)[0])
+        other.close()
+
+    def test_prune(self):
+        """测试超出容量时删除最久未使用的桶"""
+        for key in ("a", "b", "c"):
+            self.backend.hit(key, rate=1.0, burst=1)
+        self.assertEqual(self.backend.prune(), 1)
+        self.assertEqual(self.backend.size(), 2)
+
+    def test_factory(self):
+        """测试按名称创建后端"""
+        self.assertIsInstance(create_rate_limit_backend("memory"), MemoryRateLimitBackend)
+        with self.assertRaises(ValueError):
+            create_rate_limit_backend("redis")
+
+    def test_incomplete_backend_rejected(self):
+        """测试缺少方法的后端在实例化时报错"""
+        class Partial(RateLimitBackend):
+            def hit(self, key, rate, burst):
+                return True, 0.0
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+class TestRateLimiter(unittest.TestCase):
+    """测试路由声明的限流依赖"""
+
+    def setUp(self):
+        self.calls = 0
+        self.limiter = RateLimiter(MemoryRateLimitBackend())
+        app = FastAPI()
+
+        @app.post("/login", dependencies=[
+            Depends(self.limiter.limit("ip", per_minute=60, burst=5, key=client_ip())),
+            Depends(self.limiter.limit("user", per_minute=1, burst=2, key=json_field("username"))),
+        ])
+        async def login(body: dict):
+            self.calls += 1
+            return {"ok": True}
+
+        self.client = TestClient(app)
+
+    def test_rejected_before_route(self):
+        """测试超限请求返回429且不进入路由函数"""
+        codes = [self.client.post("/login", json={"username": "alice"}).status_code for _ in range(3)]
+        self.assertEqual(codes, [200, 200, 429])
+        self.assertEqual(self.calls, 2)
+        resp = self.client.post("/login", json={"username": "alice"})
+        self.assertGreaterEqual(int(resp.headers["Retry-After"]), 1)
+
+    def test_keys_are_independent(self):
+        """测试不同用户名各自计数，同一IP受IP限额约束"""
+        codes = [self.client.post("/login", json={"username": f"user{i}"}).status_code for i in range(6)]
+        self.assertEqual(codes, [200] * 5 + [429])
+        stats = self.limiter.stats()
+        self.assertEqual(stats["rejected"], {"ip": 1, "user": 0})
+
+    def test_disabled(self):
+        """测试关闭限流"""
+        self.limiter.enabled = False
+        codes = {self.client.post("/login", json={"username": "alice"}).status_code for _ in range(5)}
+        self.assertEqual(codes, {200})
+
+
+class RecordingBackend(SQLiteRateLimitBackend):
+    """记录 hit 是否在事件循环线程中调用的 SQLite 后端"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.in_loop = []
+
+    def hit(self, key, rate, burst):
+        try:
+            asyncio.get_running_loop()
+            self.in_loop.append(True)
+        except RuntimeError:
+            self.in_loop.append(False)
+        return super().hit(key, rate, burst)
+
+
+class TestBlockingBackend(unittest.TestCase):
+    """测试 SQLite 后端不在事件循环线程中调用"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.backend = RecordingBackend(os.path.join(self.temp_dir, "rate_limits.db"))
+        limiter = RateLimiter(self.backend)
+        app = FastAPI()
+
+        @app.get("/ping", dependencies=[
+            Depends(limiter.limit("ip", per_minute=60, burst=2, key=client_ip())),
+        ])
+        async def ping():
+            return {"ok": True}
+
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_hit_runs_in_threadpool(self):
+        """测试 hit 在线程池中执行，限流结果不变"""
+        codes = [self.client.get("/ping").status_code for _ in range(3)]
+        self.assertEqual(codes, [200, 200, 429])
+        self.assertEqual(self.backend.in_loop, [False] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from backend.session_store import (
+    MemorySessionStore, SQLiteSessionStore, SessionExpirer, RefreshCoalescer, SessionStore,
+    create_session_store
+)
+from backend.session_tokens import TokenSigner
+
+
+def make_session(hours: float = 1) -> dict:
+    """构造一个会话"""
+    now = datetime.now()
+    return {
+        "user_id": 1,
+        "username": "alice",
+        "is_admin": False,
+        "created_at": now,
+        "expires_at": now + timedelta(hours=hours),
+    }
+
+
+class SessionStoreContract:
+    """两种存储共同遵守的行为"""
+
+    def test_create_get_delete(self):
+        """测试创建、读取和删除会话"""
+        self.store.create("t1", make_session())
+        session = self.store.get("t1")
+        self.assertEqual(session["username"], "alice")
+        self.assertFalse(session["is_admin"])
+        self.assertTrue(self.store.delete("t1"))
+        self.assertIsNone(self.store.get("t1"))
+        self.assertFalse(self.store.delete("t1"))
+
+    def test_touch(self):
+        """测试更新过期时间"""
+        self.store.create("t1", make_session())
+        later = datetime.now() + timedelta(hours=5)
+        self.assertTrue(self.store.touch("t1", later))
+        self.assertAlmostEqual(self.store.get("t1")["expires_at"].timestamp(), later.timestamp(), places=3)
+        self.assertFalse(self.store.touch("missing", later))
+
+    def test_touch_many(self):
+        """测试批量更新过期时间"""
+        self.store.create("t1", make_session())
+        self.store.create("t2", make_session())
+        later = datetime.now() + timedelta(hours=5)
+        self.assertEqual(self.store.touch_many([("t1", later), ("t2", later), ("missing", later)]), 2)
+        self.assertAlmostEqual(self.store.get("t2")["expires_at"].timestamp(), later.timestamp(), places=3)
+
+    def test_cleanup_expired(self):
+        """测试批量清理过期会话"""
+        for i in range(10):
+            self.store.create(f"old{i}", make_session(hours=-1))
+        self.store.create("live", make_session())
+        self.assertEqual(self.store.cleanup_expired(datetime.now()), 10)
+        self.assertEqual(self.store.count(), 1)
+
+    def test_revocations(self):
+        """测试无状态令牌吊销记录，过期后随清理移除"""
+        now = datetime.now().timestamp()
+        self.store.revoke("jti-live", now + 3600)
+        self.store.revoke("jti-old", now - 1)
+        self.assertTrue(self.store.is_revoked("jti-live"))
+        self.assertFalse(self.store.is_revoked("jti-other"))
+        self.store.cleanup_expired(datetime.now())
+        self.assertTrue(self.store.is_revoked("jti-live"))
+        self.assertFalse(self.store.is_revoked("jti-old"))
+
+
+class TestMemorySessionStore(SessionStoreContract, unittest.TestCase):
+    """测试内存会话存储"""
+
+    def setUp(self):
+        self.store = MemorySessionStore()
+
+
+    def test_touched_session_survives_cleanup(self):
+        """测试续期后的会话不会按旧的过期时间被清理"""
+        self.store.create("t1", make_session(hours=1))
+        self.store.touch("t1", datetime.now() + timedelta(hours=3))
+        self.assertEqual(self.store.cleanup_expired(datetime.now() + timedelta(hours=2)), 0)
+        self.assertEqual(self.store.cleanup_expired(datetime.now() + timedelta(hours=4)), 1)
+        self.assertEqual(self.store.count(), 0)
+
+    def test_heap_bounded_after_logouts(self):
+        """测试大量登出后堆会被重建，不随历史会话无限增长"""
+        for i in range(5000):
+            self.store.create(f"t{i}", make_session())
+            self.store.delete(f"t{i}")
+        self.store.cleanup_expired(datetime.now())
+        self.assertLessEqual(len(self.store._heap), 1024)
+
+    def test_cleanup_concurrent_with_logouts(self):
+        """测试清理与并发的登录、登出、续期同时进行时不抛异常"""
+        errors = []
+        stop = threading.Event()
+
+        def churn():
+            i = 0
+            while not stop.is_set():
+                self.store.create(f"c{i}", make_session(hours=-1))
+                self.store.touch(f"c{i - 1}", datetime.now() - timedelta(hours=1))
+                self.store.delete(f"c{i - 2}")
+                i += 1
+
+        def clean():
+            try:
+                for _ in range(300):
+                    self.store.cleanup_expired(datetime.now())
+            except Exception as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=churn) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        clean()
+        stop.set()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+
+    def test_expirer_counts(self):
+        """测试清理线程统计存活和已清理数量"""
+        for i in range(3):
+            self.store.create(f"old{i}", make_session(hours=-1))
+        self.store.create("live", make_session())
+        expirer = SessionExpirer(self.store, interval=0.01)
+        expirer.start()
+        deadline = datetime.now() + timedelta(seconds=5)
+        while expirer.evicted < 3 and datetime.now() < deadline:
+            expirer._stop.wait(0.01)
+        expirer.stop()
+        stats = expirer.stats()
+        self.assertEqual((stats["live"], stats["evicted"]), (1, 3))
+
+
+class TestRefreshCoalescer(unittest.TestCase):
+    """测试合并滑动过期续期"""
+
+    def setUp(self):
+        self.store = MemorySessionStore()
+        self.refresher = RefreshCoalescer(self.store, timedelta(hours=24), threshold=0.5,
+                                          max_batch=3, max_delay=3600)
+
+    def test_fresh_session_not_written(self):
+        """测试剩余有效期充足时不产生写入"""
+        self.store.create("t1", make_session(hours=20))
+        for _ in range(100):
+            self.assertFalse(self.refresher.refresh("t1", self.store.get("t1")))
+        stats = self.refresher.stats()
+        self.assertEqual((stats["avoided_writes"], stats["refreshed"]), (100, 0))
+
+    def test_refresh_batched(self):
+        """测试需要续期的会话累计到批量大小后一次写入"""
+        for i in range(3):
+            self.store.create(f"t{i}", make_session(hours=1))
+        self.assertTrue(self.refresher.refresh("t0", self.store.get("t0")))
+        self.assertTrue(self.refresher.refresh("t0", self.store.get("t0")))
+        self.assertTrue(self.refresher.refresh("t1", self.store.get("t1")))
+        self.assertEqual(self.refresher.batches, 0)
+        self.assertLess(self.store.get("t0")["expires_at"], datetime.now() + timedelta(hours=2))
+
+        # 达到批量大小时 refresh() 仍只入队，由后台线程写入
+        self.refresher.refresh("t2", self.store.get("t2"))
+        self.assertEqual(self.refresher.stats()["pending"], 3)
+        self.refresher.start()
+        self.addCleanup(self.refresher.stop)
+        deadline = datetime.now() + timedelta(seconds=5)
+        while self.refresher.batches == 0 and datetime.now() < deadline:
+            self.refresher._stop.wait(0.01)
+        stats = self.refresher.stats()
+        self.assertEqual((stats["batches"], stats["refreshed"], stats["avoided_writes"]), (1, 3, 1))
+        self.assertGreater(self.store.get("t0")["expires_at"], datetime.now() + timedelta(hours=23))
+
+    def test_stop_flushes_pending(self):
+        """测试停止后台线程时写入剩余的续期"""
+        self.store.create("t1", make_session(hours=1))
+        self.refresher.start()
+        self.refresher.refresh("t1", self.store.get("t1"))
+        self.refresher.stop()
+        self.assertEqual(self.refresher.stats()["pending"], 0)
+        self.assertGreater(self.store.get("t1")["expires_at"], datetime.now() + timedelta(hours=23))
+
+    def test_expirer_flushes_pending(self):
+        """测试清理前写入待续期的会话，避免被误清理"""
+        self.store.create("t1", make_session(hours=1))
+        self.refresher.refresh("t1", self.store.get("t1"))
+        SessionExpirer(self.store, refresher=self.refresher).run_once()
+        self.assertEqual(self.refresher.stats()["pending"], 0)
+        self.assertGreater(self.store.get("t1")["expires_at"], datetime.now() + timedelta(hours=23))
+
+
+class TestSQLiteSessionStore(SessionStoreContract, unittest.TestCase):
+    """测试SQLite共享会话存储"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "sessions.db")
+        self.store = SQLiteSessionStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_shared_between_instances(self):
+        """测试不同实例（模拟不同worker进程）共享会话"""
+        other = SQLiteSessionStore(self.path)
+        self.store.create("t1", make_session())
+        self.assertEqual(other.get("t1")["user_id"], 1)
+        other.delete("t1")
+        self.assertIsNone(self.store.get("t1"))
+        other.close()
+
+    def test_revocation_shared_and_persistent(self):
+        """测试一个 worker 吊销的令牌在其他 worker 和重启后仍被拒绝"""
+        first = TokenSigner("test-secret", revocations=self.store)
+        token = first.issue(7, "alice", False, None, ttl_seconds=60)
+        other = SQLiteSessionStore(self.path)
+        second = TokenSigner("test-secret", revocations=other)
+        self.assertIsNotNone(second.verify(token))
+
+        self.assertTrue(first.revoke(token))
+        self.assertIsNone(second.verify(token))
+        other.close()
+
+        restarted = SQLiteSessionStore(self.path)
+        self.assertIsNone(TokenSigner("test-secret", revocations=restarted).verify(token))
+        restarted.close()
+
+    def test_factory(self):
+        """测试按名称创建存储"""
+        self.assertIsInstance(create_session_store("memory"), MemorySessionStore)
+        with self.assertRaises(ValueError):
+            create_session_store("redis")
+
+    def test_incomplete_backend_rejected(self):
+        """测试缺少方法的存储在实例化时报错"""
+        class Partial(SessionStore):
+            def create(self, token, session):
+                pass
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+if __name__ == "__main__":
+    unittest.main()
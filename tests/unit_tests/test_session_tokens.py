@@ -0,0 +1,63 @@
+import unittest
+from backend.session_tokens import TokenSigner
+
+
+class TestTokenSigner(unittest.TestCase):
+    """测试无状态签名会话令牌"""
+
+    def setUp(self):
+        self.signer = TokenSigner("test-secret")
+
+    def test_issue_and_verify(self):
+        """测试签发后可以校验并取回会话信息"""
+        token = self.signer.issue(7, "alice", False, "couple_1", ttl_seconds=60)
+        session = self.signer.verify(token)
+        self.assertEqual(session["user_id"], 7)
+        self.assertEqual(session["username"], "alice")
+        self.assertFalse(session["is_admin"])
+        self.assertEqual(session["couple_id"], "couple_1")
+
+    def test_other_process_can_verify(self):
+        """测试持有相同密钥的另一个实例可以独立校验"""
+        token = self.signer.issue(1, "admin", True, None, ttl_seconds=60)
+        session = TokenSigner("test-secret").verify(token)
+        self.assertTrue(session["is_admin"])
+        self.assertIsNone(session["couple_id"])
+
+    def test_tampered_token_rejected(self):
+        """测试篡改载荷或使用其他密钥签名的令牌被拒绝"""
+        token = self.signer.issue(7, "alice", False, "couple_1", ttl_seconds=60)
+        forged = TokenSigner("other-secret").issue(7, "alice", True, "couple_1", ttl_seconds=60)
+        payload = forged.split(".")[0]
+        signature = token.split(".")[1]
+        self.assertIsNone(self.signer.verify(f"{payload}.{signature}"))
+        self.assertIsNone(self.signer.verify(forged))
+        self.assertIsNone(self.signer.verify("not-a-token"))
+
+    def test_non_ascii_token_rejected(self):
+        """测试含非 ASCII 字符的令牌被拒绝而不是抛出异常"""
+        token = self.signer.issue(7, "alice", False, None, ttl_seconds=60)
+        for bad in ("abc.éé", f"{token}é", "é.abc", "abc.\udc80"):
+            self.assertIsNone(self.signer.verify(bad))
+            self.assertFalse(self.signer.revoke(bad))
+
+    def test_expired_token_rejected(self):
+        """测试过期令牌被拒绝"""
+        token = self.signer.issue(7, "alice", False, None, ttl_seconds=-1)
+        self.assertIsNone(self.signer.verify(token))
+
+    def test_revoke(self):
+        """测试登出吊销后令牌失效"""
+        token = self.signer.issue(7, "alice", False, None, ttl_seconds=60)
+        self.assertTrue(self.signer.revoke(token))
+        self.assertIsNone(self.signer.verify(token))
+        self.assertFalse(self.signer.revoke("bad.token"))
+
+    def test_empty_secret(self):
+        """测试缺少密钥时拒绝创建"""
+        with self.assertRaises(ValueError):
+            TokenSigner("")
+
+
+if __name__ == "__main__":
+    unittest.main()